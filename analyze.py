@@ -13,16 +13,37 @@ def ocr_image(image_path):
     except Exception as e:
         return f"Erreur OCR: {e}"
 
-# Pour l'audio (transcription avec Whisper)
+# Pour l'audio (transcription avec Whisper) : modèle chargé une fois par processus, pas à chaque fichier
+_whisper_model = None
+_whisper_lock = threading.Lock()
+
+def _get_whisper():
+    global _whisper_model
+    with _whisper_lock:
+        if _whisper_model is None:
+            from model_pack import load_whisper
+            _whisper_model = load_whisper("base")
+        return _whisper_model
+
 def transcribe_audio(audio_path, language="fr"):
     try:
-        import whisper
-        model = whisper.load_model("base")
-        result = model.transcribe(audio_path, language=language)
+        model = _get_whisper()
+        with _whisper_lock:
+            result = model.transcribe(audio_path, language=language)
         return result.get("text", "")
     except Exception as e:
         return f"Erreur transcription audio: {e}"
 
+# Transcription d'un dossier / d'une liste de fichiers (pool de processus, fenêtres de 30 s, reprise après plantage)
+def transcribe_batch(paths, output_dir="data/transcripts", workers=2, language="fr", progress_callback=None):
+    try:
+        from batch_transcribe import BatchTranscriber
+        transcriber = BatchTranscriber(output_dir, workers, language=language, progress_callback=progress_callback)
+        outputs = transcriber.run(paths)
+        return f"Transcription terminée : {len(outputs)} fichier(s) dans {output_dir}"
+    except Exception as e:
+        return f"Erreur transcription par lot: {e}"
+
 # Pour la vidéo (extraction audio puis transcription)
 def analyze_video(video_path, language="fr"):
     try:
@@ -36,26 +57,50 @@ def analyze_video(video_path, language="fr"):
     except Exception as e:
         return f"Erreur analyse vidéo: {e}"
 
+# Extraction du texte d'un document (PDF, DOCX, texte brut)
+def pdf_text(pdf_path):
+    import fitz  # PyMuPDF
+    doc = fitz.open(pdf_path)
+    return "\n".join(page.get_text() for page in doc)
+
+def docx_text(docx_path):
+    import docx
+    doc = docx.Document(docx_path)
+    return "\n\n".join(p.text for p in doc.paragraphs if p.text.strip())
+
+def extract_text(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        return pdf_text(path)
+    if ext == ".docx":
+        return docx_text(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
 # Pour résumé PDF
 def summarize_pdf(pdf_path):
     try:
-        import fitz  # PyMuPDF
-        doc = fitz.open(pdf_path)
-        text = "\n".join(page.get_text() for page in doc)
-        return summarize_text(text)
+        return summarize_text(pdf_text(pdf_path))
     except Exception as e:
         return f"Erreur résumé PDF: {e}"
 
 # Pour résumé DOCX
 def summarize_docx(docx_path):
     try:
-        import docx
-        doc = docx.Document(docx_path)
-        text = "\n".join([p.text for p in doc.paragraphs])
-        return summarize_text(text)
+        return summarize_text(docx_text(docx_path))
     except Exception as e:
         return f"Erreur résumé DOCX: {e}"
 
+# Lecture à voix haute d'un document en fichier audio (pool de processus TTS, reprise après plantage)
+def read_aloud_document(path, output_path=None, language="fr", progress_callback=None):
+    try:
+        from read_aloud import read_aloud
+        output_path = output_path or os.path.splitext(path)[0] + ".mp3"
+        result = read_aloud(extract_text(path), output_path, language=language, progress_callback=progress_callback)
+        return f"Lecture audio enregistrée : {result}" if result else "Lecture audio interrompue (reprise possible)"
+    except Exception as e:
+        return f"Erreur lecture audio: {e}"
+
 # Résumé texte générique IA (à adapter pour ton LLM)
 def summarize_text(text):
     try:
@@ -66,7 +111,9 @@ def summarize_text(text):
     except Exception as e:
         return f"Erreur résumé IA: {e}"
 
-# --- Système asynchrone (threading) ---
+# --- Système asynchrone (pool de threads borné : les tâches en trop attendent leur tour) ---
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="analyze")
+
 def async_task(fn, args=(), kwargs=None, gui_callback=None):
     if kwargs is None:
         kwargs = {}
@@ -74,7 +121,8 @@ def async_task(fn, args=(), kwargs=None, gui_callback=None):
         result = fn(*args, **kwargs)
         if gui_callback:
             gui_callback(result)
-    threading.Thread(target=task, daemon=True).start()
+        return result
+    return _executor.submit(task)
 
 # --- Exemple d'utilisation dans la GUI ---
 # from analyze import async_task, ocr_image, transcribe_audio, analyze_video, summarize_pdf, summarize_docx
@@ -82,4 +130,6 @@ def async_task(fn, args=(), kwargs=None, gui_callback=None):
 # async_task(transcribe_audio, args=("audio.wav",), gui_callback=gui.append_text)
 # async_task(analyze_video, args=("video.mp4",), gui_callback=gui.append_text)
 # async_task(summarize_pdf, args=("file.pdf",), gui_callback=gui.append_text)
-# async_task(summarize_docx, args=("file.docx",), gui_callback=gui.append_text)
\ No newline at end of file
+# async_task(summarize_docx, args=("file.docx",), gui_callback=gui.append_text)
+# async_task(read_aloud_document, args=("file.pdf",), gui_callback=gui.append_text)
+# async_task(transcribe_batch, args=(["enregistrements/"],), gui_callback=gui.append_text)
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+Post-traitement NumPy de l'audio synthétisé pour WillIAM
+- Coupe des silences de début/fin par énergie de trame (XTTS et pyttsx3 en ajoutent des centaines de ms).
+- Normalisation de la sonie (RMS des trames actives) avec limite de crête.
+- Fondus enchaînés courts entre les morceaux d'un énoncé pipeliné.
+Tout se fait sur place : la coupe renvoie une vue, gain et fondus écrivent dans le buffer PCM lui-même.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _writable(wav):
+    """Buffer float32 1D modifiable sur place (ne copie que si le buffer est en lecture seule ou d'un autre type)."""
+    import numpy as np
+    wav = np.asarray(wav).reshape(-1)
+    if wav.dtype != np.float32 or not wav.flags.writeable:
+        wav = np.array(wav, dtype=np.float32)
+    return wav
+
+def frame_energy_db(wav, sample_rate, frame_ms=10):
+    """Énergie (dB) de chaque trame. Les trames sont une vue remodelée du signal, aucune copie."""
+    import numpy as np
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    n_frames = len(wav) // frame
+    if n_frames == 0:
+        return np.zeros(0, np.float32), frame
+    frames = wav[:n_frames * frame].reshape(n_frames, frame)
+    power = np.einsum("ij,ij->i", frames, frames) / frame
+    return 10.0 * np.log10(power + 1e-12), frame
+
+def trim_silence(wav, sample_rate, threshold_db=-45.0, frame_ms=10, pad_ms=40):
+    """Retourne une vue sans le silence de début/fin (seuil relatif à la trame la plus forte).
+    pad_ms de marge est gardé de chaque côté pour ne pas couper les attaques et les fins de mots."""
+    energy, frame = frame_energy_db(wav, sample_rate, frame_ms)
+    if energy.size == 0:
+        return wav
+    active = (energy > energy.max() + threshold_db).nonzero()[0]
+    if active.size == 0:
+        return wav[:0]
+    pad = int(sample_rate * pad_ms / 1000)
+    start = max(0, active[0] * frame - pad)
+    end = min(len(wav), (active[-1] + 1) * frame + pad)
+    return wav[start:end]
+
+def normalize_loudness(wav, sample_rate, target_dbfs=-20.0, peak_limit=0.97, threshold_db=-45.0, max_gain_db=20.0):
+    """Ramène la sonie (RMS des trames actives) à target_dbfs, sur place. Le gain est borné pour ne pas
+    dépasser peak_limit en crête ni amplifier le bruit d'un signal presque muet. Retourne le gain appliqué."""
+    import numpy as np
+    energy, _ = frame_energy_db(wav, sample_rate)
+    if energy.size == 0:
+        return 1.0
+    active = energy[energy > energy.max() + threshold_db]
+    loudness = 10.0 * np.log10(np.mean(10.0 ** (active / 10.0)) + 1e-12)
+    gain = 10.0 ** (min(target_dbfs - loudness, max_gain_db) / 20.0)
+    peak = float(np.abs(wav).max()) if len(wav) else 0.0
+    if peak * gain > peak_limit:
+        gain = peak_limit / peak
+    if abs(gain - 1.0) > 1e-3:
+        wav *= gain
+    return gain
+
+def fade(wav, sample_rate, fade_in_ms=0.0, fade_out_ms=0.0):
+    """Rampes d'entrée/sortie appliquées sur place (évite les clics aux bords d'un clip coupé)."""
+    import numpy as np
+    n_in = min(len(wav), int(sample_rate * fade_in_ms / 1000))
+    if n_in > 1:
+        wav[:n_in] *= np.linspace(0.0, 1.0, n_in, dtype=np.float32)
+    n_out = min(len(wav), int(sample_rate * fade_out_ms / 1000))
+    if n_out > 1:
+        wav[-n_out:] *= np.linspace(1.0, 0.0, n_out, dtype=np.float32)
+    return wav
+
+def process(wav, sample_rate, trim=True, normalize=True, threshold_db=-45.0, pad_ms=40, target_dbfs=-20.0, fade_ms=5.0):
+    """Coupe + normalisation + micro-fondus. Retourne une vue du buffer d'entrée (modifié sur place)."""
+    wav = _writable(wav)
+    if trim:
+        wav = trim_silence(wav, sample_rate, threshold_db=threshold_db, pad_ms=pad_ms)
+    if normalize and len(wav):
+        normalize_loudness(wav, sample_rate, target_dbfs=target_dbfs, threshold_db=threshold_db)
+    if trim and fade_ms:
+        fade(wav, sample_rate, fade_ms, fade_ms)
+    return wav
+
+class ChunkCrossfader:
+    """Fondu enchaîné entre morceaux successifs d'un énoncé.
+    La fin de chaque morceau (xfade_ms) est retenue puis mélangée sur place dans le début du suivant :
+    push() renvoie les vues à jouer tout de suite, flush() la fin retenue du dernier morceau."""
+
+    def __init__(self, sample_rate, xfade_ms=15.0):
+        self.sample_rate = sample_rate
+        self.n = int(sample_rate * xfade_ms / 1000)
+        self._tail = None
+        self._ramps = {}
+
+    def _ramp(self, n):
+        import numpy as np
+        ramp = self._ramps.get(n)
+        if ramp is None:
+            # Fondu à puissance constante
+            t = np.linspace(0.0, np.pi / 2, n, dtype=np.float32)
+            ramp = self._ramps[n] = (np.sin(t), np.cos(t))
+        return ramp
+
+    def push(self, wav):
+        """Retourne la liste des vues à jouer maintenant (toutes sur le buffer d'origine)."""
+        if self.n <= 1 or len(wav) == 0:
+            return [wav]  # morceau vide : la fin retenue attend le suivant
+        segments = []
+        if self._tail is not None:
+            n = min(len(self._tail), len(wav))
+            if n <= 1:
+                segments.append(self._tail)  # trop court pour un fondu : fin retenue jouée telle quelle
+            else:
+                if len(self._tail) > n:
+                    segments.append(self._tail[:-n])  # morceau suivant trop court pour couvrir toute la fin
+                fade_in, fade_out = self._ramp(n)
+                tail = self._tail[-n:]
+                wav[:n] *= fade_in
+                tail *= fade_out
+                wav[:n] += tail
+        keep = min(self.n, len(wav) // 2)
+        self._tail = wav[len(wav) - keep:] if keep else None
+        segments.append(wav[:len(wav) - keep])
+        return segments
+
+    def flush(self):
+        """Fin retenue du dernier morceau (à jouer en dernier), ou None."""
+        tail, self._tail = self._tail, None
+        return tail
+
+def _self_check():
+    """Fondus enchaînés : aucun échantillon perdu ni ajouté, y compris avec des morceaux vides ou d'un échantillon."""
+    import numpy as np
+    sample_rate = 24000
+
+    def run(lengths):
+        fader = ChunkCrossfader(sample_rate, xfade_ms=15.0)
+        out = []
+        for length in lengths:
+            out.extend(fader.push(np.ones(length, np.float32)))
+        tail = fader.flush()
+        if tail is not None:
+            out.append(tail)
+        return np.concatenate(out) if out else np.zeros(0, np.float32)
+
+    overlap = int(sample_rate * 0.015)
+    cases = {
+        (1000, 1000): 2000 - overlap,
+        (1000, 0, 1000): 2000 - overlap,  # la fin retenue survit au morceau vide
+        (1000, 0): 1000,
+        (0, 1000): 1000,
+        (1000, 1): 1001,                  # un échantillon : pas de fondu, rien de perdu
+        (1000, 1, 1000): 2001,              # rien de retenu après un morceau d'un échantillon
+        (1, 1, 1): 3,
+    }
+    for lengths, expected in cases.items():
+        out = run(lengths)
+        assert len(out) == expected, (lengths, len(out), expected)
+        assert np.all(out > 0.5), (lengths, "échantillon perdu ou mis à zéro")
+    print(f"audio_dsp self-check OK ({len(cases)} séquences de morceaux)")
+
+if __name__ == "__main__":
+    _self_check()
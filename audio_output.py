@@ -0,0 +1,287 @@
+"""
+Périphérique de sortie audio persistant pour WillIAM
+- Ouvert une seule fois au format natif du modèle (24 kHz mono float32 pour XTTS).
+- Alimenté par callback, taille de bloc configurable : pas de init/quit du mixer entre deux clips.
+- Mesures : sous-alimentations (underruns, comptées seulement une fois le premier clip de l'énoncé commencé :
+  l'attente du premier audio est de la latence de synthèse, pas un trou), latence d'écriture -> premier échantillon, latence du périphérique.
+- Un clip à un autre taux (bip, pyttsx3...) est rééchantillonné (polyphase, filtre calculé une fois par couple
+  de taux) au lieu de rouvrir le flux : aucune renégociation de format par clip.
+"""
+
+import functools
+import io
+import logging
+import math
+import threading
+import time
+import wave
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+def wav_bytes_to_pcm(data):
+    """Décode un WAV PCM (octets) en waveform float32 mono."""
+    import numpy as np
+    with wave.open(io.BytesIO(data), "rb") as f:
+        sample_rate = f.getframerate()
+        width = f.getsampwidth()
+        channels = f.getnchannels()
+        frames = f.readframes(f.getnframes())
+    if width == 1:
+        pcm = (np.frombuffer(frames, np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        pcm = np.frombuffer(frames, "<i2").astype(np.float32) / 32768.0
+    elif width == 4:
+        pcm = np.frombuffer(frames, "<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Largeur d'échantillon non supportée: {width}")
+    if channels > 1:
+        pcm = pcm.reshape(-1, channels).mean(axis=1)
+    return pcm, sample_rate
+
+def read_wav_file(path):
+    with open(path, "rb") as f:
+        return wav_bytes_to_pcm(f.read())
+
+@functools.lru_cache(maxsize=16)
+def _polyphase_filter(up, down, half_taps=10):
+    """Filtre anti-repliement (fenêtre de Kaiser) pour un couple up/down, calculé une seule fois.
+    Complété à gauche pour que le retard de groupe tombe sur un échantillon de sortie entier."""
+    import numpy as np
+    from scipy.signal import firwin
+    max_rate = max(up, down)
+    half_len = half_taps * max_rate
+    h = firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0)) * up
+    pre_pad = (down - half_len % down) % down
+    h = np.concatenate([np.zeros(pre_pad), h]).astype(np.float32)
+    return h, (half_len + pre_pad) // down
+
+def resample(pcm, src_rate, dst_rate):
+    """Rééchantillonnage polyphase (équivalent de scipy.signal.resample_poly, filtre en cache)."""
+    import numpy as np
+    from scipy.signal import upfirdn
+    src_rate, dst_rate = int(src_rate), int(dst_rate)
+    if src_rate == dst_rate:
+        return pcm
+    g = math.gcd(src_rate, dst_rate)
+    up, down = dst_rate // g, src_rate // g
+    h, delay = _polyphase_filter(up, down)
+    n_out = -(-len(pcm) * up // down)
+    out = upfirdn(h, np.asarray(pcm, dtype=np.float32), up, down)[delay:delay + n_out]
+    return out.astype(np.float32, copy=False)
+
+class _Clip:
+    __slots__ = ("pcm", "pos", "done", "t_write", "t_start")
+
+    def __init__(self, pcm):
+        self.pcm = pcm
+        self.pos = 0
+        self.done = threading.Event()
+        self.t_write = time.perf_counter()
+        self.t_start = None
+
+class OutputDevice:
+    def __init__(self, sample_rate=24000, channels=1, block_size=512, latency="low"):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.latency = latency
+        self.stream = None
+        self.lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._clips = deque()
+        self._utterance_open = False
+        self._utterance_started = False
+        self.metrics = {
+            "clips": 0,
+            "underruns": 0,
+            "device_underflows": 0,
+            "blocks": 0,
+            "last_start_latency": None,
+            "avg_start_latency": None,
+            "device_latency": None,
+            "opens": 0,
+            "resampled": 0,
+        }
+
+    # --- Ouverture unique ---
+    def open(self, sample_rate=None):
+        """Ouvre le flux (une seule fois) au taux natif. Rouvre seulement si on change explicitement de taux."""
+        sample_rate = int(sample_rate or self.sample_rate)
+        with self._open_lock:
+            if self.stream is not None and sample_rate == self.sample_rate:
+                return self.stream
+            if self.stream is not None:
+                self.drain()
+                self.close()
+            import sounddevice as sd
+            stream = sd.OutputStream(
+                samplerate=sample_rate,
+                channels=self.channels,
+                dtype="float32",
+                blocksize=self.block_size,
+                latency=self.latency,
+                callback=self._callback,
+            )
+            stream.start()
+            with self.lock:
+                self.stream = stream
+                self.sample_rate = sample_rate
+                self.metrics["opens"] += 1
+                self.metrics["device_latency"] = round(float(stream.latency), 4)
+            logger.info(
+                f"✅ Sortie audio ouverte ({sample_rate} Hz, bloc {self.block_size}, "
+                f"latence {self.metrics['device_latency']}s)"
+            )
+            return stream
+
+    def close(self):
+        with self.lock:
+            stream, self.stream = self.stream, None
+            self._release_clips()
+        if stream is not None:
+            try:
+                stream.stop()
+                stream.close()
+            except Exception:
+                pass
+
+    # --- Alimentation ---
+    def _callback(self, outdata, frames, time_info, status):
+        if status and status.output_underflow:
+            self.metrics["device_underflows"] += 1
+        filled = 0
+        with self.lock:
+            self.metrics["blocks"] += 1
+            starved = not self._clips
+            while filled < frames and self._clips:
+                clip = self._clips[0]
+                if clip.t_start is None:
+                    clip.t_start = time.perf_counter()
+                    self._record_start_latency(clip.t_start - clip.t_write)
+                    if self._utterance_open:
+                        self._utterance_started = True
+                n = min(frames - filled, len(clip.pcm) - clip.pos)
+                outdata[filled:filled + n] = clip.pcm[clip.pos:clip.pos + n]
+                clip.pos += n
+                filled += n
+                if clip.pos >= len(clip.pcm):
+                    self._clips.popleft()
+                    clip.done.set()
+            if starved and self._utterance_open and self._utterance_started:
+                # Bloc entier sans rien à jouer alors que l'énoncé a commencé et n'est pas fini : trou audible.
+                # (Un clip qui se termine en milieu de bloc n'est pas un trou : la fin d'énoncé tombe là.)
+                self.metrics["underruns"] += 1
+        if filled < frames:
+            outdata[filled:] = 0
+
+    def _record_start_latency(self, latency):
+        self.metrics["clips"] += 1
+        self.metrics["last_start_latency"] = round(latency, 4)
+        avg = self.metrics["avg_start_latency"]
+        self.metrics["avg_start_latency"] = round(latency if avg is None else 0.9 * avg + 0.1 * latency, 4)
+
+    def write(self, pcm, sample_rate=None, wait=True):
+        """Met un clip en file. Retourne un Event signalé quand il a été entièrement joué.
+        Un clip à un autre taux est rééchantillonné vers le taux du flux (le flux n'est jamais rouvert ici)."""
+        import numpy as np
+        self.open()
+        if sample_rate and int(sample_rate) != self.sample_rate:
+            pcm = resample(np.asarray(pcm, dtype=np.float32).reshape(-1), sample_rate, self.sample_rate)
+            self.metrics["resampled"] += 1
+        pcm = np.asarray(pcm, dtype=np.float32).reshape(-1, 1)
+        if self.channels > 1:
+            pcm = np.repeat(pcm, self.channels, axis=1)
+        clip = _Clip(np.ascontiguousarray(pcm))
+        with self.lock:
+            self._clips.append(clip)
+        if wait:
+            clip.done.wait(len(pcm) / self.sample_rate + 2.0)
+        return clip.done
+
+    # --- Énoncés en plusieurs morceaux ---
+    def begin_utterance(self):
+        """Signale qu'un énoncé multi-morceaux commence (un buffer vide compte comme underrun dès que son
+        premier clip a commencé à jouer)."""
+        with self.lock:
+            self._utterance_open = True
+            self._utterance_started = False
+
+    def end_utterance(self):
+        with self.lock:
+            self._utterance_open = False
+            self._utterance_started = False
+
+    def drain(self, timeout=None):
+        """Attend la fin de tous les clips en file."""
+        with self.lock:
+            pending = [clip.done for clip in self._clips]
+        for done in pending:
+            done.wait(timeout)
+
+    def flush(self):
+        """Abandonne immédiatement tout l'audio en file (le flux reste ouvert)."""
+        with self.lock:
+            self._release_clips()
+
+    def _release_clips(self):
+        while self._clips:
+            self._clips.popleft().done.set()
+        self._utterance_open = False
+        self._utterance_started = False
+
+    def is_busy(self):
+        with self.lock:
+            return bool(self._clips)
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+        metrics["sample_rate"] = self.sample_rate
+        metrics["block_size"] = self.block_size
+        metrics["open"] = self.stream is not None
+        return metrics
+
+_device = None
+_device_lock = threading.Lock()
+
+def get_output_device(sample_rate=24000, block_size=512, latency="low"):
+    """Périphérique de sortie partagé par tout le processus (les paramètres du premier appel s'appliquent)."""
+    global _device
+    with _device_lock:
+        if _device is None:
+            _device = OutputDevice(sample_rate=sample_rate, block_size=block_size, latency=latency)
+        return _device
+
+def _self_check():
+    """Callback piloté à la main (sans carte son) : l'attente du premier clip ne compte pas comme underrun."""
+    import numpy as np
+    device = OutputDevice(sample_rate=24000, block_size=256)
+    block = np.zeros((256, 1), np.float32)
+
+    def pull(n=1):
+        for _ in range(n):
+            device._callback(block, 256, None, None)
+
+    device.begin_utterance()
+    pull(20)  # synthèse du premier morceau en cours : rien en file
+    assert device.metrics["underruns"] == 0, device.metrics
+    with device.lock:
+        device._clips.append(_Clip(np.full((600, 1), 0.5, np.float32)))
+    pull()
+    assert device.metrics["underruns"] == 0 and device.metrics["clips"] == 1, device.metrics
+    pull(2)  # 600 = 256 + 256 + 88 : le clip finit dans le troisième bloc (fin possible de l'énoncé)
+    assert device.metrics["underruns"] == 0, device.metrics
+    pull()  # énoncé toujours ouvert et file vide un bloc entier : trou réel
+    assert device.metrics["underruns"] == 1, device.metrics
+    device.end_utterance()
+    pull(5)
+    assert device.metrics["underruns"] == 1, device.metrics
+    device.begin_utterance()
+    pull(5)  # nouvel énoncé : de nouveau rien compté avant son premier clip
+    assert device.metrics["underruns"] == 1, device.metrics
+    print("audio_output self-check OK", {k: device.metrics[k] for k in ("clips", "underruns", "blocks")})
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    _self_check()
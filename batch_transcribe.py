@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Transcription par lot (dossiers d'enregistrements) pour WillIAM
+- Pool de processus : chaque processus charge Whisper une seule fois (pack rapide si disponible) et décode
+  des fenêtres de 30 s au plus ; les fenêtres d'un long fichier sont décodées en parallèle.
+- Les coupures tombent sur la trame la plus silencieuse des 2 s qui précèdent la limite de 30 s
+  (pas de mot coupé en deux au milieu d'une fenêtre).
+- Chaque fichier est décodé une seule fois : la durée (barre de progression) vient de l'en-tête, les fenêtres
+  sont planifiées au moment du décodage.
+- Segments horodatés remis dans l'ordre (décalés du début de leur fenêtre), un JSON + un TXT par fichier.
+- Reprise après plantage : l'état de chaque fichier (fenêtres, segments déjà décodés) est écrit après chaque
+  fenêtre ; un lot relancé ne redécode que ce qui manque, un fichier déjà transcrit et inchangé est sauté.
+- python batch_transcribe.py run DOSSIER [--workers 2] | bench DOSSIER --workers 1 2 4 | --self-check
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+import wave
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+WINDOW_S = 30.0
+CUT_SEARCH_S = 2.0
+OUTPUT_DIR = Path("data/transcripts")
+STATE_VERSION = 1
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".m4a", ".ogg", ".opus", ".flac", ".webm", ".mp4", ".mkv", ".aac"}
+
+# --- Audio ---
+def load_audio(path):
+    """float32 mono 16 kHz. ffmpeg (tous formats) si présent, sinon WAV seulement."""
+    if shutil.which("ffmpeg"):
+        import whisper
+        return whisper.load_audio(str(path), SAMPLE_RATE)
+    from audio_output import read_wav_file, resample
+    wav, sample_rate = read_wav_file(path)
+    return resample(wav, sample_rate, SAMPLE_RATE) if sample_rate != SAMPLE_RATE else wav
+
+def probe_seconds(path):
+    """Durée lue dans l'en-tête, sans décoder (ffprobe, sinon en-tête WAV). None si inconnue."""
+    try:
+        if shutil.which("ffprobe"):
+            out = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+                                 capture_output=True, text=True, timeout=10).stdout
+            return float(out.strip())
+        with wave.open(str(path), "rb") as f:
+            return f.getnframes() / f.getframerate()
+    except Exception:
+        return None
+
+def plan_windows(wav, sample_rate=SAMPLE_RATE, window_s=WINDOW_S, search_s=CUT_SEARCH_S):
+    """[(début, fin), ...] en échantillons : fenêtres de window_s au plus, coupées au plus silencieux."""
+    from audio_dsp import frame_energy_db
+    limit = int(window_s * sample_rate)
+    search = int(search_s * sample_rate)
+    bounds, start = [], 0
+    while len(wav) - start > limit:
+        lo = start + limit - search
+        energy, frame = frame_energy_db(wav[lo:start + limit], sample_rate, frame_ms=20)
+        cut = lo + int(energy.argmin()) * frame + frame // 2 if energy.size else start + limit
+        bounds.append((start, cut))
+        start = cut
+    if len(wav) > start:
+        bounds.append((start, len(wav)))
+    return bounds
+
+# --- Processus de travail ---
+_decode = None
+
+def _init_worker(init_fn, decode_fn, init_args):
+    global _decode
+    init_fn(*init_args)
+    _decode = decode_fn
+
+def _run_window(window, language):
+    return _decode(window, language)
+
+_model = None
+
+def init_whisper(model_name="base", threads=None):
+    """Charge Whisper une fois par processus ; threads intra-op partagés entre les processus du pool."""
+    global _model
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    from model_pack import load_whisper
+    _model = load_whisper(model_name)
+
+def decode_whisper(window, language):
+    """[(début, fin, texte), ...] relatifs au début de la fenêtre."""
+    import torch
+    result = _model.transcribe(window, language=language, fp16=torch.cuda.is_available(),
+                               condition_on_previous_text=False)
+    return [(float(s["start"]), float(s["end"]), s["text"].strip()) for s in result.get("segments", [])]
+
+# --- Lot ---
+def _file_fingerprint(path):
+    st = os.stat(path)
+    return f"{st.st_size}:{int(st.st_mtime)}"
+
+class BatchTranscriber:
+    def __init__(self, output_dir=OUTPUT_DIR, workers=2, model_name="base", language="fr", progress_callback=None,
+                 worker_init=init_whisper, decode=decode_whisper, init_args=None):
+        """progress_callback(secondes_faites, secondes_totales, eta_secondes) après chaque fenêtre décodée."""
+        self.output_dir = Path(output_dir)
+        self.state_dir = self.output_dir / ".state"
+        self.workers = max(1, int(workers))
+        self.language = language
+        self.progress_callback = progress_callback
+        self.worker_init = worker_init
+        self.decode = decode
+        threads = max(1, (os.cpu_count() or 2) // self.workers)
+        self.init_args = init_args if init_args is not None else (model_name, threads)
+        self.stats = {"files": 0, "skipped": 0, "windows": 0, "resumed_windows": 0,
+                      "audio_seconds": 0.0, "wall_seconds": 0.0}
+
+    def _key(self, path):
+        return hashlib.sha1(str(Path(path).resolve()).encode("utf-8")).hexdigest()[:12]
+
+    def _output_path(self, path):
+        return self.output_dir / f"{Path(path).stem}-{self._key(path)[:8]}.json"
+
+    def _load_state(self, path, fingerprint):
+        try:
+            with open(self.state_dir / f"{self._key(path)}.json", "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") == STATE_VERSION and state.get("fingerprint") == fingerprint:
+                return state
+        except Exception:
+            pass
+        return None
+
+    def _save_state(self, path, state):
+        target = self.state_dir / f"{self._key(path)}.json"
+        tmp = target.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, target)
+
+    def _completed(self, path, fingerprint):
+        try:
+            with open(self._output_path(path), "r", encoding="utf-8") as f:
+                return json.load(f).get("fingerprint") == fingerprint
+        except Exception:
+            return False
+
+    def _finish(self, path, state):
+        segments = []
+        for index, (start, _) in enumerate(state["windows"]):
+            offset = start / SAMPLE_RATE
+            segments.extend({"start": round(offset + s, 2), "end": round(offset + e, 2), "text": t}
+                            for s, e, t in state["done"][str(index)])
+        result = {
+            "path": str(path),
+            "fingerprint": state["fingerprint"],
+            "language": self.language,
+            "duration": round(state["samples"] / SAMPLE_RATE, 2),
+            "segments": segments,
+            "text": " ".join(s["text"] for s in segments if s["text"]),
+        }
+        output = self._output_path(path)
+        with open(output.with_suffix(".tmp"), "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        os.replace(output.with_suffix(".tmp"), output)
+        output.with_suffix(".txt").write_text(
+            "\n".join(f"[{s['start']:.2f} - {s['end']:.2f}] {s['text']}" for s in segments), encoding="utf-8"
+        )
+        (self.state_dir / f"{self._key(path)}.json").unlink(missing_ok=True)
+        return output
+
+    def run(self, paths):
+        """Transcrit une liste de fichiers (ou un dossier). Retourne {chemin: fichier JSON de sortie}."""
+        paths = expand_paths(paths)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        t0 = time.perf_counter()
+        outputs = {}
+        jobs = []  # (chemin, état) ; état None = fichier pas encore décodé ni planifié
+        progress = {"total": 0.0, "done": 0.0, "decoded": 0.0, "estimates": {}}
+        for path in paths:
+            fingerprint = _file_fingerprint(path)
+            if self._completed(path, fingerprint):
+                self.stats["skipped"] += 1
+                outputs[str(path)] = self._output_path(path)
+                continue
+            state = self._load_state(path, fingerprint)
+            if state is None:
+                # Pas de décodage ici : la durée de l'en-tête suffit à la progression
+                state = {"version": STATE_VERSION, "fingerprint": fingerprint, "samples": None, "windows": None, "done": {}}
+                progress["estimates"][str(path)] = probe_seconds(path) or 0.0
+                progress["total"] += progress["estimates"][str(path)]
+            else:
+                progress["total"] += state["samples"] / SAMPLE_RATE
+                for index, (start, end) in enumerate(state["windows"]):
+                    if str(index) in state["done"]:
+                        progress["done"] += (end - start) / SAMPLE_RATE
+                        self.stats["resumed_windows"] += 1
+            jobs.append((path, state))
+        if self.stats["resumed_windows"]:
+            logger.info(f"♻️ Transcription : reprise, {self.stats['resumed_windows']} fenêtres déjà décodées")
+        if any(state["windows"] is None or len(state["done"]) < len(state["windows"]) for _, state in jobs):
+            self._decode_all(jobs, progress, t0)
+        total = progress["total"]
+        for path, state in jobs:
+            if state["windows"] is not None and len(state["done"]) == len(state["windows"]):
+                outputs[str(path)] = self._finish(path, state)
+                self.stats["files"] += 1
+        self.stats["audio_seconds"] = round(total, 2)
+        self.stats["wall_seconds"] = round(time.perf_counter() - t0, 2)
+        logger.info(f"✅ Transcription : {self.stats['files']} fichier(s), {self.stats['skipped']} déjà faits, "
+                    f"{total / 60:.1f} min d'audio en {self.stats['wall_seconds']:.0f}s")
+        return outputs
+
+    def _windows(self, jobs, progress):
+        """Fenêtres restantes, fichier par fichier (un seul fichier audio en mémoire à la fois, décodé une fois)."""
+        for path, state in jobs:
+            if state["windows"] is not None and len(state["done"]) == len(state["windows"]):
+                continue
+            wav = load_audio(path)
+            if state["windows"] is None:
+                state["samples"], state["windows"] = len(wav), plan_windows(wav)
+                self._save_state(path, state)
+                progress["total"] += len(wav) / SAMPLE_RATE - progress["estimates"].pop(str(path), 0.0)
+            todo = [i for i in range(len(state["windows"])) if str(i) not in state["done"]]
+            for index in todo:
+                start, end = state["windows"][index]
+                yield path, state, index, wav[start:end]
+
+    def _decode_all(self, jobs, progress, t0):
+        max_in_flight = 2 * self.workers  # borne la mémoire : pas tout le lot en file
+        windows = self._windows(jobs, progress)
+        pending = {}
+        with concurrent.futures.ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"),  # pas de fork d'un processus torch multithread
+            initializer=_init_worker, initargs=(self.worker_init, self.decode, self.init_args)
+        ) as pool:
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < max_in_flight:
+                    item = next(windows, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    path, state, index, window = item
+                    pending[pool.submit(_run_window, window, self.language)] = (path, state, index, len(window))
+                if not pending:
+                    break
+                finished, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    path, state, index, n = pending.pop(future)
+                    state["done"][str(index)] = future.result()
+                    self._save_state(path, state)
+                    self.stats["windows"] += 1
+                    progress["done"] += n / SAMPLE_RATE
+                    progress["decoded"] += n / SAMPLE_RATE
+                    self._report(progress["done"], progress["total"], progress["decoded"], t0)
+
+    def _report(self, done_audio, total, decoded, t0):
+        elapsed = time.perf_counter() - t0
+        speed = decoded / elapsed if elapsed > 0 else 0.0
+        eta = (total - done_audio) / speed if speed > 0 else None
+        logger.info(f"📝 Transcription : {done_audio / 60:.1f}/{total / 60:.1f} min"
+                    + (f" (x{speed:.1f} temps réel, reste ~{eta:.0f}s)" if eta is not None else ""))
+        if self.progress_callback:
+            try:
+                self.progress_callback(done_audio, total, eta)
+            except Exception as e:
+                logger.debug(f"Callback de progression en erreur: {e}")
+
+def expand_paths(paths):
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.suffix.lower() in AUDIO_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+def transcribe_batch(paths, output_dir=OUTPUT_DIR, workers=2, language="fr", progress_callback=None):
+    return BatchTranscriber(output_dir, workers, language=language, progress_callback=progress_callback).run(paths)
+
+# --- Débit ---
+def bench(paths, worker_counts=(1, 2, 4), output=None, **kwargs):
+    """Heures d'audio transcrites par heure réelle, pour chaque taille de pool (lot refait à chaque mesure)."""
+    import tempfile
+    results = []
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            transcriber = BatchTranscriber(tmp, workers, **kwargs)
+            transcriber.run(paths)
+        s = transcriber.stats
+        throughput = s["audio_seconds"] / s["wall_seconds"] if s["wall_seconds"] else 0.0
+        results.append({"workers": workers, "audio_seconds": s["audio_seconds"], "wall_seconds": s["wall_seconds"],
+                        "windows": s["windows"], "audio_hours_per_hour": round(throughput, 2)})
+        print(f"⏱️ {workers} processus : {throughput:.1f} h d'audio / h ({s['audio_seconds']:.0f}s en {s['wall_seconds']:.1f}s)")
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "batch_transcription", "timestamp": time.time(), "results": results}, f, indent=2)
+        print(f"💾 Résultats: {output}")
+    return results
+
+# --- Auto-test (décodeur factice, sans Whisper) ---
+def _init_stand_in(delay):
+    global _model
+    _model = delay
+
+def _decode_stand_in(window, language):
+    """Un « mot » par bouffée sonore de la fenêtre, horodaté ; coût proportionnel à la durée audio."""
+    import numpy as np
+    from audio_dsp import frame_energy_db
+    time.sleep(_model * len(window) / SAMPLE_RATE)
+    energy, frame = frame_energy_db(window, SAMPLE_RATE, frame_ms=20)
+    active = energy > energy.max() - 20
+    edges = np.flatnonzero(np.diff(active.astype(np.int8)))
+    starts = [0] if active[0] else []
+    starts += [e + 1 for e in edges if not active[e]]
+    return [(i * frame / SAMPLE_RATE, (i + 5) * frame / SAMPLE_RATE, f"mot@{i * frame}") for i in starts]
+
+def _self_check():
+    import tempfile
+    import numpy as np
+    from speaker_latents import write_wav
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        # Deux enregistrements : 75 s (3 fenêtres) et 20 s ; une bouffée sonore toutes les 1,3 s
+        bursts = {}
+        for name, seconds in (("reunion.wav", 75.0), ("memo.wav", 20.0)):
+            wav = (0.001 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+            times = np.arange(0.5, seconds - 1, 1.3)
+            for t in times:
+                i = int(t * SAMPLE_RATE)
+                wav[i:i + 3200] += 0.3 * np.sin(2 * np.pi * 200 * np.arange(3200) / SAMPLE_RATE)
+            write_wav(tmp / name, wav, SAMPLE_RATE)
+            bursts[name] = times
+        out = tmp / "out"
+        # Compte les décodages : chaque fichier doit être décodé une seule fois par passe
+        global load_audio
+        decodes, real_load_audio = [], load_audio
+        load_audio = lambda path: decodes.append(Path(path).name) or real_load_audio(path)
+        make = lambda cb=None: BatchTranscriber(out, workers=2, progress_callback=cb, worker_init=_init_stand_in,
+                                                decode=_decode_stand_in, init_args=(0.01,))
+
+        # 1) Plantage simulé après 2 fenêtres (SystemExit traverse la garde du callback de progression)
+        def crash(done, total, eta):
+            crash.count += 1
+            if crash.count == 2:
+                raise SystemExit("plantage simulé")
+        crash.count = 0
+        first = make(crash)
+        try:
+            first.run(tmp)
+        except SystemExit:
+            pass
+        assert len(decodes) == len(set(decodes)), decodes
+        states = list((out / ".state").glob("*.json"))
+        assert states, "l'état doit survivre au plantage"
+        print(f"✅ Plantage après {first.stats['windows']} fenêtre(s), état conservé ({len(states)} fichier(s))")
+
+        # 2) Reprise : seules les fenêtres manquantes repartent
+        progress = []
+        decodes.clear()
+        second = make(lambda d, t, e: progress.append((d, t)))
+        outputs = second.run(tmp)
+        assert sorted(decodes) == sorted(set(decodes)), f"fichier décodé plusieurs fois : {decodes}"
+        assert abs(progress[-1][1] - 95.0) < 0.1, progress[-1]
+        assert second.stats["resumed_windows"] >= 1 and second.stats["windows"] + second.stats["resumed_windows"] == 4
+        assert [d for d, _ in progress] == sorted(d for d, _ in progress)
+        for name, times in bursts.items():
+            with open(outputs[str(tmp / name)], "r", encoding="utf-8") as f:
+                result = json.load(f)
+            starts = [s["start"] for s in result["segments"]]
+            assert starts == sorted(starts), "segments dans l'ordre"
+            assert len(starts) == len(times) and np.allclose(starts, times, atol=0.05), (name, starts[:5], times[:5])
+        print(f"✅ Reprise : {second.stats['resumed_windows']} fenêtre(s) réutilisée(s), {second.stats['windows']} décodée(s) ; "
+              f"segments horodatés dans l'ordre, coupures entre les mots, {len(decodes)} décodage(s) audio")
+
+        # 3) Relance : tout est à jour, rien n'est redécodé
+        third = make()
+        decodes.clear()
+        third.run(tmp)
+        assert third.stats["skipped"] == 2 and third.stats["windows"] == 0 and not decodes
+        print("✅ Relance : fichiers inchangés sautés")
+
+        # 4) Débit selon la taille du pool
+        load_audio = real_load_audio
+        results = bench(tmp, (1, 2), worker_init=_init_stand_in, decode=_decode_stand_in, init_args=(0.02,))
+        assert results[1]["audio_hours_per_hour"] > results[0]["audio_hours_per_hour"]
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Transcription par lot (pool de processus Whisper)")
+    parser.add_argument("--self-check", action="store_true", help="Auto-test avec un décodeur factice")
+    sub = parser.add_subparsers(dest="command")
+    run = sub.add_parser("run", help="Transcrit des fichiers ou des dossiers (reprend un lot interrompu)")
+    run.add_argument("paths", nargs="+")
+    run.add_argument("--output-dir", default=str(OUTPUT_DIR))
+    run.add_argument("--workers", type=int, default=2)
+    run.add_argument("--model", default="base")
+    run.add_argument("--language", default="fr")
+    bench_cmd = sub.add_parser("bench", help="Débit (heures d'audio par heure) selon le nombre de processus")
+    bench_cmd.add_argument("paths", nargs="+")
+    bench_cmd.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    bench_cmd.add_argument("--model", default="base")
+    bench_cmd.add_argument("--output", default=None)
+    args = parser.parse_args()
+    if args.self_check:
+        _self_check()
+    elif args.command == "run":
+        BatchTranscriber(args.output_dir, args.workers, args.model, args.language).run(args.paths)
+    elif args.command == "bench":
+        bench(args.paths, args.workers, args.output, model_name=args.model)
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
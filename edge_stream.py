@@ -0,0 +1,383 @@
+"""
+Lecture edge-tts en streaming pour WillIAM
+- Une seule boucle asyncio, dans un thread de longue durée (plus de asyncio.run() par énoncé).
+- Les morceaux audio de Communicate.stream() sont décodés au fil de l'eau (MP3 -> PCM via un tube ffmpeg)
+  et poussés progressivement vers le périphérique de sortie : la lecture commence au premier morceau.
+- Source interchangeable : un serveur local de remplacement (morceaux PCM en HTTP chunked) sert à l'auto-test
+  (python edge_stream.py), sans réseau ni compte Microsoft.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EDGE_SAMPLE_RATE = 24000  # format par défaut d'edge-tts : audio-24khz-48kbitrate-mono-mp3
+
+# --- Sources de morceaux audio ---
+async def edge_source(text, voice, rate="+0%", pitch="+0Hz"):
+    """Morceaux MP3 d'edge-tts, au fur et à mesure de leur arrivée."""
+    import edge_tts
+    communicate = edge_tts.Communicate(text=text, voice=voice, rate=rate, pitch=pitch)
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            yield chunk["data"]
+
+async def http_chunked_source(host, port, path="/"):
+    """Morceaux d'une réponse HTTP/1.1 chunked (serveur local de remplacement)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode("ascii"))
+        await writer.drain()
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass  # en-têtes
+        while True:
+            size = int((await reader.readline()).strip() or b"0", 16)
+            if size == 0:
+                break
+            data = await reader.readexactly(size)
+            await reader.readexactly(2)
+            yield data
+    finally:
+        writer.close()
+
+# --- Décodage progressif ---
+class PCMDecoder:
+    """Octets PCM 16 bits mono -> float32, appelle on_pcm(waveform) à chaque morceau complet."""
+
+    def __init__(self, on_pcm):
+        self.on_pcm = on_pcm
+        self._rest = b""
+
+    def feed(self, data):
+        import numpy as np
+        data = self._rest + data
+        usable = len(data) - len(data) % 2
+        self._rest = data[usable:]
+        if usable:
+            self.on_pcm(np.frombuffer(data[:usable], "<i2").astype(np.float32) / 32768.0)
+
+    def close(self):
+        pass
+
+class FFmpegDecoder:
+    """MP3 (ou tout format compris par ffmpeg) -> PCM float32 via un tube ffmpeg.
+    Écriture et lecture du tube chacune dans son thread : feed() ne bloque jamais la boucle asyncio,
+    même quand ffmpeg attend qu'on vide sa sortie."""
+
+    def __init__(self, on_pcm, sample_rate=EDGE_SAMPLE_RATE, block_ms=100, input_format="mp3"):
+        self.on_pcm = on_pcm
+        # Format d'entrée imposé et sondage minimal : sinon ffmpeg attend des Ko d'entrée avant de décoder
+        probe = ["-f", input_format, "-probesize", "32", "-analyzeduration", "0"] if input_format else []
+        self.proc = subprocess.Popen(
+            ["ffmpeg", "-loglevel", "quiet", "-fflags", "nobuffer", *probe, "-i", "pipe:0",
+             "-f", "f32le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        self.block_bytes = 4 * int(sample_rate * block_ms / 1000)
+        self._pending = queue.Queue()
+        self._writer = threading.Thread(target=self._write, name="edge-ffmpeg-writer", daemon=True)
+        self._reader = threading.Thread(target=self._read, name="edge-ffmpeg-reader", daemon=True)
+        self._writer.start()
+        self._reader.start()
+
+    @staticmethod
+    def available():
+        return shutil.which("ffmpeg") is not None
+
+    def _read(self):
+        import numpy as np
+        rest = b""
+        while True:
+            data = self.proc.stdout.read1(self.block_bytes)
+            if not data:
+                break
+            data = rest + data
+            usable = len(data) - len(data) % 4  # un échantillon float32 peut être coupé entre deux lectures
+            rest = data[usable:]
+            if usable:
+                self.on_pcm(np.frombuffer(data[:usable], "<f4").copy())
+
+    def _write(self):
+        try:
+            while True:
+                data = self._pending.get()
+                if data is None:
+                    break
+                self.proc.stdin.write(data)
+                self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            logger.warning(f"Tube ffmpeg fermé: {e}")
+        finally:
+            try:
+                self.proc.stdin.close()
+            except Exception:
+                pass
+
+    def feed(self, data):
+        self._pending.put(data)
+
+    def close(self):
+        self._pending.put(None)
+        self._writer.join(timeout=10)
+        self._reader.join(timeout=10)
+        self.proc.wait(timeout=5)
+
+# --- Boucle persistante ---
+class EdgeStreamer:
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"utterances": 0, "last_ttfa": None, "last_duration": None}
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="edge-tts-loop", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro, timeout=None):
+        """Exécute une coroutine sur la boucle persistante et attend son résultat.
+        Au-delà de timeout, la coroutine est annulée sur la boucle (pas de flux orphelin) puis TimeoutError."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stream(self, source, sink, fmt="mp3", sample_rate=EDGE_SAMPLE_RATE, keep_bytes=False, timeout=60, token=None):
+        """Consomme une source de morceaux, décode et pousse le PCM vers sink(waveform) au fil de l'eau.
+        token : CancelToken vérifié à chaque morceau (réception arrêtée dès l'annulation).
+        Retourne les mesures (ttfa, durée audio, temps de réception) et les octets bruts si keep_bytes."""
+        t0 = time.perf_counter()
+        state = {"first_pcm": None, "samples": 0, "abandoned": False}
+        raw = []
+
+        def on_pcm(pcm):
+            if state["abandoned"]:
+                return  # l'appelant a abandonné (délai dépassé) : plus rien vers la sortie
+            if state["first_pcm"] is None:
+                state["first_pcm"] = time.perf_counter()
+            state["samples"] += len(pcm)
+            sink(pcm)
+
+        if fmt == "pcm":
+            decoder = PCMDecoder(on_pcm)
+        elif FFmpegDecoder.available():
+            decoder = FFmpegDecoder(on_pcm, sample_rate)
+        else:
+            decoder = None  # pas de décodeur progressif : l'appelant lit les octets complets
+
+        async def consume():
+            try:
+                async for data in source:
+                    if token is not None and token.cancelled:
+                        break
+                    if decoder is not None:
+                        decoder.feed(data)
+                    if keep_bytes or decoder is None:
+                        raw.append(data)
+            finally:
+                await source.aclose()  # ferme la connexion, y compris sur annulation
+
+        try:
+            self.run(consume(), timeout)
+        except concurrent.futures.TimeoutError:
+            state["abandoned"] = True
+            logger.warning(f"⌛ Flux edge-tts abandonné après {timeout}s")
+            raise
+        finally:
+            if decoder is not None:
+                decoder.close()
+        received = time.perf_counter() - t0
+        result = {
+            "streamed": decoder is not None,
+            "cancelled": token is not None and token.cancelled,
+            "ttfa": round(state["first_pcm"] - t0, 3) if state["first_pcm"] else None,
+            "receive_time": round(received, 3),
+            "duration": round(state["samples"] / sample_rate, 3),
+            "data": b"".join(raw) if raw else None,
+        }
+        self.stats["utterances"] += 1
+        self.stats["last_ttfa"] = result["ttfa"]
+        self.stats["last_duration"] = result["duration"]
+        return result
+
+    def speak(self, text, voice, rate="+0%", pitch="+0Hz", save_to_file=None, device=None, token=None):
+        """Lit un texte edge-tts en streaming sur le périphérique de sortie partagé (token : annulation)."""
+        if device is None:
+            from audio_output import get_output_device
+            device = get_output_device()
+        def sink(pcm):
+            if token is None or not token.cancelled:
+                device.write(pcm, EDGE_SAMPLE_RATE, wait=False)
+
+        device.begin_utterance()
+        try:
+            result = self.stream(
+                edge_source(text, voice, rate, pitch),
+                sink,
+                keep_bytes=bool(save_to_file),
+                token=token,
+            )
+            if result["streamed"] and not result["cancelled"]:
+                device.drain()
+        finally:
+            device.end_utterance()
+        if save_to_file and result["data"] and not result["cancelled"]:
+            with open(save_to_file, "wb") as f:
+                f.write(result["data"])
+        if result["streamed"]:
+            logger.info(f"⏱️ Edge TTS streaming: premier son {result['ttfa']}s, {result['duration']}s d'audio")
+        return result
+
+    def close(self):
+        with self._lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout=2)
+                self._loop = None
+
+edge_streamer = EdgeStreamer()
+
+# --- Serveur local de remplacement + auto-test ---
+def _encode_mp3(pcm, sample_rate):
+    """PCM 16 bits mono -> MP3 48 kbit/s (format edge-tts), via ffmpeg."""
+    return subprocess.run(
+        ["ffmpeg", "-loglevel", "quiet", "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-i", "pipe:0",
+         "-b:a", "48k", "-f", "mp3", "pipe:1"],
+        input=pcm, stdout=subprocess.PIPE, check=True,
+    ).stdout
+
+def start_standin_server(duration=1.5, chunk_ms=100, delay=0.05, sample_rate=EDGE_SAMPLE_RATE, first_delay=0.1, fmt="pcm"):
+    """Serveur HTTP local qui émet un signal (PCM 16 bits, ou MP3 comme edge-tts si fmt="mp3") en morceaux
+    chunked, avec latence simulée. Retourne (serveur, port) ; serveur.shutdown() pour l'arrêter."""
+    import math
+    import struct
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    n = int(duration * sample_rate)
+    audio = struct.pack(f"<{n}h", *(int(8000 * math.sin(2 * math.pi * 220 * i / sample_rate)) for i in range(n)))
+    chunk = 2 * int(sample_rate * chunk_ms / 1000)
+    if fmt == "mp3":
+        audio = _encode_mp3(audio, sample_rate)
+        chunk = 6 * int(chunk_ms)  # 48 kbit/s = 6 octets par ms
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg" if fmt == "mp3" else "audio/L16")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            time.sleep(first_delay)
+            try:
+                for i in range(0, len(audio), chunk):
+                    part = audio[i:i + chunk]
+                    self.wfile.write(f"{len(part):x}\r\n".encode("ascii") + part + b"\r\n")
+                    self.wfile.flush()
+                    time.sleep(delay)
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client parti (flux annulé)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, name="edge-standin", daemon=True).start()
+    return server, server.server_address[1]
+
+def _check_format(fmt, tolerance):
+    server, port = start_standin_server(duration=1.5, fmt=fmt)
+    try:
+        for attempt in range(2):  # deux énoncés : la même boucle doit resservir
+            received = []
+            result = edge_streamer.stream(http_chunked_source("127.0.0.1", port), received.append, fmt=fmt)
+            assert result["streamed"] and abs(result["duration"] - 1.5) < tolerance, result
+            assert len(received) > 5, "l'audio doit arriver en plusieurs morceaux"
+            assert result["ttfa"] < result["receive_time"] / 2, "le premier son doit précéder la fin du flux"
+            print(f"✅ {fmt.upper()}, énoncé {attempt + 1}: {len(received)} morceaux, premier son {result['ttfa']}s, "
+                  f"flux complet {result['receive_time']}s, {result['duration']}s d'audio")
+    finally:
+        server.shutdown()
+
+def _check_backpressure():
+    """Sortie ffmpeg non lue (consommateur lent) : feed() doit rendre la main sans attendre le tube."""
+    gate = threading.Event()
+    decoder = FFmpegDecoder(lambda pcm: gate.wait())
+    data = _encode_mp3(b"\0\0" * EDGE_SAMPLE_RATE * 20, EDGE_SAMPLE_RATE)  # 20 s : bien plus que les tubes
+    t0 = time.perf_counter()
+    for i in range(0, len(data), 4096):
+        decoder.feed(data[i:i + 4096])
+    elapsed = time.perf_counter() - t0
+    gate.set()
+    decoder.close()
+    assert elapsed < 0.5, f"feed() bloqué {elapsed:.2f}s"
+    print(f"✅ feed() non bloquant avec un tube ffmpeg plein ({elapsed * 1000:.1f} ms pour {len(data)} octets)")
+
+def _check_cancel():
+    """Jeton annulé en cours de flux : la réception s'arrête, rien n'est poussé après l'annulation."""
+    from speech_scheduler import CancelToken
+    server, port = start_standin_server(duration=1.5)
+    token = CancelToken()
+    received = []
+
+    def sink(pcm):
+        received.append(pcm)
+        if len(received) == 3:
+            token.cancel("barge-in")
+
+    try:
+        result = edge_streamer.stream(http_chunked_source("127.0.0.1", port), sink, fmt="pcm", token=token)
+    finally:
+        server.shutdown()
+    assert result["cancelled"] and len(received) == 3 and result["duration"] < 0.5, result
+    print(f"✅ Annulation : flux arrêté après {len(received)} morceaux ({result['receive_time']}s)")
+
+def _check_timeout():
+    """Source bloquée : TimeoutError à l'échéance, coroutine annulée sur la boucle, plus aucun PCM ensuite."""
+    server, port = start_standin_server(duration=3.0, delay=0.2)
+    received = []
+    t0 = time.perf_counter()
+    try:
+        edge_streamer.stream(http_chunked_source("127.0.0.1", port), received.append, fmt="pcm", timeout=0.5)
+        raise AssertionError("TimeoutError attendu")
+    except concurrent.futures.TimeoutError:
+        elapsed = time.perf_counter() - t0
+    n = len(received)
+    time.sleep(0.6)  # la source aurait encore envoyé ~3 morceaux
+    server.shutdown()
+    pending = [t for t in asyncio.all_tasks(edge_streamer._loop) if not t.done()]
+    assert len(received) == n and not pending, (n, len(received), pending)
+    print(f"✅ Délai dépassé : flux annulé après {elapsed:.2f}s, "
+          f"{n} morceau(x), rien de plus ensuite")
+
+def _self_check():
+    try:
+        _check_format("pcm", 0.01)
+        _check_cancel()
+        _check_timeout()
+        if FFmpegDecoder.available():
+            _check_format("mp3", 0.1)  # délai et remplissage de l'encodeur MP3
+            _check_backpressure()
+        else:
+            print("⚠️ ffmpeg absent : chemin MP3 -> FFmpegDecoder non testé")
+        assert edge_streamer._thread.is_alive(), "la boucle asyncio doit rester active entre deux énoncés"
+        print("✅ Boucle asyncio persistante réutilisée")
+    finally:
+        edge_streamer.close()
+
+if __name__ == "__main__":
+    _self_check()
@@ -0,0 +1,155 @@
+"""
+Banque audio pré-rendue pour WillIAM (acquiescements, attentes, erreurs, réponses de secours)
+- Rendu par lot en arrière-plan avec la voix clonée, une seule fois : un manifeste (manifest.json)
+  trace le texte, le speaker et le moteur de chaque clip ; seuls les clips absents ou périmés sont refaits.
+- Toute la banque est gardée en mémoire en PCM float32 : lecture immédiate, sans modèle ni décodage,
+  pendant que le LLM ou XTTS travaillent encore (pas de blanc audible).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from audio_output import read_wav_file
+from speaker_latents import speaker_latents, write_wav
+from tts_cache import normalize_cache_text
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+class FillerBank:
+    def __init__(self, bank_dir, phrases, render_fn, engine="xtts"):
+        """phrases : {nom_fichier: texte} ; render_fn(texte) -> (waveform float32, sample_rate)."""
+        self.bank_dir = Path(bank_dir)
+        self.phrases = dict(phrases)
+        self.render_fn = render_fn
+        self.engine = engine
+        self.manifest_path = self.bank_dir / "manifest.json"
+        self.lock = threading.Lock()
+        self._pcm = {}  # texte normalisé -> (waveform, sample_rate)
+        self._thread = None
+        self.ready = threading.Event()
+        self.stats = {"rendered": 0, "loaded": 0, "failed": 0, "hits": 0, "render_time": 0.0}
+
+    # --- Manifeste ---
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+        except Exception:
+            pass
+        return {"version": MANIFEST_VERSION, "clips": {}}
+
+    def _save_manifest(self, manifest):
+        tmp = self.manifest_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.manifest_path)
+
+    def _fingerprint(self, text, speaker_wav):
+        """Empreinte d'un clip : texte + moteur + contenu du speaker (un nouvel échantillon invalide tout)."""
+        speaker = ""
+        if speaker_wav and os.path.exists(speaker_wav):
+            speaker = speaker_latents.file_hash(speaker_wav)
+        return hashlib.sha256(f"{self.engine}|{speaker}|{text}".encode("utf-8")).hexdigest()
+
+    # --- Rendu par lot ---
+    def render_async(self, speaker_wav=None):
+        """Lance (une fois) le rendu/chargement en arrière-plan. Retourne le thread."""
+        with self.lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self.render_all, args=(speaker_wav,), name="filler-bank", daemon=True
+                )
+                self._thread.start()
+            return self._thread
+
+    def render_all(self, speaker_wav=None):
+        """Charge les clips à jour, rend ceux qui manquent, met le manifeste à jour."""
+        self.bank_dir.mkdir(parents=True, exist_ok=True)
+        manifest = self._load_manifest()
+        clips = manifest["clips"]
+        # Les clips valides sont chargés d'abord : la banque sert avant la fin du rendu
+        todo = []
+        for name, text in self.phrases.items():
+            entry = clips.get(name)
+            path = self.bank_dir / name
+            if entry and entry.get("fingerprint") == self._fingerprint(text, speaker_wav) and path.exists():
+                try:
+                    self._store(text, *read_wav_file(path))
+                    self.stats["loaded"] += 1
+                    continue
+                except Exception as e:
+                    logger.warning(f"Clip {name} illisible, nouveau rendu: {e}")
+            todo.append((name, text))
+        if todo:
+            logger.info(f"🎙️ Banque audio : {len(todo)} clip(s) à générer")
+        for name, text in todo:
+            t0 = time.perf_counter()
+            try:
+                wav, sample_rate = self.render_fn(text)
+                write_wav(self.bank_dir / name, wav, sample_rate)
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.warning(f"❌ Échec génération {name} : {e}")
+                continue
+            self._store(text, wav, sample_rate)
+            elapsed = time.perf_counter() - t0
+            self.stats["rendered"] += 1
+            self.stats["render_time"] += elapsed
+            clips[name] = {
+                "text": text,
+                "fingerprint": self._fingerprint(text, speaker_wav),
+                "engine": self.engine,
+                "sample_rate": int(sample_rate),
+                "duration": round(len(wav) / sample_rate, 3),
+                "render_time": round(elapsed, 3),
+            }
+            self._save_manifest(manifest)
+        # Clips qui ne font plus partie de la banque
+        for name in [n for n in clips if n not in self.phrases]:
+            clips.pop(name)
+            (self.bank_dir / name).unlink(missing_ok=True)
+        self._save_manifest(manifest)
+        self.ready.set()
+        logger.info(
+            f"✅ Banque audio prête ({len(self._pcm)} clips, {self.stats['rendered']} générés, "
+            f"{self.stats['loaded']} chargés)"
+        )
+
+    def _store(self, text, wav, sample_rate):
+        with self.lock:
+            self._pcm[normalize_cache_text(text)] = (wav, sample_rate)
+
+    # --- Lecture ---
+    def get(self, text):
+        """Retourne (waveform, sample_rate) si la phrase est dans la banque, sinon None."""
+        with self.lock:
+            clip = self._pcm.get(normalize_cache_text(text))
+        if clip is not None:
+            self.stats["hits"] += 1
+        return clip
+
+    def get_by_name(self, name):
+        text = self.phrases.get(name)
+        return self.get(text) if text else None
+
+    def __contains__(self, text):
+        with self.lock:
+            return normalize_cache_text(text) in self._pcm
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["clips"] = len(self._pcm)
+            stats["memory_bytes"] = sum(wav.nbytes for wav, _ in self._pcm.values())
+        stats["ready"] = self.ready.is_set()
+        stats["render_time"] = round(stats["render_time"], 2)
+        return stats
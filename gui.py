@@ -3,6 +3,7 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import QTimer, Qt, QTime, Signal, Slot
 from PySide6.QtGui import QFont, QColor, QPainter, QPen
+import html
 import sys
 import random
 import time
@@ -47,6 +48,7 @@ class WaveformWidget(QWidget):
 
 class WilliamGUI(QMainWindow):
     toggle_listen = Signal(bool)
+    partial_transcript = Signal(str, str)  # émis depuis le thread STT, affiché dans le thread GUI
 
     def __init__(self):
         super().__init__()
@@ -90,6 +92,14 @@ class WilliamGUI(QMainWindow):
         """)
         self.layout.addWidget(self.output_text, 2)
 
+        # --- Transcription partielle (pendant que l'utilisateur parle) ---
+        self.partial_label = QLabel("")
+        self.partial_label.setFont(QFont("Fira Mono", 13))
+        self.partial_label.setWordWrap(True)
+        self.partial_label.setStyleSheet("color: #e0d0ff;")
+        self.layout.addWidget(self.partial_label)
+        self.partial_transcript.connect(self._set_partial)
+
         # --- Listen State and Controls ---
         controls = QHBoxLayout()
         self.listen_label = QLabel("Écoute : INACTIVE")
@@ -147,6 +157,20 @@ class WilliamGUI(QMainWindow):
         # Ajoute la transcription live en bas
         self.output_text.append(f'<span style="color:{color}">{text}</span>')
 
+    def show_partial_transcription(self, stable, tail=""):
+        # Hypothèse partielle : préfixe stable en clair, suite encore incertaine en gris ("", "" efface)
+        self.partial_transcript.emit(stable, tail)
+
+    @Slot(str, str)
+    def _set_partial(self, stable, tail):
+        if not stable and not tail:
+            self.partial_label.setText("")
+            return
+        # Texte transcrit échappé : "<" ou "&" dans la parole ne doivent pas devenir du balisage
+        self.partial_label.setText(
+            f'🎙️ {html.escape(stable)} <span style="color:#8a7a99">{html.escape(tail)}</span>'
+        )
+
     def set_diagnostic(self, state):
         color = "#36e636" if state == "✅" else ("#ff5555" if state == "❌" else "#ffd700")
         self.diagnostic_label.setStyleSheet(f"color: {color}; font-weight: bold;")
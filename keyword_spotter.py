@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Détection locale de mots-clés (réveil / mise en veille) pour WillIAM
+- Log-mel en NumPy + comparaison DTW à des modèles enregistrés par l'utilisateur (quelques prises par mot-clé,
+  data/kws/<mot>/take_N.wav) : aucun appel réseau, aucun modèle acoustique à charger.
+- En veille, seul un calcul d'énergie par bloc micro tourne (porte d'énergie avec plancher de bruit adaptatif) ;
+  les log-mel et la DTW ne sont calculés que pendant la parole, sur la dernière fenêtre de l'anneau audio.
+- La reconnaissance complète (Whisper / Google) ne démarre qu'après une détection.
+- Seuil par mot-clé calibré sur l'écart entre ses prises et sur la distance aux imposteurs (autres mots-clés,
+  phrases négatives enregistrées dans data/kws/_negatives) : à mi-chemin entre les deux.
+- La décision attend que l'alignement se termine avant le bord de la fenêtre (mot fini, pas un préfixe).
+- Mesures : CPU par seconde d'audio (veille / parole), latence de détection (fin du mot -> décision).
+- python keyword_spotter.py enroll william --takes 3 | enroll --negative "quelle heure est-il" | listen | --self-check
+"""
+
+import argparse
+import functools
+import logging
+import queue
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+KWS_DIR = Path("data/kws")
+SAMPLE_RATE = 16000
+WIN = 400       # 25 ms
+HOP = 160       # 10 ms
+N_FFT = 512
+N_MELS = 40
+BLOCK_MS = 20
+DEFAULT_THRESHOLD = 0.30   # distance cosinus moyenne le long du chemin DTW (un seul modèle enregistré)
+MIN_THRESHOLD = 0.08       # sans imposteur connu : garde de la tolérance au débit et au bruit
+MAX_THRESHOLD = 0.40
+THRESHOLD_MARGIN = 1.5     # sans imposteur connu : seuil = pire distance entre prises d'un même mot x marge
+IMPOSTOR_SHARE = 0.5       # avec imposteurs : seuil à mi-chemin entre la pire prise et l'imposteur le plus proche
+SETTLE_FRAMES = 3          # alignement terminé dans les 30 dernières ms : le mot continue peut-être, on attend
+NEGATIVES_DIR = "_negatives"
+
+# --- Caractéristiques ---
+@functools.lru_cache(maxsize=4)
+def mel_filterbank(sample_rate=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS, fmin=60.0, fmax=None):
+    """Banc de filtres triangulaires mel (HTK), calculé une seule fois."""
+    import numpy as np
+    fmax = fmax or sample_rate / 2
+    mel = lambda f: 2595.0 * np.log10(1.0 + f / 700.0)
+    hz = lambda m: 700.0 * (10.0 ** (m / 2595.0) - 1.0)
+    edges = hz(np.linspace(mel(fmin), mel(fmax), n_mels + 2))
+    bins = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    fb = np.maximum(0.0, np.minimum((bins - lower) / (center - lower), (upper - bins) / (upper - center)))
+    return fb.astype(np.float32)
+
+@functools.lru_cache(maxsize=1)
+def _window():
+    import numpy as np
+    return np.hanning(WIN).astype(np.float32)
+
+def log_mel(wav, sample_rate=SAMPLE_RATE):
+    """(trames, N_MELS) log-mel ; les trames sont une vue glissante du signal."""
+    import numpy as np
+    wav = np.asarray(wav, dtype=np.float32)
+    if len(wav) < WIN:
+        return np.zeros((0, N_MELS), np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(wav, WIN)[::HOP] * _window()
+    power = np.abs(np.fft.rfft(frames, N_FFT)) ** 2
+    return np.log(power @ mel_filterbank(sample_rate).T + 1e-6).astype(np.float32)
+
+def normalize_features(features):
+    """Par trame : soustraction de la moyenne sur les bandes (gain micro, indépendant de la fenêtre et
+    des silences qu'elle contient) puis normalisation L2 (distance cosinus)."""
+    import numpy as np
+    features = features - features.mean(axis=1, keepdims=True)
+    return features / (np.linalg.norm(features, axis=1, keepdims=True) + 1e-6)
+
+def subsequence_dtw(template, window):
+    """Meilleur alignement du modèle n'importe où dans la fenêtre (début et fin libres).
+    Pas (1,1), (1,2), (2,1) : pente entre 1/2 et 2, le modèle ne peut pas se tasser sur quelques trames
+    (sinon un début de mot suffit). Chaque trame du modèle compte une fois ; vectorisé sur la fenêtre.
+    Retourne (distance moyenne, indice de la dernière trame alignée dans la fenêtre)."""
+    import numpy as np
+    if len(window) == 0:
+        return float("inf"), -1
+    cost = 1.0 - template @ window.T
+    acc, prev, prev_row = cost[0].copy(), None, cost[0]
+    for row in cost[1:]:
+        best = np.full_like(acc, np.inf)
+        best[1:] = acc[:-1]
+        best[2:] = np.minimum(best[2:], acc[:-2])
+        if prev is not None:
+            best[1:] = np.minimum(best[1:], prev[:-1] + prev_row[1:])
+        prev, prev_row, acc = acc, row, row + best
+    end = int(acc.argmin())
+    return float(acc[end]) / len(template), end
+
+def keyword_slug(keyword):
+    text = unicodedata.normalize("NFKD", keyword.lower()).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "_", text).strip("_")
+
+# --- Détecteur ---
+class KeywordSpotter:
+    def __init__(self, templates_dir=KWS_DIR, sample_rate=SAMPLE_RATE, check_every_ms=100, gate_db=10.0,
+                 hangover_ms=300, refractory_ms=1000):
+        self.templates_dir = Path(templates_dir)
+        self.sample_rate = sample_rate
+        self.check_every = int(sample_rate * check_every_ms / 1000)
+        self.gate_db = gate_db
+        self.hangover = int(sample_rate * hangover_ms / 1000)
+        self.refractory = int(sample_rate * refractory_ms / 1000)
+        self.templates = {}   # mot-clé -> [log-mel normalisés]
+        self.negatives = []   # phrases qui ne doivent pas déclencher (log-mel normalisés)
+        self.thresholds = {}
+        self.calibration = {} # mot-clé -> (pire distance entre prises, distance à l'imposteur le plus proche)
+        self.max_window = 0
+        self.reset()
+        self.stats = {"audio_idle": 0.0, "audio_voiced": 0.0, "cpu_idle": 0.0, "cpu_voiced": 0.0,
+                      "checks": 0, "hits": 0, "latencies": deque(maxlen=50)}
+
+    # --- Modèles ---
+    def load(self):
+        """Charge les prises enregistrées (data/kws/<mot>/*.wav) et calibre un seuil par mot-clé."""
+        from audio_output import read_wav_file
+        self.templates.clear()
+        self.negatives = []
+        for directory in sorted(p for p in self.templates_dir.glob("*") if p.is_dir()):
+            takes = []
+            for path in sorted(directory.glob("*.wav")):
+                try:
+                    wav, sr = read_wav_file(path)
+                    takes.append(self._template(wav, sr))
+                except Exception as e:
+                    logger.warning(f"Prise {path} illisible: {e}")
+            if directory.name == NEGATIVES_DIR:
+                self.negatives = takes
+            elif takes:
+                self.templates[self._read_label(directory)] = takes
+        self._calibrate()
+        if self.templates:
+            logger.info(f"👂 Mots-clés locaux : {', '.join(f'{k} ({len(v)} prises)' for k, v in self.templates.items())}")
+        return self
+
+    @staticmethod
+    def _read_label(directory):
+        label = directory / "label.txt"
+        return label.read_text(encoding="utf-8").strip() if label.exists() else directory.name
+
+    def _template(self, wav, sample_rate):
+        from audio_dsp import trim_silence
+        if sample_rate != self.sample_rate:
+            from audio_output import resample
+            wav = resample(wav, sample_rate, self.sample_rate)
+        wav = trim_silence(wav, self.sample_rate, threshold_db=-35.0, pad_ms=20)
+        return normalize_features(log_mel(wav, self.sample_rate))
+
+    def _calibrate(self):
+        """Un seuil par mot-clé, entre l'écart de ses prises et les imposteurs (autres mots, phrases négatives)."""
+        self.thresholds.clear()
+        self.calibration.clear()
+        for keyword, takes in self.templates.items():
+            pairs = [subsequence_dtw(a, b)[0] for i, a in enumerate(takes) for j, b in enumerate(takes) if i != j]
+            impostors = [other for k, ts in self.templates.items() if k != keyword for other in ts] + self.negatives
+            spread = max(pairs) if pairs else None
+            nearest = min((subsequence_dtw(t, other)[0] for t in takes for other in impostors), default=None)
+            if nearest is None:
+                threshold = (min(MAX_THRESHOLD, max(MIN_THRESHOLD, spread * THRESHOLD_MARGIN))
+                             if spread is not None else DEFAULT_THRESHOLD)
+            else:
+                floor = spread if spread is not None else 0.0
+                threshold = min(MAX_THRESHOLD, floor + IMPOSTOR_SHARE * (nearest - floor))
+                if nearest <= floor:
+                    logger.warning(f"⚠️ Mot-clé « {keyword} » confondu avec un imposteur "
+                                   f"(prises jusqu'à {floor:.3f}, imposteur à {nearest:.3f}) : réenregistrez-le")
+            self.thresholds[keyword] = threshold
+            self.calibration[keyword] = (spread, nearest)
+        longest = max((len(t) for ts in self.templates.values() for t in ts), default=0)
+        # Pente DTW au plus 2 : un mot prononcé deux fois plus lentement tient encore dans la fenêtre
+        self.max_window = (2 * longest + 10) * HOP + WIN if longest else 0
+
+    def enroll(self, keyword, wav, sample_rate=SAMPLE_RATE):
+        """Ajoute une prise d'un mot-clé (enregistrée sur disque) et recalibre son seuil."""
+        from speaker_latents import write_wav
+        directory = self.templates_dir / keyword_slug(keyword)
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / "label.txt").write_text(keyword, encoding="utf-8")
+        path = directory / f"take_{len(list(directory.glob('*.wav'))) + 1}.wav"
+        write_wav(path, wav, sample_rate)
+        self.templates[keyword] = self.templates.get(keyword, []) + [self._template(wav, sample_rate)]
+        self._calibrate()
+        return path
+
+    def enroll_negative(self, wav, sample_rate=SAMPLE_RATE):
+        """Ajoute une phrase qui ne doit pas déclencher (proche d'un mot-clé) et recalibre les seuils."""
+        from speaker_latents import write_wav
+        directory = self.templates_dir / NEGATIVES_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"phrase_{len(list(directory.glob('*.wav'))) + 1}.wav"
+        write_wav(path, wav, sample_rate)
+        self.negatives.append(self._template(wav, sample_rate))
+        self._calibrate()
+        return path
+
+    def has_keywords(self, keywords=None):
+        return bool(self.templates) if not keywords else any(k in self.templates for k in keywords)
+
+    # --- Détection sur un tampon complet ---
+    def detect(self, wav, keywords=None, sample_rate=SAMPLE_RATE):
+        """Cherche les mots-clés dans un énoncé déjà enregistré. Retourne (mot, distance) ou None."""
+        if sample_rate != self.sample_rate:
+            from audio_output import resample
+            wav = resample(wav, sample_rate, self.sample_rate)
+        hit = self._match(normalize_features(log_mel(wav, self.sample_rate)), keywords)
+        return (hit[0], hit[1]) if hit else None
+
+    def _match(self, window, keywords=None):
+        best = None
+        for keyword, takes in self.templates.items():
+            if keywords and keyword not in keywords:
+                continue
+            for template in takes:
+                score, end = subsequence_dtw(template, window)
+                if score <= self.thresholds[keyword] and (best is None or score < best[1]):
+                    best = (keyword, score, end)
+        return best
+
+    # --- Détection en flux ---
+    def reset(self):
+        import numpy as np
+        self._ring = np.zeros(0, np.float32)
+        self._noise_db = None
+        self._since_voice = None
+        self._since_check = 0
+        self._refractory_left = 0
+        self._samples = 0
+
+    def process(self, block, keywords=None):
+        """Traite un bloc micro (float32 mono). Retourne {"keyword", "score", "latency"} ou None."""
+        import numpy as np
+        t0 = time.thread_time()
+        block = np.asarray(block, dtype=np.float32).reshape(-1)
+        self._samples += len(block)
+        self._ring = np.concatenate((self._ring, block))[-max(self.max_window, self.hangover + len(block)):]
+        if self._refractory_left > 0:
+            self._refractory_left -= len(block)
+            self._account(t0, len(block), voiced=False)
+            return None
+        energy = 10.0 * np.log10(float(np.dot(block, block)) / max(1, len(block)) + 1e-12)
+        if self._noise_db is None:
+            self._noise_db = energy
+        voiced = energy > self._noise_db + self.gate_db
+        if not voiced:
+            # Plancher de bruit : suit vite les baisses, lentement les hausses
+            rate = 0.5 if energy < self._noise_db else 0.02
+            self._noise_db += rate * (energy - self._noise_db)
+        if voiced:
+            self._since_voice = 0
+        elif self._since_voice is not None:
+            self._since_voice += len(block)
+            if self._since_voice > self.hangover:
+                self._since_voice = None
+        hit = None
+        active = self._since_voice is not None
+        if active and self.templates:
+            self._since_check += len(block)
+            if self._since_check >= self.check_every:
+                self._since_check = 0
+                hit = self._check(keywords)
+        self._account(t0, len(block), voiced=active)
+        return hit
+
+    def _check(self, keywords):
+        self.stats["checks"] += 1
+        window = self._ring[-self.max_window:]
+        features = log_mel(window, self.sample_rate)
+        hit = self._match(normalize_features(features), keywords)
+        if hit is None:
+            return None
+        keyword, score, end = hit
+        if end >= len(features) - SETTLE_FRAMES:
+            return None  # alignement collé au bord : le mot n'est peut-être pas fini, décision au prochain contrôle
+        # Latence : fin du mot (dernière trame alignée) -> décision, en temps du flux audio
+        match_end = len(window) - (end * HOP + WIN)
+        latency = max(0, match_end) / self.sample_rate
+        self.stats["hits"] += 1
+        self.stats["latencies"].append(latency)
+        self._refractory_left = self.refractory
+        self._ring = self._ring[:0]
+        self._since_voice = None
+        return {"keyword": keyword, "score": round(score, 3), "latency": round(latency, 3)}
+
+    def _account(self, t0, n, voiced):
+        key = "voiced" if voiced else "idle"
+        self.stats[f"cpu_{key}"] += time.thread_time() - t0
+        self.stats[f"audio_{key}"] += n / self.sample_rate
+
+    def get_stats(self):
+        s = self.stats
+        latencies = list(s["latencies"])
+        return {
+            "keywords": {k: {"takes": len(v), "threshold": round(self.thresholds[k], 3),
+                             "spread": _round(self.calibration[k][0]), "nearest_impostor": _round(self.calibration[k][1])}
+                         for k, v in self.templates.items()},
+            "negatives": len(self.negatives),
+            "checks": s["checks"],
+            "hits": s["hits"],
+            # Fraction d'un cœur : secondes CPU par seconde d'audio
+            "cpu_idle": round(s["cpu_idle"] / s["audio_idle"], 5) if s["audio_idle"] else None,
+            "cpu_voiced": round(s["cpu_voiced"] / s["audio_voiced"], 5) if s["audio_voiced"] else None,
+            "avg_latency": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "max_latency": round(max(latencies), 3) if latencies else None,
+        }
+
+    # --- Micro ---
+    def wait_for(self, keywords=None, timeout=None, device=None):
+        """Écoute le micro (sounddevice) jusqu'à un mot-clé. Retourne la détection, ou None au bout de timeout."""
+        import sounddevice as sd
+        blocks = queue.Queue()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.reset()
+        with sd.InputStream(samplerate=self.sample_rate, channels=1, dtype="float32", device=device,
+                            blocksize=int(self.sample_rate * BLOCK_MS / 1000),
+                            callback=lambda data, frames, t, status: blocks.put(data[:, 0].copy())):
+            while deadline is None or time.monotonic() < deadline:
+                try:
+                    block = blocks.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                hit = self.process(block, keywords)
+                if hit:
+                    logger.info(f"👂 Mot-clé « {hit['keyword']} » (distance {hit['score']}, latence {hit['latency']}s)")
+                    return hit
+        return None
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+def record_take(seconds=2.0, device=None):
+    import sounddevice as sd
+    wav = sd.rec(int(seconds * SAMPLE_RATE), samplerate=SAMPLE_RATE, channels=1, dtype="float32", device=device)
+    sd.wait()
+    return wav[:, 0]
+
+_spotter = None
+_spotter_lock = threading.Lock()
+
+def get_spotter():
+    """Détecteur partagé, modèles chargés au premier usage."""
+    global _spotter
+    with _spotter_lock:
+        if _spotter is None:
+            _spotter = KeywordSpotter().load()
+        return _spotter
+
+# --- Auto-test (signaux synthétiques, sans micro) ---
+def _synthetic_word(glides, duration, rng, sample_rate=SAMPLE_RATE, noise=0.01):
+    """« Mot » synthétique : suite de glissandos harmoniques (formants grossiers) + bruit."""
+    import numpy as np
+    n = int(duration * sample_rate)
+    t = np.arange(n) / sample_rate
+    f0 = np.concatenate([np.linspace(a, b, n // len(glides) + 1) for a, b in glides])[:n]
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    wav = sum(np.sin(k * phase) / k for k in range(1, 5)) * 0.2 * np.hanning(n) ** 0.3
+    return (wav + noise * rng.standard_normal(n)).astype(np.float32)
+
+def _self_check():
+    import tempfile
+    import numpy as np
+    rng = np.random.default_rng(0)
+    wake = [(180, 320), (320, 220), (220, 400)]
+    sleep = [(400, 150), (150, 150)]
+    other = [(250, 260), (260, 500), (500, 300)]
+    # Phrase négative : commence comme « william » puis diverge (le préfixe seul ne doit pas suffire)
+    near_miss = [(180, 320), (320, 220), (220, 150), (150, 260)]
+    with tempfile.TemporaryDirectory() as tmp:
+        spotter = KeywordSpotter(templates_dir=tmp)
+        for d in (0.55, 0.6, 0.65):
+            spotter.enroll("william", _synthetic_word(wake, d, rng))
+            spotter.enroll("stop", _synthetic_word(sleep, d * 0.7, rng))
+        spotter.enroll_negative(_synthetic_word(near_miss, 0.8, rng))
+        spotter = KeywordSpotter(templates_dir=tmp).load()  # relu depuis le disque
+        stats = spotter.get_stats()
+        assert stats["negatives"] == 1
+        for keyword, k in stats["keywords"].items():
+            # Séparation : le seuil tombe strictement entre les prises et l'imposteur le plus proche
+            assert k["spread"] < k["threshold"] < k["nearest_impostor"], (keyword, k)
+        print(f"✅ Modèles : {stats['keywords']}")
+        silence = lambda s: (0.003 * rng.standard_normal(int(s * SAMPLE_RATE))).astype(np.float32)
+        # Flux : bruit, mot parasite, phrase négative, mot de réveil (plus lent), bruit, mot de veille, bruit
+        parts = [silence(3.0), _synthetic_word(other, 0.6, rng), silence(1.0), _synthetic_word(near_miss, 0.85, rng),
+                 silence(1.0), _synthetic_word(wake, 0.7, rng), silence(1.0), _synthetic_word(sleep, 0.4, rng), silence(1.0)]
+        ends = np.cumsum([len(p) for p in parts]) / SAMPLE_RATE
+        stream = np.concatenate(parts)
+        block = int(SAMPLE_RATE * BLOCK_MS / 1000)
+        hits = []
+        for i in range(0, len(stream), block):
+            hit = spotter.process(stream[i:i + block])
+            if hit:
+                hits.append((hit["keyword"], (i + block) / SAMPLE_RATE, hit))
+        assert [h[0] for h in hits] == ["william", "stop"], hits
+        for (keyword, t, hit), word_end in zip(hits, (ends[5], ends[7])):
+            delay = t - word_end
+            # Jamais avant la fin du mot (à la trame d'analyse près), au plus un contrôle + hangover après
+            assert -0.03 <= delay < 0.35, (keyword, delay)
+            print(f"✅ « {keyword} » détecté à {delay * 1000:+.0f} ms de la fin du mot "
+                  f"(distance {hit['score']}, seuil {spotter.thresholds[keyword]:.3f})")
+        assert spotter.detect(_synthetic_word(other, 0.6, rng)) is None
+        negative = spotter.detect(_synthetic_word(near_miss, 0.8, rng))
+        prefix = spotter.detect(_synthetic_word(wake[:2], 0.4, rng), keywords=["william"])
+        assert negative is None and prefix is None, (negative, prefix)
+        k = stats["keywords"]["william"]
+        print(f"✅ Phrase négative et début de mot rejetés : prises ≤ {k['spread']}, seuil {k['threshold']}, "
+              f"imposteur le plus proche {k['nearest_impostor']}")
+        assert spotter.detect(_synthetic_word(wake, 0.6, rng), keywords=["william"])[0] == "william"
+        # CPU en veille : 60 s de bruit de fond seul
+        idle = KeywordSpotter(templates_dir=tmp).load()
+        quiet = silence(60.0)
+        for i in range(0, len(quiet), block):
+            idle.process(quiet[i:i + block])
+        stats, busy = idle.get_stats(), spotter.get_stats()
+        assert stats["checks"] == 0 and stats["cpu_idle"] < 0.01, stats
+        print(f"✅ CPU veille : {stats['cpu_idle'] * 100:.3f} % d'un cœur ; pendant la parole : "
+              f"{busy['cpu_voiced'] * 100:.2f} % ({busy['checks']} comparaisons DTW)")
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Détection locale de mots-clés (réveil / veille)")
+    parser.add_argument("--self-check", action="store_true", help="Auto-test sur signaux synthétiques")
+    sub = parser.add_subparsers(dest="command")
+    enroll = sub.add_parser("enroll", help="Enregistre des prises d'un mot-clé au micro")
+    enroll.add_argument("keyword")
+    enroll.add_argument("--takes", type=int, default=3)
+    enroll.add_argument("--seconds", type=float, default=2.0)
+    enroll.add_argument("--negative", action="store_true", help="Phrase qui ne doit PAS déclencher (calibre les seuils)")
+    sub.add_parser("listen", help="Écoute en continu et affiche les détections")
+    args = parser.parse_args()
+    if args.self_check:
+        _self_check()
+    elif args.command == "enroll":
+        spotter = KeywordSpotter().load()
+        for i in range(args.takes):
+            input(f"🎙️ Prise {i + 1}/{args.takes} : appuyez sur Entrée puis dites « {args.keyword} »")
+            take = record_take(args.seconds)
+            print(f"✅ {spotter.enroll_negative(take) if args.negative else spotter.enroll(args.keyword, take)}")
+        print(f"Seuils calibrés : {spotter.get_stats()['keywords']}")
+    elif args.command == "listen":
+        spotter = KeywordSpotter().load()
+        if not spotter.has_keywords():
+            parser.error("aucun mot-clé enregistré (python keyword_spotter.py enroll william)")
+        try:
+            while True:
+                spotter.wait_for()
+        except KeyboardInterrupt:
+            print(spotter.get_stats())
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
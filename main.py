@@ -5,8 +5,8 @@ import os
 import json
 
 from gui import WilliamGUI
-from stt import listen
-from tts import speak, preload_tts, ensure_voice_cache  # Ajout ici
+from stt import listen, stt_service
+from tts import speak, preload_tts, ensure_voice_cache, barge_in  # Ajout ici
 from ollama_api import ollama_chat
 
 # === Ajout pour le Mode REPAIR ===
@@ -163,6 +163,7 @@ def main_gui():
     # Préchargement TTS pour réactivité (XTTS, pyttsx3, etc)
     try:
         preload_tts()
+        stt_service.start_loading()  # Whisper résident : le premier tour ne paie pas le chargement
         ensure_voice_cache()  # <--- Ajout ici : génère les samples voix manquants
     except Exception:
         pass
@@ -179,7 +180,10 @@ def main_gui():
         if active:
             gui.append_text("<i>Écoute vocale activée...</i>", "#ffd700")
             def listen_and_respond():
-                user_input = listen(gui_callback=gui.show_live_transcription)
+                # William se tait dès la première trame de parole détectée par le VAD
+                user_input = listen(gui_callback=gui.show_live_transcription,
+                                    partial_callback=gui.show_partial_transcription,
+                                    speech_start_callback=barge_in)
                 if not user_input:
                     gui.append_text("<i>Aucune entrée vocale détectée.</i>", "#ff5555")
                     return
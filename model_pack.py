@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Modèles « packés » pour un démarrage à froid rapide (XTTS v2, Whisper)
+- Étape unique (installation) : le checkpoint d'origine est chargé une fois puis ses poids sont réécrits
+  en un state_dict torch plat (format zip), dans data/models/packed/<nom>/, avec un manifeste pack.json.
+- Au démarrage, le modèle est construit avec ses paramètres sur le périphérique meta (ni allocation ni
+  initialisation aléatoire), puis les poids projetés en mémoire (torch.load(mmap=True, weights_only=True))
+  lui sont assignés tels quels (load_state_dict(assign=True)) : seule matérialisation, sans dépicklage complet
+  ni copie, les pages ne sont lues qu'à l'usage.
+- Un pack périmé (checkpoint source modifié, autre format) est ignoré : on retombe sur le chargeur d'origine.
+- python model_pack.py pack   : crée les packs
+  python model_pack.py bench  : temps de chargement à froid avant/après (un processus neuf par mesure)
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PACK_DIR = Path("data/models/packed")
+PACK_FORMAT = 1
+XTTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+XTTS_PACK = "xtts_v2"
+# Sous-modules qui ne font que référencer d'autres poids (recréés par init_gpt_for_inference ; wte = mel_embedding)
+XTTS_SKIP_PREFIXES = ("gpt.gpt_inference.", "gpt.gpt.wte.")
+
+# --- Format commun ---
+def _stamp(path):
+    st = os.stat(path)
+    return {"source": str(path), "source_size": st.st_size, "source_mtime": int(st.st_mtime)}
+
+def _write_pack(name, state_dict, meta, source):
+    import torch
+    out_dir = PACK_DIR / name
+    out_dir.mkdir(parents=True, exist_ok=True)
+    weights = out_dir / "weights.pt"
+    tmp = weights.with_suffix(".tmp")
+    torch.save({k: v.detach().cpu().contiguous() for k, v in state_dict.items()}, tmp)
+    os.replace(tmp, weights)
+    manifest = {
+        "format": PACK_FORMAT,
+        "torch": torch.__version__,
+        "tensors": len(state_dict),
+        "bytes": weights.stat().st_size,
+        "meta": meta,
+        **_stamp(source),
+    }
+    with open(out_dir / "pack.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"📦 Pack {name}: {manifest['tensors']} tenseurs, {manifest['bytes'] / 1e6:.0f} Mo")
+    return out_dir
+
+def read_manifest(name):
+    """Manifeste d'un pack valide, sinon None (absent, autre format, source modifiée)."""
+    path = PACK_DIR / name / "pack.json"
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception:
+        return None
+    if manifest.get("format") != PACK_FORMAT or not (PACK_DIR / name / "weights.pt").exists():
+        return None
+    source = manifest.get("source")
+    if source and os.path.exists(source):
+        st = os.stat(source)
+        if st.st_size != manifest.get("source_size") or int(st.st_mtime) != manifest.get("source_mtime"):
+            logger.warning(f"⚠️ Pack {name} périmé (checkpoint source modifié), chargeur d'origine utilisé")
+            return None
+    return manifest
+
+@contextlib.contextmanager
+def empty_parameters():
+    """Paramètres créés sur le périphérique meta : ni mémoire réelle ni initialisation aléatoire (les
+    initialiseurs de torch.nn.init sautent les tenseurs meta, ce qui évite aussi d'importer les noyaux meta
+    Python de torch). Les buffers (fenêtres, masques...) restent construits normalement : ceux qui ne sont
+    pas dans le pack gardent leur valeur calculée."""
+    import torch
+    register = torch.nn.Module.register_parameter
+    initializers = {name: getattr(torch.nn.init, name) for name in dir(torch.nn.init)
+                    if name.endswith("_") and not name.startswith("_")}
+
+    def register_on_meta(module, name, param):
+        register(module, name, param)
+        if param is not None and not param.is_meta:
+            module._parameters[name] = torch.nn.Parameter(param.to("meta"), requires_grad=param.requires_grad)
+
+    def skip_meta(init):
+        return lambda tensor, *args, **kwargs: tensor if tensor.is_meta else init(tensor, *args, **kwargs)
+
+    torch.nn.Module.register_parameter = register_on_meta
+    for name, init in initializers.items():
+        setattr(torch.nn.init, name, skip_meta(init))
+    try:
+        yield
+    finally:
+        torch.nn.Module.register_parameter = register
+        for name, init in initializers.items():
+            setattr(torch.nn.init, name, init)
+
+def _check_materialized(model, what):
+    leftover = [name for name, param in model.named_parameters() if param.is_meta]
+    if leftover:
+        raise RuntimeError(f"pack {what} incomplet ({len(leftover)} paramètres non chargés, ex. {leftover[0]})")
+
+def _map_weights(name):
+    import torch
+    return torch.load(PACK_DIR / name / "weights.pt", mmap=True, weights_only=True, map_location="cpu")
+
+# --- XTTS ---
+def _xtts_checkpoint_dir():
+    from TTS.utils.manage import ModelManager
+    model_path, config_path, _ = ModelManager().download_model(XTTS_MODEL)
+    return Path(config_path).parent if config_path else Path(model_path)
+
+def pack_xtts():
+    from TTS.tts.configs.xtts_config import XttsConfig
+    from TTS.tts.models.xtts import Xtts
+    ckpt_dir = _xtts_checkpoint_dir()
+    cfg = XttsConfig()
+    cfg.load_json(str(ckpt_dir / "config.json"))
+    model = Xtts.init_from_config(cfg)
+    model.load_checkpoint(cfg, checkpoint_dir=str(ckpt_dir), eval=True)
+    state = {k: v for k, v in model.state_dict().items() if not k.startswith(XTTS_SKIP_PREFIXES)}
+    out_dir = _write_pack(XTTS_PACK, state, {"kind": "xtts", "model": XTTS_MODEL}, ckpt_dir / "model.pth")
+    for extra in ("config.json", "vocab.json"):
+        shutil.copy2(ckpt_dir / extra, out_dir / extra)
+    return out_dir
+
+def load_xtts(device="cpu"):
+    """Modèle Xtts depuis le pack (poids projetés en mémoire). None si aucun pack valide."""
+    if read_manifest(XTTS_PACK) is None:
+        return None
+    from TTS.tts.configs.xtts_config import XttsConfig
+    from TTS.tts.layers.xtts.tokenizer import VoiceBpeTokenizer
+    from TTS.tts.models.xtts import Xtts
+    pack_dir = PACK_DIR / XTTS_PACK
+    t0 = time.perf_counter()
+    cfg = XttsConfig()
+    cfg.load_json(str(pack_dir / "config.json"))
+    with empty_parameters():
+        model = Xtts.init_from_config(cfg)
+        model.tokenizer = VoiceBpeTokenizer(vocab_file=str(pack_dir / "vocab.json"))
+        model.init_models()
+    result = model.load_state_dict(_map_weights(XTTS_PACK), strict=False, assign=True)
+    missing = [k for k in result.missing_keys if not k.startswith(XTTS_SKIP_PREFIXES)]
+    unexpected = [k for k in result.unexpected_keys if not k.startswith(XTTS_SKIP_PREFIXES)]
+    if missing or unexpected:
+        raise RuntimeError(f"pack XTTS incompatible ({len(missing)} manquants, {len(unexpected)} inattendus)")
+    _check_materialized(model, "XTTS")
+    model.hifigan_decoder.eval()
+    model.gpt.init_gpt_for_inference(kv_cache=model.args.kv_cache, use_deepspeed=False)
+    model.gpt.eval()
+    model.eval()
+    model.to(device)
+    logger.info(f"⚡ XTTS chargé depuis le pack en {time.perf_counter() - t0:.1f}s")
+    return model
+
+# --- Whisper ---
+def _whisper_pack_name(name):
+    return f"whisper_{name}"
+
+def pack_whisper(name="base"):
+    import torch
+    import whisper
+    download_root = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "whisper")
+    path = whisper._download(whisper._MODELS[name], download_root, False)
+    checkpoint = torch.load(path, map_location="cpu")
+    # Poids en float32 : assign=True garde le dtype du pack (le checkpoint d'origine est en float16)
+    state = {k: v.float() if v.is_floating_point() else v for k, v in checkpoint["model_state_dict"].items()}
+    heads = whisper._ALIGNMENT_HEADS.get(name)
+    meta = {"kind": "whisper", "name": name, "dims": checkpoint["dims"],
+            "alignment_heads": heads.decode("ascii") if heads else None}
+    return _write_pack(_whisper_pack_name(name), state, meta, path)
+
+def load_whisper(name="base", device=None):
+    """Modèle Whisper depuis le pack s'il existe, sinon whisper.load_model (chargeur d'origine)."""
+    import torch
+    import whisper
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    manifest = read_manifest(_whisper_pack_name(name))
+    if manifest is None:
+        return whisper.load_model(name, device=device)
+    try:
+        t0 = time.perf_counter()
+        meta = manifest["meta"]
+        with empty_parameters():
+            model = whisper.model.Whisper(whisper.model.ModelDimensions(**meta["dims"]))
+        model.load_state_dict(_map_weights(_whisper_pack_name(name)), assign=True)
+        _check_materialized(model, f"Whisper {name}")
+        if meta.get("alignment_heads"):
+            model.set_alignment_heads(meta["alignment_heads"].encode("ascii"))
+        model = model.to(device)
+        logger.info(f"⚡ Whisper {name} chargé depuis le pack en {time.perf_counter() - t0:.2f}s")
+        return model
+    except Exception as e:
+        logger.warning(f"⚠️ Pack Whisper {name} inutilisable ({e}), chargeur d'origine")
+        return whisper.load_model(name, device=device)
+
+# --- Étape de pack (installation) ---
+def pack_all(whisper_models=("base",)):
+    """Crée tous les packs possibles. Retourne {nom: chemin ou message d'erreur}."""
+    results = {}
+    try:
+        results[XTTS_PACK] = str(pack_xtts())
+    except Exception as e:
+        results[XTTS_PACK] = f"échec: {e}"
+    for name in whisper_models:
+        try:
+            results[_whisper_pack_name(name)] = str(pack_whisper(name))
+        except Exception as e:
+            results[_whisper_pack_name(name)] = f"échec: {e}"
+    for name, result in results.items():
+        print(f"{'❌' if result.startswith('échec') else '✅'} {name}: {result}")
+    return results
+
+# --- Benchmark de chargement à froid ---
+def _load_once(kind, mode):
+    """Exécuté dans un processus neuf : temps de chargement d'un modèle, original ou packé."""
+    t0 = time.perf_counter()
+    if kind == "xtts":
+        if mode == "packed":
+            if load_xtts() is None:
+                return {"kind": kind, "mode": mode, "error": "aucun pack"}
+        else:
+            from TTS.api import TTS
+            TTS(XTTS_MODEL, gpu=False)
+    else:
+        name = kind.split("_", 1)[1]
+        if mode == "packed":
+            if read_manifest(_whisper_pack_name(name)) is None:
+                return {"kind": kind, "mode": mode, "error": "aucun pack"}
+            load_whisper(name, device="cpu")
+        else:
+            import whisper
+            whisper.load_model(name, device="cpu")
+    return {"kind": kind, "mode": mode, "load_time": round(time.perf_counter() - t0, 2)}
+
+def bench(kinds=("xtts", "whisper_base"), output=None):
+    results = []
+    for kind in kinds:
+        for mode in ("original", "packed"):
+            print(f"⏱️ Chargement {kind} ({mode})...")
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "_load", kind, mode],
+                                  capture_output=True, text=True)
+            lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+            results.append(json.loads(lines[-1]) if lines else
+                           {"kind": kind, "mode": mode, "error": proc.stderr.strip()[-300:]})
+    print(f"\n{'modèle':<16}{'original':>12}{'packé':>12}{'gain':>8}")
+    for kind in kinds:
+        times = {r["mode"]: r.get("load_time") for r in results if r["kind"] == kind}
+        before, after = times.get("original"), times.get("packed")
+        gain = f"x{before / after:.1f}" if before and after else "-"
+        print(f"{kind:<16}{str(before) + 's' if before else '-':>12}{str(after) + 's' if after else '-':>12}{gain:>8}")
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "model_load", "timestamp": time.time(), "results": results}, f, indent=2)
+        print(f"💾 Résultats: {output}")
+    return results
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Packs de modèles à chargement rapide (XTTS, Whisper)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pack = sub.add_parser("pack", help="Crée les packs (une fois, après téléchargement des modèles)")
+    pack.add_argument("--whisper", nargs="*", default=["base"], help="Modèles Whisper à packer")
+    bench_cmd = sub.add_parser("bench", help="Temps de chargement à froid avant/après pack")
+    bench_cmd.add_argument("--kinds", nargs="+", default=["xtts", "whisper_base"])
+    bench_cmd.add_argument("--output", default=None)
+    load = sub.add_parser("_load")  # usage interne (sous-processus)
+    load.add_argument("kind")
+    load.add_argument("mode", choices=["original", "packed"])
+    args = parser.parse_args()
+    if args.command == "pack":
+        pack_all(args.whisper)
+    elif args.command == "bench":
+        bench(args.kinds, args.output)
+    elif args.command == "_load":
+        print(json.dumps(_load_once(args.kind, args.mode)))
+
+if __name__ == "__main__":
+    main()
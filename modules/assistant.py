@@ -332,12 +332,11 @@ class WilliamAssistant:
     def _respond(self, message):
         print(f"🤖 William: {message}")
         if self.tts and self.module_status.get("tts") and not self.text_only:
-            def speak_thread(msg):
-                try:
-                    self.tts(msg)
-                except Exception as e:
-                    print(f"⚠️ Erreur TTS: {e}")
-            threading.Thread(target=speak_thread, args=(message,), daemon=True).start()
+            # speak() passe par la file de parole : pas de thread par message
+            try:
+                self.tts(message)
+            except Exception as e:
+                print(f"⚠️ Erreur TTS: {e}")
 
     def _get_user_input(self):
         if self.voice_enabled and self.stt and self.module_status.get("stt"):
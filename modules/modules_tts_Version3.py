@@ -1,35 +1,49 @@
 def speak(text):
     try:
         from TTS.api import TTS
-        import pygame
         import os
         import tempfile
+        from audio_output import get_output_device, read_wav_file
+        from speaker_latents import group_by_length, speaker_latents, xtts_model_of
 
         SAMPLE = "data/voice_samples/male_sample.wav"
-        if os.path.exists(SAMPLE):
+        xtts = os.path.exists(SAMPLE)
+        if xtts:
             tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2")
-            wav_kwargs = dict(speaker_wav=SAMPLE, language="fr")
         else:
             tts = TTS("tts_models/fr/mai/tacotron2-DDC")
-            wav_kwargs = {}
 
         # Découpe intelligente pour accélérer XTTS (sur GPU c'est rapide)
         sentences = [s.strip() for s in text.replace("!","!.").replace("?","?.").split(".") if s.strip()]
-        temp_files = []
-        for sentence in sentences:
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-                temp_path = f.name
-            tts.tts_to_file(text=sentence, file_path=temp_path, **wav_kwargs)
-            temp_files.append(temp_path)
+        waves = [None] * len(sentences)
+        if xtts:
+            from tts import config as tts_config
+            model = xtts_model_of(tts)
+            if tts_config.batch_size > 1:
+                # Phrases de longueurs voisines synthétisées par lots (un seul appel GPT par lot), si activé
+                for group in group_by_length(sentences, tts_config.batch_size, tts_config.batch_max_length_ratio):
+                    outputs = speaker_latents.synthesize_batch(model, [sentences[i] for i in group], "fr", SAMPLE)
+                    for i, output in zip(group, outputs):
+                        waves[i] = output
+            else:
+                waves = [speaker_latents.synthesize(model, sentence, "fr", SAMPLE) for sentence in sentences]
+        else:
+            for i, sentence in enumerate(sentences):
+                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+                    temp_path = f.name
+                tts.tts_to_file(text=sentence, file_path=temp_path)
+                waves[i] = read_wav_file(temp_path)
+                os.remove(temp_path)
 
-        pygame.mixer.init()
-        for temp_path in temp_files:
-            pygame.mixer.music.load(temp_path)
-            pygame.mixer.music.play()
-            while pygame.mixer.music.get_busy():
-                pygame.time.wait(100)
-            os.remove(temp_path)
-        pygame.mixer.quit()
+        # Périphérique persistant : les phrases s'enchaînent sans réouverture du mixer
+        device = get_output_device()
+        device.begin_utterance()
+        try:
+            for wav, sample_rate in waves:
+                device.write(wav, sample_rate, wait=False)
+            device.drain()
+        finally:
+            device.end_utterance()
     except Exception as e:
         print(f"⚠️ Erreur XTTS : {e}")
         try:
@@ -3,14 +3,24 @@ TTSManager optimisé pour WillIAM
 - Synthèse vocale intelligente avec sélection dynamique du moteur, fallback robuste, et lecture naturelle.
 - Nettoyage de la ponctuation pour éviter les pauses excessives sur XTTS/Coqui.
 - Initialisation rapide, chargement unique des modèles, gestion efficace des ressources.
+- Plusieurs moteurs gardés chargés ; RTF mesuré en continu et routage par longueur / budget de latence.
+- Instance globale paresseuse : rien n'est chargé à l'import, chargement en arrière-plan au premier accès.
+- Jeton d'annulation de l'ordonnanceur vérifié entre les phrases et les morceaux : un barge-in ou un message
+  plus récent arrête aussi la synthèse en cours, pas seulement la lecture.
 """
 
+import json
 import os
 import logging
 import tempfile
+import time
+import wave
 from pathlib import Path
 import re
 import threading
+from concurrent.futures import Future
+
+from speech_scheduler import NORMAL, SpeechScheduler
 
 def normalize_tts_text(text):
     """Lisse la ponctuation pour éviter les longues pauses sur certains moteurs TTS."""
@@ -18,10 +28,41 @@ def normalize_tts_text(text):
     text = re.sub(r"\s{2,}", " ", text)
     return text.strip()
 
+# Ordre de qualité (meilleure voix d'abord) et ordre de chargement (moteurs rapides d'abord)
+QUALITY_ORDER = ["xtts", "coqui", "edge", "pyttsx3"]
+LOAD_ORDER = ["pyttsx3", "edge", "coqui", "xtts"]
+
+# RTF a priori (synthèse / durée audio) tant qu'aucune mesure n'existe, et surcoût fixe (réseau, etc.)
+PRIOR_RTF = {"xtts": 1.5, "coqui": 0.4, "edge": 0.15, "pyttsx3": 0.05}
+ENGINE_OVERHEAD = {"xtts": 0.5, "edge": 0.4}
+CHARS_PER_SECOND = 14.0
+
+DEFAULT_ROUTING = {
+    "engines": QUALITY_ORDER,         # moteurs à garder chargés
+    "voice_consistency": "short_only",  # strict | short_only | free
+    "short_max_chars": 40,            # en dessous : acquiescement / message court
+    "short_budget": 0.6,              # délai max (s) avant le son pour un message court
+    "latency_budget": 4.0,            # délai max (s) pour une réponse de contenu (mode free)
+    "fast_engines": ["coqui", "edge", "pyttsx3"],  # voix autorisées pour les messages courts
+    "rtf_smoothing": 0.3,             # poids de la dernière mesure dans la moyenne glissante
+}
+
+def load_routing_config(path="config.json"):
+    routing = dict(DEFAULT_ROUTING)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            routing.update(json.load(f).get("tts", {}).get("routing", {}))
+    except Exception:
+        pass
+    return routing
+
 class TTSManager:
     def __init__(self):
         self.tts_engine = None
         self.engine_type = None
+        self.engines = {}   # nom -> instance du moteur initialisé
+        self.rtf = {}       # nom -> RTF mesuré (moyenne glissante)
+        self.routing = load_routing_config()
         self.voice_samples_dir = Path("data/voice_samples")
         self.voice_samples_dir.mkdir(parents=True, exist_ok=True)
 
@@ -45,19 +86,48 @@ class TTSManager:
             }
         }
         self._init_lock = threading.Lock()
-        self._init_thread = threading.Thread(target=self._initialize_tts, daemon=True)
-        self._init_thread.start()
-        self._init_thread.join(15)  # Laisse jusqu'à 15s pour initialiser (chargement lourd sur CPU)
+        self._init_thread = None
+        self._first_engine = threading.Event()
+        # Résolu (avec le moteur principal) quand tous les moteurs configurés ont été tentés
+        self.ready = Future()
 
-    def _initialize_tts(self):
+    def start_loading(self):
+        """Lance le chargement en arrière-plan (une seule fois) sans bloquer. Retourne le Future de disponibilité."""
         with self._init_lock:
-            if self._try_xtts():
-                return
-            if self._try_coqui():
-                return
-            if self._try_edge():
-                return
-            self._init_pyttsx3()
+            if self._init_thread is None:
+                self._init_thread = threading.Thread(target=self._initialize_tts, name="tts-manager-init", daemon=True)
+                self._init_thread.start()
+        return self.ready
+
+    def on_ready(self, callback):
+        """callback(manager) appelé quand le moteur préféré est chaud (immédiatement si c'est déjà le cas)."""
+        self.ready.add_done_callback(lambda _: callback(self))
+
+    def is_ready(self):
+        return self.ready.done()
+
+    def _initialize_tts(self):
+        """Charge tous les moteurs configurés, les plus rapides d'abord pour répondre au plus tôt."""
+        loaders = {"xtts": self._try_xtts, "coqui": self._try_coqui, "edge": self._try_edge, "pyttsx3": self._init_pyttsx3}
+        t0 = time.perf_counter()
+        try:
+            for name in LOAD_ORDER:
+                if name in self.routing["engines"]:
+                    loaders[name]()
+            if not self.engines:
+                logging.error("Aucun moteur TTS disponible")
+            else:
+                logging.info(f"✅ Moteurs TTS prêts en {time.perf_counter() - t0:.1f}s: {', '.join(self.engines)}")
+        finally:
+            self._first_engine.set()
+            self.ready.set_result(self.engine_type)
+
+    def _register(self, name, engine):
+        self.engines[name] = engine
+        # Moteur principal = meilleure qualité disponible (compatibilité get_engine_info)
+        self.engine_type = next(e for e in QUALITY_ORDER if e in self.engines)
+        self.tts_engine = self.engines[self.engine_type]
+        self._first_engine.set()
 
     def _try_xtts(self):
         try:
@@ -66,8 +136,7 @@ class TTSManager:
             if not sample_path.exists():
                 logging.warning(f"Échantillon vocal non trouvé: {sample_path}")
                 return False
-            self.tts_engine = TTS(self.tts_config["xtts"]["model"])
-            self.engine_type = "xtts"
+            self._register("xtts", TTS(self.tts_config["xtts"]["model"]))
             logging.info("✅ XTTS initialisé")
             return True
         except Exception as e:
@@ -79,8 +148,7 @@ class TTSManager:
             from TTS.api import TTS
             for model in self.tts_config["coqui"]["models"]:
                 try:
-                    self.tts_engine = TTS(model)
-                    self.engine_type = "coqui"
+                    self._register("coqui", TTS(model))
                     logging.info(f"✅ Coqui TTS initialisé: {model}")
                     return True
                 except Exception as e:
@@ -93,7 +161,7 @@ class TTSManager:
     def _try_edge(self):
         try:
             import edge_tts
-            self.engine_type = "edge"
+            self._register("edge", edge_tts)
             logging.info("✅ Edge TTS initialisé")
             return True
         except ImportError:
@@ -103,108 +171,196 @@ class TTSManager:
     def _init_pyttsx3(self):
         try:
             import pyttsx3
-            self.tts_engine = pyttsx3.init()
-            self.engine_type = "pyttsx3"
+            engine = pyttsx3.init()
             # Sélectionne une voix française si dispo
-            voices = self.tts_engine.getProperty('voices')
+            voices = engine.getProperty('voices')
             for voice in voices:
                 if 'fr' in voice.name.lower() or 'french' in voice.name.lower():
-                    self.tts_engine.setProperty('voice', voice.id)
+                    engine.setProperty('voice', voice.id)
                     break
-            self.tts_engine.setProperty('rate', 150)
-            self.tts_engine.setProperty('volume', 0.8)
+            engine.setProperty('rate', 150)
+            engine.setProperty('volume', 0.8)
+            self._register("pyttsx3", engine)
             logging.info("✅ pyttsx3 initialisé (fallback)")
         except Exception as e:
             logging.error(f"Impossible d'initialiser pyttsx3: {e}")
-            self.engine_type = None
 
-    def speak(self, text, save_to_file=None):
-        """Synthétise le texte avec le meilleur moteur disponible (lecture complète en un bloc, ponctuation lissée)."""
+    # --- Routage par latence ---
+    def get_rtf(self, engine):
+        return self.rtf.get(engine, PRIOR_RTF.get(engine, 1.0))
+
+    def predict_latency(self, engine, text):
+        """Délai estimé avant le premier son : synthèse en un bloc = RTF x durée audio + surcoût fixe."""
+        return ENGINE_OVERHEAD.get(engine, 0.0) + self.get_rtf(engine) * len(text) / CHARS_PER_SECOND
+
+    def _record_rtf(self, engine, synth_time, audio_duration):
+        if audio_duration <= 0:
+            return
+        rtf = synth_time / audio_duration
+        alpha = self.routing["rtf_smoothing"]
+        previous = self.rtf.get(engine)
+        self.rtf[engine] = rtf if previous is None else (1 - alpha) * previous + alpha * rtf
+        logging.debug(f"⏱️ RTF {engine}: {rtf:.2f} (moyenne {self.rtf[engine]:.2f})")
+
+    def select_engine(self, text):
+        """Choisit le moteur pour cet énoncé selon sa longueur, le budget de latence et la règle de cohérence vocale."""
+        ready = [e for e in QUALITY_ORDER if e in self.engines]
+        if not ready:
+            return None
+        if not self.ready.done():
+            # Moteur préféré pas encore chaud : le plus rapide déjà chargé répond
+            return min(ready, key=lambda e: self.predict_latency(e, text))
+        preferred = ready[0]
+        policy = self.routing["voice_consistency"]
+        short = len(text) <= self.routing["short_max_chars"]
+        if policy == "strict" or (policy == "short_only" and not short):
+            return preferred
+        if short:
+            candidates = [e for e in ready if e == preferred or e in self.routing["fast_engines"]]
+            budget = self.routing["short_budget"]
+        else:
+            candidates = ready
+            budget = self.routing["latency_budget"]
+        # Meilleure qualité qui tient dans le budget, sinon la plus rapide
+        for engine in candidates:
+            if self.predict_latency(engine, text) <= budget:
+                return engine
+        return min(candidates, key=lambda e: self.predict_latency(e, text))
+
+    @staticmethod
+    def _cancelled(token):
+        return token is not None and token.cancelled
+
+    def speak(self, text, save_to_file=None, token=None):
+        """Synthétise le texte avec le moteur choisi par le routage (lecture complète en un bloc, ponctuation lissée).
+        token : CancelToken de l'ordonnanceur, vérifié entre les phrases / morceaux. Retourne False si annulé."""
         if not text or not text.strip():
             return
-        # Pour éviter un blocage si l'init a échoué
-        if self._init_thread.is_alive():
-            self._init_thread.join(5)
-        try:
-            if self.engine_type == "xtts":
-                self._speak_xtts(text, save_to_file)
-            elif self.engine_type == "coqui":
-                self._speak_coqui(text, save_to_file)
-            elif self.engine_type == "edge":
-                self._speak_edge(text, save_to_file)
-            elif self.engine_type == "pyttsx3":
-                self._speak_pyttsx3(text)
-            else:
-                logging.error("Aucun moteur TTS disponible")
-                print(f"🤖 WillIAM: {text}")
-        except Exception as e:
-            logging.error(f"Erreur synthèse vocale: {e}")
+        # Premier énoncé très tôt : attend seulement le premier moteur (le plus rapide), jamais le préféré
+        self.start_loading()
+        self._first_engine.wait(3)
+        engine = self.select_engine(text)
+        if engine is None:
+            logging.error("Aucun moteur TTS disponible")
             print(f"🤖 WillIAM: {text}")
+            return
+        # Repli sur les autres moteurs chargés si le moteur choisi échoue
+        for name in [engine] + [e for e in QUALITY_ORDER if e in self.engines and e != engine]:
+            if self._cancelled(token):
+                return False
+            try:
+                if name == "pyttsx3":
+                    self._speak_pyttsx3(text)
+                    return True
+                return getattr(self, f"_speak_{name}")(text, save_to_file, token) is not False
+            except Exception as e:
+                logging.error(f"Erreur synthèse vocale ({name}): {e}")
+        print(f"🤖 WillIAM: {text}")
 
-    def _speak_xtts(self, text, save_to_file=None):
+    def _timed_synthesis(self, engine, text, output_file, synthesize):
+        """Exécute synthesize() et met à jour le RTF du moteur à partir du fichier produit."""
+        t0 = time.perf_counter()
+        synthesize()
+        synth_time = time.perf_counter() - t0
+        try:
+            with wave.open(output_file, "rb") as f:
+                duration = f.getnframes() / f.getframerate()
+        except Exception:
+            duration = len(text) / CHARS_PER_SECOND  # format compressé (edge) : durée estimée
+        self._record_rtf(engine, synth_time, duration)
+
+    def _speak_xtts(self, text, save_to_file=None, token=None):
+        import numpy as np
         text = normalize_tts_text(text)
         config = self.tts_config["xtts"]
         sample_path = self.voice_samples_dir / config["sample_file"]
+        # Latents du speaker calculés une seule fois (persistés à côté de l'échantillon)
+        from speaker_latents import speaker_latents, write_wav
+        waves, sample_rate = [], 24000
+        for sentence in re.split(r"(?<=[.!?…])\s+", text):
+            if not sentence.strip():
+                continue
+            if self._cancelled(token):
+                return False
+            t0 = time.perf_counter()
+            wav, sample_rate = speaker_latents.synthesize(
+                self.engines["xtts"], sentence, config["language"], str(sample_path)
+            )
+            self._record_rtf("xtts", time.perf_counter() - t0, len(wav) / sample_rate)
+            waves.append(wav)
+        if self._cancelled(token) or not waves:
+            return False
         output_file = save_to_file or tempfile.mktemp(suffix=".wav")
-        self.tts_engine.tts_to_file(
-            text=text,
-            file_path=output_file,
-            speaker_wav=str(sample_path),
-            language=config["language"]
-        )
+        write_wav(output_file, np.concatenate(waves), sample_rate)
         self._play_audio_file(output_file)
         if not save_to_file:
             os.remove(output_file)
 
-    def _speak_coqui(self, text, save_to_file=None):
+    def _speak_coqui(self, text, save_to_file=None, token=None):
         text = normalize_tts_text(text)
         output_file = save_to_file or tempfile.mktemp(suffix=".wav")
-        self.tts_engine.tts_to_file(
+        self._timed_synthesis("coqui", text, output_file, lambda: self.engines["coqui"].tts_to_file(
             text=text,
             file_path=output_file
-        )
+        ))
+        if self._cancelled(token):
+            if not save_to_file:
+                os.remove(output_file)
+            return False
         self._play_audio_file(output_file)
         if not save_to_file:
             os.remove(output_file)
 
-    def _speak_edge(self, text, save_to_file=None):
+    def _speak_edge(self, text, save_to_file=None, token=None):
+        """Edge TTS en streaming : boucle asyncio persistante, lecture dès le premier morceau décodé."""
         text = normalize_tts_text(text)
-        import asyncio
-        import edge_tts
-        async def _edge_tts():
-            config = self.tts_config["edge"]
-            output_file = save_to_file or tempfile.mktemp(suffix=".wav")
-            communicate = edge_tts.Communicate(
-                text=text,
-                voice=config["voice"],
-                rate=config["rate"],
-                pitch=config["pitch"]
-            )
-            await communicate.save(output_file)
-            return output_file
-        output_file = asyncio.run(_edge_tts())
-        self._play_audio_file(output_file)
-        if not save_to_file:
+        from edge_stream import FFmpegDecoder, edge_streamer
+        config = self.tts_config["edge"]
+        streaming = FFmpegDecoder.available()
+        # Sans décodeur progressif (ffmpeg absent), le MP3 complet est écrit puis lu comme avant
+        output_file = save_to_file or (None if streaming else tempfile.mktemp(suffix=".mp3"))
+        result = edge_streamer.speak(
+            text, voice=config["voice"], rate=config["rate"], pitch=config["pitch"], save_to_file=output_file,
+            token=token,
+        )
+        if result.get("cancelled"):
+            if not save_to_file and output_file and os.path.exists(output_file):
+                os.remove(output_file)
+            return False
+        if result["streamed"]:
+            self._record_rtf("edge", result["receive_time"], result["duration"])
+        else:
+            self._record_rtf("edge", result["receive_time"], len(text) / CHARS_PER_SECOND)
+            self._play_audio_file(output_file)
+        if not save_to_file and output_file and os.path.exists(output_file):
             os.remove(output_file)
 
     def _speak_pyttsx3(self, text):
         text = normalize_tts_text(text)
-        self.tts_engine.say(text)
-        self.tts_engine.runAndWait()
+        # Lecture directe par le moteur système : pas de mesure séparée de la synthèse (RTF a priori)
+        self.engines["pyttsx3"].say(text)
+        self.engines["pyttsx3"].runAndWait()
 
     def _play_audio_file(self, file_path):
         """Lecture audio robuste, multiplateforme, sans écho ni coupure."""
+        # WAV : périphérique de sortie persistant (ouvert une fois, alimenté par callback)
+        try:
+            from audio_output import get_output_device, read_wav_file
+            wav, sample_rate = read_wav_file(file_path)
+            get_output_device().write(wav, sample_rate, wait=True)
+            return
+        except Exception as e:
+            logging.debug(f"Sortie persistante indisponible pour {file_path}: {e}")
         try:
             import pygame
-            pygame.mixer.init()
-            try:
-                pygame.mixer.music.load(file_path)
-                pygame.mixer.music.play()
-                while pygame.mixer.music.get_busy():
-                    pygame.time.wait(60)
-                pygame.mixer.music.unload()
-            finally:
-                pygame.mixer.quit()
+            # Mixer initialisé une seule fois pour le processus (plus de init/quit par clip)
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            pygame.mixer.music.load(file_path)
+            pygame.mixer.music.play()
+            while pygame.mixer.music.get_busy():
+                pygame.time.wait(20)
+            pygame.mixer.music.unload()
         except ImportError:
             logging.warning("pygame non disponible pour la lecture audio")
             # Fallback système
@@ -217,22 +373,74 @@ class TTSManager:
         return {
             "engine": self.engine_type,
             "available": self.engine_type is not None,
+            "ready": self.ready.done(),
             "quality": {
                 "xtts": "Excellente (clonage vocal)",
                 "coqui": "Très bonne (local)",
                 "edge": "Bonne (cloud)",
                 "pyttsx3": "Basique (système)"
-            }.get(self.engine_type, "Inconnue")
+            }.get(self.engine_type, "Inconnue"),
+            "engines": [e for e in QUALITY_ORDER if e in self.engines],
+            "rtf": {e: round(self.get_rtf(e), 3) for e in self.engines},
+            "voice_consistency": self.routing["voice_consistency"],
         }
 
-# Instance globale
-tts_manager = TTSManager()
+class LazyTTSManager:
+    """Proxy de l'instance globale : construit le TTSManager et lance son chargement au premier accès."""
+
+    def __init__(self, factory=TTSManager):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    instance = self._factory()
+                    instance.start_loading()
+                    self._instance = instance
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def is_constructed(self):
+        return self._instance is not None
+
+# Instance globale (import instantané, aucun modèle chargé ici)
+tts_manager = LazyTTSManager()
+
+def _stop_playback():
+    try:
+        from audio_output import get_output_device
+        get_output_device().flush()
+    except Exception:
+        pass
+
+# File de parole unique (un seul thread, priorités, barge-in)
+speech_scheduler = SpeechScheduler(
+    lambda text, token, save_to_file=None: tts_manager.speak(text, save_to_file, token=token),
+    stop_playback=_stop_playback,
+)
 
 # API compatible
-def speak(text, save_to_file=None):
-    """Interface compatible pour la synthèse vocale."""
-    # Thread pour ne jamais bloquer la boucle principale
-    threading.Thread(target=tts_manager.speak, args=(text, save_to_file), daemon=True).start()
+def speak(text, save_to_file=None, priority=NORMAL, merge_key=None):
+    """Interface compatible pour la synthèse vocale (ne bloque jamais la boucle principale)."""
+    if not text or not text.strip():
+        return None
+    return speech_scheduler.submit(text, priority=priority, merge_key=merge_key, save_to_file=save_to_file)
+
+def barge_in():
+    """L'utilisateur parle : coupe la voix et abandonne les messages en attente."""
+    speech_scheduler.barge_in()
+
+def preload(callback=None):
+    """Démarre le chargement des moteurs en arrière-plan. Retourne un Future ; callback(manager) à la disponibilité."""
+    future = tts_manager.start_loading()
+    if callback is not None:
+        tts_manager.on_ready(callback)
+    return future
 
 def get_tts_info():
     """Infos sur le moteur TTS courant."""
@@ -4,14 +4,19 @@ import os
 import requests
 import speech_recognition as sr
 import tempfile
+from vad import VADEndpointer, listen_source
 
 # --- COQUI XTTS ---
 from TTS.api import TTS
 from playsound import playsound
+from speaker_latents import speaker_latents, write_wav
 
 # Spécifiez ici le chemin de votre échantillon .wav pour la voix personnalisée
 SPEAKER_WAV = "male_sample.wav"  # Changez par votre propre fichier si besoin
 
+# Fin d'énoncé par VAD en flux (au lieu de pause_threshold fixe), plancher de bruit gardé d'un tour à l'autre
+vad = VADEndpointer(hangover_ms=300)
+
 # Précharge le modèle XTTS
 tts_engine = TTS("tts_models/multilingual/multi-dataset/xtts_v2")
 
@@ -31,12 +36,9 @@ def speak(text):
     with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
         temp_path = tmp.name
     try:
-        tts_engine.tts_to_file(
-            text=text,
-            file_path=temp_path,
-            speaker_wav=SPEAKER_WAV,
-            language="fr"
-        )
+        # Latents du speaker réutilisés d'un appel à l'autre (recalculés seulement si le WAV change)
+        wav, sample_rate = speaker_latents.synthesize(tts_engine, text, "fr", SPEAKER_WAV)
+        write_wav(temp_path, wav, sample_rate)
     except Exception as e:
         print(f"Erreur XTTS : {e}")
         tts_engine.tts_to_file(
@@ -57,14 +59,30 @@ def speak(text):
     print("Lecture terminée.")
     safe_remove(temp_path)
 
-def listen(timeout=8):
+def _local_spotter(keywords):
+    """Détecteur de mots-clés local (keyword_spotter.py) si l'un des mots a été enregistré, sinon None."""
+    try:
+        from keyword_spotter import get_spotter
+        spotter = get_spotter()
+        return spotter if spotter.has_keywords(keywords) else None
+    except Exception as e:
+        print(f"⚠️ Détection locale indisponible : {e}")
+        return None
+
+def listen(timeout=8, sleep_words=None, spotter=None):
     recognizer = sr.Recognizer()
     with sr.Microphone() as source:
-        recognizer.pause_threshold = 0.8
-        recognizer.energy_threshold = 300
         try:
             print("🎙️ Parle, j'écoute...")
-            audio = recognizer.listen(source, timeout=timeout)
+            audio = listen_source(source, vad, timeout=timeout)
+            if spotter is not None:
+                # Mot de veille cherché localement avant toute reconnaissance complète
+                import numpy as np
+                raw = audio.get_raw_data(convert_rate=16000, convert_width=2)
+                hit = spotter.detect(np.frombuffer(raw, "<i2").astype(np.float32) / 32768.0, sleep_words)
+                if hit:
+                    print(f"👂 Mot de veille (local) : {hit[0]}")
+                    return hit[0]
             query = recognizer.recognize_google(audio, language="fr-FR")
             print(f"🧠 Tu as dit : {query}")
             return query
@@ -84,14 +102,19 @@ def listen(timeout=8):
 def wait_for_wake_word(wake_words=None):
     if wake_words is None:
         wake_words = ["william", "bonjour william", "salut william"]
+    spotter = _local_spotter(wake_words)
+    if spotter is not None:
+        # Veille à faible coût CPU : aucun appel de reconnaissance avant la détection du mot
+        print(f"🎧 En attente du mot d'activation (local) : {', '.join(wake_words)} ...")
+        spotter.wait_for(wake_words)
+        speak("Oui, je t'écoute !")
+        return
     recognizer = sr.Recognizer()
     with sr.Microphone() as source:
-        recognizer.pause_threshold = 0.8
-        recognizer.energy_threshold = 300
         while True:
             print(f"🎧 En attente du mot d'activation : {', '.join(wake_words)} ...")
             try:
-                audio = recognizer.listen(source, timeout=8)
+                audio = listen_source(source, vad, timeout=8)
                 query = recognizer.recognize_google(audio, language="fr-FR")
                 print(f"🧠 (détection) : {query}")
                 for word in wake_words:
@@ -104,8 +127,9 @@ def wait_for_wake_word(wake_words=None):
 def listen_until_sleep_word(sleep_words=None):
     if sleep_words is None:
         sleep_words = ["merci william", "au revoir", "stop", "bonne nuit", "dors william"]
+    spotter = _local_spotter(sleep_words)
     while True:
-        phrase = listen()
+        phrase = listen(sleep_words=sleep_words, spotter=spotter)
         print("Phrase reconnue pour traitement :", repr(phrase))
         if not phrase:
             speak("Je n'ai pas compris, peux-tu répéter ?")
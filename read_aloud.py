@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Lecture à voix haute par lot pour WillIAM (documents PDF/DOCX, longues réponses du LLM)
+- Le texte est découpé en paragraphes puis en phrases (split_sentences de tts.py), et les phrases
+  partent en parallèle dans un pool de processus TTS (tts_workers.TTSWorkerPool), hors du chemin speak().
+- Chaque phrase rendue est post-traitée puis sauvegardée tout de suite (.npy) : un job interrompu
+  (plantage, arrêt) reprend là où il s'est arrêté, seules les phrases manquantes sont refaites.
+- L'assemblage suit l'ordre du texte (courte pause entre phrases, plus longue entre paragraphes) et le PCM
+  est envoyé en flux vers l'encodeur : ffmpeg (mp3/opus/ogg/m4a/flac), sinon soundfile (flac/ogg), sinon WAV.
+- python read_aloud.py document.pdf -o document.mp3 [--workers 2]
+  python read_aloud.py --self-check  (pool de processus factice, sans XTTS)
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = Path("data/read_aloud")
+JOB_VERSION = 1
+SENTENCE_PAUSE_MS = 200
+PARAGRAPH_PAUSE_MS = 600
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+FFMPEG_CODECS = {
+    ".mp3": ["-c:a", "libmp3lame", "-b:a", "64k"],
+    ".opus": ["-c:a", "libopus", "-b:a", "32k"],
+    ".ogg": ["-c:a", "libvorbis", "-q:a", "3"],
+    ".m4a": ["-c:a", "aac", "-b:a", "64k"],
+    ".flac": ["-c:a", "flac"],
+}
+SOUNDFILE_FORMATS = {".flac": "FLAC", ".ogg": "OGG"}
+
+# --- Encodage en flux ---
+class AudioEncoder:
+    """Écrit du PCM float32 mono au fil de l'eau dans un fichier compressé (ou WAV en dernier recours).
+    self.path est le chemin réellement écrit (l'extension passe à .wav si aucun encodeur n'est disponible)."""
+
+    def __init__(self, path, sample_rate):
+        self.path = Path(path)
+        self.sample_rate = int(sample_rate)
+        self._proc = self._sf = self._wav = None
+        ext = self.path.suffix.lower()
+        if ext in FFMPEG_CODECS and shutil.which("ffmpeg"):
+            self._proc = subprocess.Popen(
+                ["ffmpeg", "-loglevel", "error", "-y", "-f", "f32le", "-ar", str(self.sample_rate), "-ac", "1",
+                 "-i", "pipe:0", *FFMPEG_CODECS[ext], str(self.path)],
+                stdin=subprocess.PIPE,
+            )
+            self.backend = "ffmpeg"
+            return
+        if ext in SOUNDFILE_FORMATS:
+            try:
+                import soundfile
+                self._sf = soundfile.SoundFile(str(self.path), "w", self.sample_rate, 1, format=SOUNDFILE_FORMATS[ext])
+                self.backend = "soundfile"
+                return
+            except Exception as e:
+                logger.debug(f"soundfile indisponible pour {ext}: {e}")
+        if ext != ".wav":
+            logger.warning(f"⚠️ Aucun encodeur pour {ext} (ffmpeg/soundfile absents), sortie WAV")
+            self.path = self.path.with_suffix(".wav")
+        import wave
+        self._wav = wave.open(str(self.path), "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(self.sample_rate)
+        self.backend = "wav"
+
+    def write(self, pcm):
+        import numpy as np
+        pcm = np.asarray(pcm, dtype=np.float32)
+        if self._proc is not None:
+            self._proc.stdin.write(pcm.tobytes())
+        elif self._sf is not None:
+            self._sf.write(pcm)
+        else:
+            self._wav.writeframes((np.clip(pcm, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+
+    def close(self):
+        if self._proc is not None:
+            self._proc.stdin.close()
+            if self._proc.wait() != 0:
+                raise RuntimeError(f"ffmpeg a échoué (code {self._proc.returncode})")
+        elif self._sf is not None:
+            self._sf.close()
+        else:
+            self._wav.close()
+        return self.path
+
+# --- Job de lecture ---
+def _text_key(text, language, speaker_wav, speed):
+    speaker = ""
+    if speaker_wav and os.path.exists(speaker_wav):
+        from speaker_latents import speaker_latents
+        speaker = speaker_latents.file_hash(speaker_wav)
+    return hashlib.sha256(f"{language}|{speaker}|{speed}|{text}".encode("utf-8")).hexdigest()
+
+class ReadAloudJob:
+    def __init__(self, text, output_path, language="fr", speaker_wav=None, speed=1.0, workers=None,
+                 progress_callback=None, submit=None, splitter=None, postprocess=None, keep_chunks=False):
+        """submit(texte) -> Future[(waveform, sample_rate)] remplace le pool TTS (tests, autre moteur).
+        progress_callback(faits, total, eta_secondes) est appelé après chaque phrase."""
+        self.text = text
+        self.output_path = Path(output_path)
+        self.language = language
+        self.speaker_wav = speaker_wav
+        self.speed = speed
+        self.workers = workers
+        self.progress_callback = progress_callback
+        self._submit = submit
+        self._splitter = splitter
+        self._postprocess = postprocess
+        self.keep_chunks = keep_chunks
+        if submit is None and speaker_wav is None:
+            from tts import config
+            if os.path.exists(config.speaker_wav_path):
+                self.speaker_wav = config.speaker_wav_path
+        self.key = _text_key(text, language, self.speaker_wav, speed)
+        self.job_dir = JOBS_DIR / self.key[:16]
+        self.manifest_path = self.job_dir / "manifest.json"
+        self._cancel = threading.Event()
+        self._pool = None
+        self.stats = {"chunks": 0, "resumed": 0, "rendered": 0, "render_time": 0.0, "audio_seconds": 0.0}
+
+    # --- Découpage ---
+    def _split(self):
+        """[(phrase, fin_de_paragraphe), ...] dans l'ordre du texte."""
+        if self._splitter is None:
+            from tts import split_sentences
+            self._splitter = split_sentences
+        chunks = []
+        for paragraph in _PARAGRAPH_RE.split(self.text):
+            sentences = self._splitter(" ".join(paragraph.split()))
+            chunks.extend((sentence, i == len(sentences) - 1) for i, sentence in enumerate(sentences))
+        return chunks
+
+    # --- Manifeste (reprise) ---
+    def _load_manifest(self, chunks):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == JOB_VERSION and manifest.get("key") == self.key:
+                return manifest
+        except Exception:
+            pass
+        return {"version": JOB_VERSION, "key": self.key, "total": len(chunks), "sample_rate": None, "done": {}}
+
+    def _save_manifest(self, manifest):
+        tmp = self.manifest_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def _chunk_path(self, index):
+        return self.job_dir / f"chunk_{index:05d}.npy"
+
+    def _save_chunk(self, index, wav):
+        import numpy as np
+        path = self._chunk_path(index)
+        tmp = path.with_name(path.stem + ".tmp.npy")
+        np.save(tmp, np.asarray(wav, dtype=np.float32))
+        os.replace(tmp, path)
+
+    # --- Rendu parallèle ---
+    def _get_submit(self):
+        if self._submit is not None:
+            return self._submit
+        from tts import xtts_manager
+        pool = xtts_manager.get_worker_pool() if self.workers is None else None
+        if pool is None:
+            from tts_workers import TTSWorkerPool
+            pool = self._pool = TTSWorkerPool(self.workers or 2).start()
+        return lambda text: pool.submit(text, self.language, self.speaker_wav, self.speed)
+
+    def _get_postprocess(self):
+        if self._postprocess is None:
+            from tts import postprocess
+            self._postprocess = postprocess
+        return self._postprocess
+
+    def cancel(self):
+        """Arrête le job après les phrases en cours ; il reprendra au prochain run()."""
+        self._cancel.set()
+
+    def run(self, timeout=300):
+        """Rend les phrases manquantes puis assemble le fichier. Retourne le chemin écrit, ou None si annulé."""
+        chunks = self._split()
+        if not chunks:
+            raise ValueError("texte vide")
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        manifest = self._load_manifest(chunks)
+        done = manifest["done"]
+        todo = [i for i in range(len(chunks)) if str(i) not in done or not self._chunk_path(i).exists()]
+        self.stats.update(chunks=len(chunks), resumed=len(chunks) - len(todo))
+        if self.stats["resumed"]:
+            logger.info(f"♻️ Lecture à voix haute : reprise, {self.stats['resumed']}/{len(chunks)} phrases déjà rendues")
+        t0 = time.perf_counter()
+        try:
+            if todo:
+                self._render(chunks, todo, manifest, t0, timeout)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+        if self._cancel.is_set():
+            logger.info(f"⏸️ Lecture à voix haute interrompue ({len(done)}/{len(chunks)}), reprise possible")
+            return None
+        path = self._stitch(chunks, manifest)
+        if not self.keep_chunks:
+            shutil.rmtree(self.job_dir, ignore_errors=True)
+        logger.info(
+            f"✅ Lecture à voix haute : {path} ({self.stats['audio_seconds']:.0f}s d'audio, "
+            f"{len(chunks)} phrases, rendu {time.perf_counter() - t0:.0f}s)"
+        )
+        return path
+
+    def _render(self, chunks, todo, manifest, t0, timeout):
+        submit = self._get_submit()
+        postprocess = self._get_postprocess()
+        max_in_flight = max(2, 2 * (self.workers or 2))  # file bornée : pas tout le document en mémoire
+        pending = {}
+        queue = list(todo)
+        total = len(chunks)
+        while queue or pending:
+            while queue and len(pending) < max_in_flight and not self._cancel.is_set():
+                index = queue.pop(0)
+                pending[submit(chunks[index][0])] = index
+            if not pending:
+                break
+            finished, _ = concurrent.futures.wait(pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            if not finished:
+                raise TimeoutError(f"aucune phrase rendue en {timeout}s")
+            for future in finished:
+                index = pending.pop(future)
+                wav, sample_rate = future.result()
+                if manifest["sample_rate"] not in (None, sample_rate):
+                    from audio_output import resample
+                    wav = resample(wav, sample_rate, manifest["sample_rate"])
+                manifest["sample_rate"] = manifest["sample_rate"] or int(sample_rate)
+                wav = postprocess(wav, manifest["sample_rate"])
+                self._save_chunk(index, wav)
+                manifest["done"][str(index)] = len(wav)
+                self._save_manifest(manifest)
+                self.stats["rendered"] += 1
+                self._report(len(manifest["done"]), total, t0)
+
+    def _report(self, done, total, t0):
+        elapsed = time.perf_counter() - t0
+        self.stats["render_time"] = round(elapsed, 2)
+        rate = self.stats["rendered"] / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / rate if rate > 0 else None
+        logger.info(f"📖 Lecture à voix haute : {done}/{total}" + (f" (reste ~{eta:.0f}s)" if eta is not None else ""))
+        if self.progress_callback:
+            try:
+                self.progress_callback(done, total, eta)
+            except Exception as e:
+                logger.debug(f"Callback de progression en erreur: {e}")
+
+    def _stitch(self, chunks, manifest):
+        """Assemble les phrases dans l'ordre, en flux vers l'encodeur (une phrase en mémoire à la fois)."""
+        import numpy as np
+        sample_rate = manifest["sample_rate"]
+        pauses = {
+            False: np.zeros(int(sample_rate * SENTENCE_PAUSE_MS / 1000), np.float32),
+            True: np.zeros(int(sample_rate * PARAGRAPH_PAUSE_MS / 1000), np.float32),
+        }
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        encoder = AudioEncoder(self.output_path, sample_rate)
+        samples = 0
+        try:
+            for index, (_, paragraph_end) in enumerate(chunks):
+                wav = np.load(self._chunk_path(index), mmap_mode="r")
+                encoder.write(wav)
+                samples += len(wav)
+                if index < len(chunks) - 1:
+                    encoder.write(pauses[paragraph_end])
+                    samples += len(pauses[paragraph_end])
+        finally:
+            path = encoder.close()
+        self.stats["audio_seconds"] = round(samples / sample_rate, 2)
+        return path
+
+def read_aloud(text, output_path, language="fr", speaker_wav=None, speed=1.0, workers=None, progress_callback=None):
+    """Rend un long texte en un fichier audio (reprend automatiquement un job interrompu)."""
+    return ReadAloudJob(text, output_path, language, speaker_wav, speed, workers, progress_callback).run()
+
+# --- Auto-test (pool factice, sans XTTS) ---
+def _tone_render(text, sample_rate=16000):
+    """Rendu factice : une note dont la durée suit la longueur du texte (exécuté dans un processus)."""
+    import numpy as np
+    time.sleep(0.02)
+    t = np.arange(int(sample_rate * 0.01 * len(text))) / sample_rate
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), sample_rate
+
+def _self_check():
+    import tempfile
+    global JOBS_DIR
+    paragraphs = ["Première phrase du document. Deuxième phrase, un peu plus longue ! Troisième ?"] * 4
+    text = "\n\n".join(f"Paragraphe {i}. {p}" for i, p in enumerate(paragraphs))
+    splitter = lambda t: [s for s in re.split(r"(?<=[.!?])\s+", t) if s]
+    submitted = []
+    with tempfile.TemporaryDirectory() as tmp, concurrent.futures.ProcessPoolExecutor(2) as executor:
+        JOBS_DIR = Path(tmp) / "jobs"
+
+        def submit(sentence):
+            submitted.append(sentence)
+            return executor.submit(_tone_render, sentence)
+
+        def make_job(progress_callback=None):
+            return ReadAloudJob(text, Path(tmp) / "out.wav", submit=submit, splitter=splitter,
+                                postprocess=lambda wav, sr: wav, progress_callback=progress_callback)
+
+        # 1) Interruption au milieu (simule un plantage) : le manifeste garde les phrases déjà rendues
+        job = make_job()
+        job.progress_callback = lambda done, total, eta: done >= 5 and job.cancel()
+        assert job.run() is None and not (Path(tmp) / "out.wav").exists()
+        first_pass = len(submitted)
+        total = job.stats["chunks"]
+        print(f"✅ Interrompu après {first_pass}/{total} phrases soumises")
+        # 2) Reprise : seules les phrases manquantes repartent dans le pool
+        job = make_job()
+        path = job.run()
+        assert job.stats["resumed"] >= 5 and job.stats["rendered"] == total - job.stats["resumed"], job.stats
+        expected = sum(0.01 * len(s) for s, _ in job._split())
+        expected += 0.2 * (total - len(paragraphs)) + 0.6 * (len(paragraphs) - 1)
+        assert abs(job.stats["audio_seconds"] - expected) < 0.05, (job.stats, expected)
+        assert path.exists() and not job.job_dir.exists()
+        print(f"✅ Reprise : {job.stats['resumed']} phrases réutilisées, {job.stats['rendered']} rendues, "
+              f"{job.stats['audio_seconds']}s d'audio dans {path.name} ({job.stats['chunks']} phrases dans l'ordre)")
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Lecture à voix haute d'un document en fichier audio")
+    parser.add_argument("input", nargs="?", help="Fichier texte, PDF ou DOCX")
+    parser.add_argument("-o", "--output", help="Fichier de sortie (.mp3, .opus, .ogg, .m4a, .flac, .wav)")
+    parser.add_argument("--workers", type=int, default=None, help="Processus TTS dédiés (défaut : pool partagé ou 2)")
+    parser.add_argument("--language", default="fr")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--self-check", action="store_true", help="Auto-test avec un pool factice")
+    args = parser.parse_args()
+    if args.self_check:
+        _self_check()
+        return
+    if not args.input:
+        parser.error("fichier d'entrée requis")
+    from analyze import extract_text
+    text = extract_text(args.input)
+    output = args.output or str(Path(args.input).with_suffix(".mp3"))
+    read_aloud(text, output, language=args.language, speed=args.speed, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Latents de conditionnement XTTS persistés pour le clonage vocal
+- Calculés une seule fois par fichier speaker (clé : hash SHA-256 du contenu du WAV).
+- Stockés sur disque à côté de l'échantillon (<nom>.<hash>.latents.pt), réutilisés à chaque synthèse.
+- Invalidés automatiquement quand le WAV change (nouveau hash => recalcul, ancien fichier supprimé).
+- Synthèse en streaming : inference_stream() avec les latents en cache, morceaux de ~250 ms.
+- Synthèse par lot : plusieurs phrases de longueurs voisines passent dans un seul generate() GPT.
+"""
+
+import contextlib
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+def xtts_model_of(tts_api):
+    """Retourne le modèle Xtts sous-jacent d'une instance TTS.api.TTS (ou le modèle lui-même)."""
+    synthesizer = getattr(tts_api, "synthesizer", None)
+    return synthesizer.tts_model if synthesizer is not None else tts_api
+
+def xtts_sample_rate(xtts_model):
+    try:
+        return int(xtts_model.config.audio.output_sample_rate)
+    except Exception:
+        return 24000
+
+class SpeakerLatentStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._latents = {}  # hash -> (gpt_cond_latent, speaker_embedding)
+        self._hashes = {}   # (chemin, mtime, taille) -> hash
+
+    def file_hash(self, speaker_wav):
+        st = os.stat(speaker_wav)
+        stamp = (os.path.abspath(speaker_wav), st.st_mtime_ns, st.st_size)
+        digest = self._hashes.get(stamp)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(speaker_wav, "rb") as f:
+                for block in iter(lambda: f.read(1 << 16), b""):
+                    h.update(block)
+            digest = self._hashes[stamp] = h.hexdigest()
+        return digest
+
+    @staticmethod
+    def latents_path(speaker_wav, digest):
+        path = Path(speaker_wav)
+        return path.with_name(f"{path.stem}.{digest[:16]}.latents.pt")
+
+    def get(self, tts_api, speaker_wav):
+        """Retourne (gpt_cond_latent, speaker_embedding) pour ce speaker_wav, calculés au plus une fois."""
+        import torch
+        xtts = xtts_model_of(tts_api)
+        digest = self.file_hash(speaker_wav)
+        with self.lock:
+            latents = self._latents.get(digest)
+            if latents is not None:
+                return latents
+            device = next(xtts.parameters()).device
+            path = self.latents_path(speaker_wav, digest)
+            if path.exists():
+                try:
+                    data = torch.load(path, map_location=device)
+                    if data.get("hash") == digest:
+                        latents = (data["gpt_cond_latent"], data["speaker_embedding"])
+                        logger.info(f"✅ Latents speaker chargés depuis {path.name}")
+                except Exception as e:
+                    logger.warning(f"Latents speaker illisibles ({path.name}), recalcul: {e}")
+            if latents is None:
+                with torch.inference_mode():
+                    latents = xtts.get_conditioning_latents(audio_path=[str(speaker_wav)])
+                self._save(speaker_wav, digest, latents)
+            self._latents[digest] = latents
+            return latents
+
+    def _save(self, speaker_wav, digest, latents):
+        import torch
+        path = self.latents_path(speaker_wav, digest)
+        # Supprime les latents d'anciennes versions de ce même WAV
+        for stale in path.parent.glob(f"{Path(speaker_wav).stem}.*.latents.pt"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+        try:
+            gpt_cond_latent, speaker_embedding = latents
+            torch.save({
+                "hash": digest,
+                "gpt_cond_latent": gpt_cond_latent.cpu(),
+                "speaker_embedding": speaker_embedding.cpu(),
+            }, path)
+            logger.info(f"💾 Latents speaker enregistrés: {path.name}")
+        except Exception as e:
+            logger.warning(f"Impossible d'enregistrer les latents speaker: {e}")
+
+    def synthesize(self, tts_api, text, language, speaker_wav, speed=1.0, bf16=False):
+        """Synthèse XTTS à partir des latents en cache (Xtts.inference tourne déjà sous torch.inference_mode).
+        Retourne (waveform float32, sample_rate)."""
+        import numpy as np
+        import torch
+        xtts = xtts_model_of(tts_api)
+        gpt_cond_latent, speaker_embedding = self.get(tts_api, speaker_wav)
+        with contextlib.ExitStack() as stack:
+            if bf16:
+                stack.enter_context(torch.autocast("cpu", dtype=torch.bfloat16))
+            out = xtts.inference(
+                text,
+                language,
+                gpt_cond_latent,
+                speaker_embedding,
+                speed=speed,
+                enable_text_splitting=False,
+            )
+        wav = out["wav"]
+        if torch.is_tensor(wav):
+            wav = wav.detach().float().cpu().numpy()
+        return np.asarray(wav, dtype=np.float32).reshape(-1), xtts_sample_rate(xtts)
+
+    def synthesize_stream(self, tts_api, text, language, speaker_wav, speed=1.0, chunk_ms=250, bf16=False):
+        """Générateur XTTS en streaming : (morceau float32, sample_rate) au fil du décodage.
+        chunk_ms est converti en jetons GPT (1 jeton = code_stride_len échantillons, ~43 ms à 24 kHz).
+        Les contextes torch ne sont actifs que pendant le calcul de chaque morceau, jamais entre deux yield."""
+        import numpy as np
+        import torch
+        xtts = xtts_model_of(tts_api)
+        sample_rate = xtts_sample_rate(xtts)
+        gpt_cond_latent, speaker_embedding = self.get(tts_api, speaker_wav)
+        stride = getattr(xtts.gpt, "code_stride_len", 1024)
+        chunk_tokens = max(2, round(chunk_ms / 1000 * sample_rate / stride))
+        stream = xtts.inference_stream(
+            text,
+            language,
+            gpt_cond_latent,
+            speaker_embedding,
+            stream_chunk_size=chunk_tokens,
+            speed=speed,
+            enable_text_splitting=False,
+        )
+        while True:
+            with contextlib.ExitStack() as stack:
+                if bf16:
+                    stack.enter_context(torch.autocast("cpu", dtype=torch.bfloat16))
+                chunk = next(stream, None)
+            if chunk is None:
+                return
+            if torch.is_tensor(chunk):
+                chunk = chunk.detach().float().cpu().numpy()
+            yield np.asarray(chunk, dtype=np.float32).reshape(-1), sample_rate
+
+    @staticmethod
+    def _generate_codes(xtts, tokens, gpt_cond_latent, do_sample=True):
+        """Codes audio GPT d'un lot de phrases (listes de jetons texte), un tenseur par phrase.
+        Les jetons sont complétés à droite par le jeton de fin de texte ; le masque d'attention cache ce
+        remplissage, si bien que chaque ligne voit exactement la séquence d'une synthèse seule
+        (latents, début, texte, fin, début audio) avec les mêmes positions texte et audio."""
+        import torch
+        cfg = xtts.config
+        device = gpt_cond_latent.device
+        width = max(len(t) for t in tokens)
+        stop_text = xtts.gpt.stop_text_token
+        text_batch = torch.tensor([t + [stop_text] * (width - len(t)) for t in tokens], dtype=torch.int32, device=device)
+        # Entrées GPT : latents (n_cond) + [début, texte (width), fin] + fin ajoutée par compute_embeddings + début audio
+        n_cond = gpt_cond_latent.shape[1]
+        mask = torch.zeros((len(tokens), n_cond + width + 3), dtype=torch.long, device=device)
+        for i, t in enumerate(tokens):
+            mask[i, :n_cond + len(t) + 2] = 1  # latents, début, texte, premier jeton de fin
+            mask[i, -1] = 1                    # début audio
+        codes = xtts.gpt.generate(
+            cond_latents=gpt_cond_latent.expand(len(tokens), -1, -1),
+            text_inputs=text_batch,
+            input_tokens=None,
+            attention_mask=mask,
+            do_sample=do_sample,
+            top_p=getattr(cfg, "top_p", 0.85),
+            top_k=getattr(cfg, "top_k", 50),
+            temperature=getattr(cfg, "temperature", 0.75),
+            num_return_sequences=1,
+            num_beams=1,
+            length_penalty=getattr(cfg, "length_penalty", 1.0),
+            repetition_penalty=getattr(cfg, "repetition_penalty", 10.0),
+            output_attentions=False,
+        )
+        stop_audio = xtts.gpt.stop_audio_token
+        rows = []
+        for row in codes:
+            # Codes audio de la phrase : jusqu'au premier jeton de fin (le reste est du remplissage)
+            ends = (row == stop_audio).nonzero()
+            rows.append(row[:int(ends[0]) + 1 if len(ends) else row.shape[0]])
+        return rows
+
+    def _tokenize(self, xtts, texts, language):
+        return [xtts.tokenizer.encode(text.strip().lower(), lang=language.split("-")[0]) for text in texts]
+
+    def synthesize_batch(self, tts_api, texts, language, speaker_wav, speed=1.0, bf16=False):
+        """Synthèse XTTS d'un lot de phrases en un seul appel GPT (génération autorégressive, la partie chère).
+        Regrouper des phrases de longueurs voisines limite le remplissage (masqué, mais calculé).
+        Décodage HiFi-GAN phrase par phrase. Retourne [(waveform float32, sample_rate), ...] dans l'ordre des textes."""
+        import numpy as np
+        import torch
+        import torch.nn.functional as F
+        if len(texts) == 1:
+            return [self.synthesize(tts_api, texts[0], language, speaker_wav, speed, bf16)]
+        xtts = xtts_model_of(tts_api)
+        gpt_cond_latent, speaker_embedding = self.get(tts_api, speaker_wav)
+        device = gpt_cond_latent.device
+        tokens = self._tokenize(xtts, texts, language)
+        length_scale = 1.0 / max(speed, 0.05)
+        results = []
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(torch.inference_mode())  # gpt.generate / gpt() appelés directement, hors Xtts.inference
+            if bf16:
+                stack.enter_context(torch.autocast("cpu", dtype=torch.bfloat16))
+            codes = self._generate_codes(xtts, tokens, gpt_cond_latent)
+            for text_tokens, row in zip(tokens, codes):
+                gpt_codes = row.unsqueeze(0)
+                text_i = torch.tensor([text_tokens], dtype=torch.int32, device=device)
+                latents = xtts.gpt(
+                    text_i,
+                    torch.tensor([text_i.shape[-1]], device=device),
+                    gpt_codes,
+                    torch.tensor([gpt_codes.shape[-1] * xtts.gpt.code_stride_len], device=device),
+                    cond_latents=gpt_cond_latent,
+                    return_attentions=False,
+                    return_latent=True,
+                )
+                if length_scale != 1.0:
+                    latents = F.interpolate(latents.transpose(1, 2), scale_factor=length_scale, mode="linear").transpose(1, 2)
+                wav = xtts.hifigan_decoder(latents, g=speaker_embedding).detach().float().cpu().numpy()
+                results.append((np.asarray(wav, dtype=np.float32).reshape(-1), xtts_sample_rate(xtts)))
+        return results
+
+    def check_batch(self, tts_api, texts, language, speaker_wav, seed=0):
+        """Compare les codes GPT d'un lot à ceux de chaque phrase générée seule (décodage glouton, même graine).
+        Retourne {"match": bool, "rows": [{"text", "batched", "single", "equal"}, ...]}."""
+        import torch
+        xtts = xtts_model_of(tts_api)
+        gpt_cond_latent, _ = self.get(tts_api, speaker_wav)
+        tokens = self._tokenize(xtts, texts, language)
+        with torch.inference_mode():
+            torch.manual_seed(seed)
+            batched = self._generate_codes(xtts, tokens, gpt_cond_latent, do_sample=False)
+            single = []
+            for t in tokens:
+                torch.manual_seed(seed)
+                single.append(self._generate_codes(xtts, [t], gpt_cond_latent, do_sample=False)[0])
+        rows = [{"text": text, "batched": len(b), "single": len(s), "equal": bool(torch.equal(b, s))}
+                for text, b, s in zip(texts, batched, single)]
+        return {"match": all(r["equal"] for r in rows), "rows": rows}
+
+def group_by_length(texts, max_batch=4, max_ratio=1.3):
+    """Regroupe les indices de textes de longueurs voisines (<= max_batch par lot, max/min <= max_ratio)."""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    groups = []
+    for i in order:
+        group = groups[-1] if groups else None
+        if (group is not None and len(group) < max_batch
+                and len(texts[i]) <= max_ratio * max(1, len(texts[group[0]]))):
+            group.append(i)
+        else:
+            groups.append([i])
+    return groups
+
+def write_wav(path, wav, sample_rate):
+    """Écrit une waveform float [-1, 1] en WAV PCM 16 bits mono (chemin ou fichier en mémoire)."""
+    import wave
+    import numpy as np
+    pcm = (np.clip(wav, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path if hasattr(path, "write") else str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(int(sample_rate))
+        f.writeframes(pcm.tobytes())
+    return path
+
+speaker_latents = SpeakerLatentStore()
@@ -0,0 +1,175 @@
+"""
+Ordonnanceur de parole pour WillIAM
+- Un seul thread de travail, quel que soit le nombre de messages en attente.
+- File à priorités : URGENT > NORMAL > BACKGROUND (FIFO à priorité égale).
+- Fusion des doublons / remplacement des messages périmés (merge_key), jetons d'annulation.
+- Barge-in : l'utilisateur parle -> lecture coupée, synthèses en attente abandonnées.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+URGENT = 0
+NORMAL = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {"urgent": URGENT, "normal": NORMAL, "background": BACKGROUND}
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason="cancelled"):
+        self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+class SpeechJob:
+    def __init__(self, text, priority, seq, merge_key=None, kwargs=None):
+        self.text = text
+        self.priority = priority
+        self.seq = seq
+        self.merge_key = merge_key
+        self.kwargs = kwargs or {}
+        self.token = CancelToken()
+        self.done = threading.Event()
+        self.result = None
+
+    def cancel(self, reason="cancelled"):
+        self.token.cancel(reason)
+
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        return self.result
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class SpeechScheduler:
+    def __init__(self, speak_fn, stop_playback=None, max_queued_background=3):
+        """speak_fn(text, token, **kwargs) exécute un énoncé ; stop_playback() coupe le son en cours."""
+        self.speak_fn = speak_fn
+        self.stop_playback = stop_playback
+        self.max_queued_background = max_queued_background
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._current = None
+        self._worker = None
+        self._barge_in_hooks = []
+        self.stats = {"submitted": 0, "spoken": 0, "merged": 0, "superseded": 0, "cancelled": 0, "barge_ins": 0}
+
+    # --- Soumission ---
+    def submit(self, text, priority=NORMAL, merge_key=None, **kwargs):
+        """Met un message en file. merge_key : remplace tout message en attente ayant la même clé."""
+        if isinstance(priority, str):
+            priority = PRIORITY_NAMES.get(priority, NORMAL)
+        with self._cond:
+            self.stats["submitted"] += 1
+            # Même texte et mêmes options déjà en attente : on ne le dira qu'une fois (à la priorité la plus haute).
+            # Des options différentes (export, langue...) font un autre message : un export n'est jamais perdu.
+            for queued in self._heap:
+                if queued.text == text and queued.kwargs == kwargs and not queued.token.cancelled:
+                    self.stats["merged"] += 1
+                    if priority < queued.priority:
+                        queued.priority = priority
+                        heapq.heapify(self._heap)
+                    return queued
+            if merge_key is not None:
+                for queued in self._heap:
+                    if queued.merge_key == merge_key and not queued.token.cancelled:
+                        queued.cancel("superseded")
+                        self.stats["superseded"] += 1
+                if self._current is not None and self._current.merge_key == merge_key:
+                    self._current.cancel("superseded")
+                    self.stats["superseded"] += 1
+            job = SpeechJob(text, priority, next(self._seq), merge_key, kwargs)
+            heapq.heappush(self._heap, job)
+            self._trim_background()
+            # Un message urgent interrompt un message d'arrière-plan en cours
+            if priority == URGENT and self._current is not None and self._current.priority == BACKGROUND:
+                self._current.cancel("preempted")
+            self._ensure_worker()
+            self._cond.notify()
+            return job
+
+    def _trim_background(self):
+        background = sorted(j for j in self._heap if j.priority == BACKGROUND and not j.token.cancelled)
+        for job in background[:-self.max_queued_background or None]:
+            job.cancel("dropped")
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="speech-scheduler", daemon=True)
+            self._worker.start()
+
+    # --- Exécution ---
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                job = heapq.heappop(self._heap)
+                if job.token.cancelled:
+                    self._finish(job, False)
+                    continue
+                self._current = job
+            try:
+                job.result = self.speak_fn(job.text, job.token, **job.kwargs)
+                if not job.token.cancelled:
+                    self.stats["spoken"] += 1
+            except Exception as e:
+                logger.error(f"❌ Erreur énoncé '{job.text[:40]}': {e}")
+                job.result = False
+            finally:
+                with self._cond:
+                    self._current = None
+                    self._finish(job, job.result)
+
+    def _finish(self, job, result):
+        if job.token.cancelled:
+            self.stats["cancelled"] += 1
+            logger.info(f"🔇 Énoncé annulé ({job.token.reason}): {job.text[:40]}")
+        job.result = result
+        job.done.set()
+
+    # --- Annulation / barge-in ---
+    def cancel_all(self, reason="cancelled"):
+        """Annule l'énoncé en cours et vide la file."""
+        with self._cond:
+            for job in self._heap:
+                job.cancel(reason)
+            if self._current is not None:
+                self._current.cancel(reason)
+        if self.stop_playback:
+            self.stop_playback()
+
+    def add_barge_in_hook(self, hook):
+        self._barge_in_hooks.append(hook)
+
+    def barge_in(self):
+        """L'utilisateur commence à parler : coupe la lecture et jette les synthèses en attente."""
+        self.stats["barge_ins"] += 1
+        self.cancel_all("barge-in")
+        for hook in self._barge_in_hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.warning(f"Hook barge-in en erreur: {e}")
+
+    def is_speaking(self):
+        with self._cond:
+            return self._current is not None or any(not j.token.cancelled for j in self._heap)
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats["queued"] = sum(1 for j in self._heap if not j.token.cancelled)
+            return stats
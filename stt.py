@@ -1,28 +1,299 @@
+"""
+Reconnaissance vocale de WillIAM
+- STTService garde tout en place entre deux tours de parole : le modèle Whisper (chargé une fois, pack rapide
+  si disponible, cf. model_pack.py), le Recognizer et le flux micro (ouvert une fois, pas à chaque écoute).
+- transcribe() accepte directement un tampon audio (AudioData, PCM 16 bits, float32, fichier) : un tour ne coûte
+  plus que le décodage Whisper.
+- Fin d'énoncé par VAD en flux (vad.py) au lieu de pause_threshold fixe : le segment coupé part vers Whisper
+  dès que l'utilisateur s'arrête (hangover_ms réglable).
+- Transcription partielle pendant la parole : une fenêtre glissante de l'énoncé en cours est redécodée toutes
+  les quelques centaines de ms (décodage glouton, un seul à la fois, part du temps CPU bornée) ; seul le préfixe
+  stable (identique entre deux hypothèses successives) est affiché comme acquis. Décodage final à la fin d'énoncé.
+- Début de parole signalé (on_speech_start) dès la première trame vocale du VAD : la voix de William peut être
+  coupée (barge-in) au moment où l'utilisateur parle, pas au moment où l'écoute démarre.
+- Mesures exposées : temps de chargement du modèle, latence de décodage par énoncé (et facteur temps réel),
+  instants de fin d'énoncé par tour.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
 import speech_recognition as sr
 
-def listen(timeout=8, use_whisper=True, language="fr-FR", gui_callback=None):
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
+logger = logging.getLogger(__name__)
+
+WHISPER_SAMPLE_RATE = 16000
+
+def stable_prefix(previous, current):
+    """Plus long préfixe commun (en mots) de deux hypothèses successives : la partie qui ne bouge plus."""
+    stable = []
+    for a, b in zip(previous, current):
+        if a.lower().strip(".,!?;:") != b.lower().strip(".,!?;:"):
+            break
+        stable.append(b)
+    return stable
+
+def speech_onset_hook(on_speech_start, on_block=None):
+    """Enveloppe on_block(vad) : appelle on_speech_start() une seule fois, au premier bloc où le VAD est en parole."""
+    fired = False
+
+    def hook(vad):
+        nonlocal fired
+        if not fired and vad.in_speech:
+            fired = True
+            try:
+                on_speech_start()
+            except Exception as e:
+                logger.warning(f"Callback de début de parole en erreur: {e}")
+        if on_block is not None:
+            on_block(vad)
+    return hook
+
+class PartialTranscriber:
+    """Décodages partiels d'un énoncé en cours, dans un thread, sans jamais en lancer deux à la fois.
+    Coût borné : fenêtre de window_s secondes au plus, intervalle minimal entre deux décodages, et au plus
+    budget (fraction du temps réel) passé à décoder des partiels (un décodage de 0,3 s avec budget 0,5
+    impose 0,3 s de pause avant le suivant)."""
+
+    def __init__(self, service, on_partial, language=None, interval_ms=400, window_s=8.0, budget=0.5, min_audio_s=0.5):
+        self.service = service
+        self.on_partial = on_partial
+        self.language = language
+        self.interval = interval_ms / 1000
+        self.window_s = window_s
+        self.budget = max(0.05, min(1.0, budget))
+        self.min_audio_s = min_audio_s
+        self._busy = threading.Event()
+        self._closed = False
+        self._next_allowed = 0.0
+        self._previous = []
+        self.stats = {"partials": 0, "skipped": 0, "decode_time": 0.0}
+
+    def on_block(self, vad):
+        """Appelé après chaque bloc micro : lance un décodage partiel si le budget le permet."""
+        if not vad.in_speech or self._closed:
+            return
+        now = time.perf_counter()
+        if self._busy.is_set() or now < self._next_allowed:
+            self.stats["skipped"] += 1
+            return
+        segment = vad.current_segment()
+        if segment is None or len(segment) < self.min_audio_s * vad.sample_rate:
+            return
+        window = segment[-int(self.window_s * vad.sample_rate):]
+        truncated = len(window) < len(segment)
+        self._busy.set()
+        threading.Thread(target=self._decode, args=(window, vad.sample_rate, truncated),
+                         name="stt-partial", daemon=True).start()
+
+    def _decode(self, window, sample_rate, truncated):
+        t0 = time.perf_counter()
+        try:
+            words = self.service.transcribe(window, sample_rate, self.language, partial=True).split()
+        except Exception as e:
+            logger.debug(f"Décodage partiel en erreur: {e}")
+            words = None
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.stats["decode_time"] += elapsed
+            self._next_allowed = time.perf_counter() + max(self.interval, elapsed * (1.0 / self.budget - 1.0))
+            self._busy.clear()
+        if words is None or self._closed:
+            return
+        stable = stable_prefix(self._previous, words)
+        self._previous = words
+        self.stats["partials"] += 1
+        prefix = "… " if truncated else ""
+        try:
+            self.on_partial(prefix + " ".join(stable), " ".join(words[len(stable):]))
+        except Exception as e:
+            logger.debug(f"Callback partiel en erreur: {e}")
+
+    def close(self):
+        """Fin d'énoncé : les partiels encore en vol sont ignorés."""
+        self._closed = True
+
+class STTService:
+    def __init__(self, model_name="base", language="fr", pause_threshold=0.8, energy_threshold=300, device_index=None,
+                 use_vad=True, hangover_ms=300, partial_interval_ms=400, partial_window_s=8.0, partial_budget=0.5):
+        self.model_name = model_name
+        self.language = language
+        self.device_index = device_index
+        self.recognizer = sr.Recognizer()
+        self.recognizer.pause_threshold = pause_threshold
+        self.recognizer.energy_threshold = energy_threshold
+        self.vad = None
+        if use_vad:
+            from vad import VADEndpointer
+            self.vad = VADEndpointer(hangover_ms=hangover_ms)
+        self.model = None
+        self._microphone = None
+        self._source = None
+        self._load_lock = threading.Lock()
+        self._decode_lock = threading.Lock()  # un seul décodage à la fois sur le modèle partagé
+        self._mic_lock = threading.Lock()
+        self._loader = None
+        self.load_time = None
+        self.decode_times = deque(maxlen=50)  # (latence de décodage, durée audio)
+        # Transcription partielle (réglable) : intervalle minimal, fenêtre glissante, part du temps réel
+        self.partial_interval_ms = partial_interval_ms
+        self.partial_window_s = partial_window_s
+        self.partial_budget = partial_budget
+        self.partial_stats = {"utterances": 0, "partials": 0, "skipped": 0, "decode_time": 0.0}
+
+    # --- Modèle ---
+    def load(self):
+        """Charge Whisper une seule fois (appels suivants : retour immédiat)."""
+        with self._load_lock:
+            if self.model is None:
+                from model_pack import load_whisper
+                t0 = time.perf_counter()
+                self.model = load_whisper(self.model_name)
+                self.load_time = round(time.perf_counter() - t0, 2)
+                logger.info(f"🧠 Whisper {self.model_name} résident, chargé en {self.load_time}s")
+            return self.model
+
+    def start_loading(self):
+        """Préchargement en arrière-plan (au démarrage de l'application)."""
+        if self._loader is None:
+            self._loader = threading.Thread(target=self.load, name="stt-whisper-load", daemon=True)
+            self._loader.start()
+        return self._loader
+
+    # --- Micro ---
+    def open(self):
+        """Ouvre le flux micro une fois et le garde ouvert entre les tours."""
+        with self._mic_lock:
+            if self._source is None:
+                self._microphone = sr.Microphone(device_index=self.device_index)
+                self._source = self._microphone.__enter__()
+            return self._source
+
+    def close(self):
+        with self._mic_lock:
+            if self._microphone is not None:
+                try:
+                    self._microphone.__exit__(None, None, None)
+                except Exception as e:
+                    logger.debug(f"Fermeture micro: {e}")
+                self._microphone = self._source = None
+
+    def listen_audio(self, timeout=8, phrase_time_limit=None, on_block=None, on_speech_start=None):
+        """Enregistre un énoncé sur le flux ouvert. Lève sr.WaitTimeoutError si personne ne parle.
+        on_speech_start() : appelé à la première trame vocale (sans VAD : une fois l'énoncé capturé)."""
+        source = self.open()
+        with self._mic_lock:
+            if self.vad is not None:
+                from vad import listen_source
+                if on_speech_start is not None:
+                    on_block = speech_onset_hook(on_speech_start, on_block)
+                return listen_source(source, self.vad, timeout=timeout, max_wait=phrase_time_limit or 30.0,
+                                     on_block=on_block)
+            audio = self.recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
+        if on_speech_start is not None:
+            on_speech_start()
+        return audio
+
+    # --- Décodage ---
+    @staticmethod
+    def to_waveform(audio, sample_rate=WHISPER_SAMPLE_RATE):
+        """Tampon audio -> float32 mono 16 kHz (format d'entrée de Whisper)."""
+        import numpy as np
+        if isinstance(audio, sr.AudioData):
+            raw = audio.get_raw_data(convert_rate=WHISPER_SAMPLE_RATE, convert_width=2)
+            return np.frombuffer(raw, "<i2").astype(np.float32) / 32768.0
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            audio = np.frombuffer(audio, "<i2").astype(np.float32) / 32768.0
+        elif isinstance(audio, str):
+            from audio_output import read_wav_file
+            audio, sample_rate = read_wav_file(audio)
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        if sample_rate != WHISPER_SAMPLE_RATE:
+            from audio_output import resample
+            audio = resample(audio, sample_rate, WHISPER_SAMPLE_RATE)
+        return audio
+
+    def transcribe(self, audio, sample_rate=WHISPER_SAMPLE_RATE, language=None, partial=False):
+        """Transcrit un tampon audio avec le modèle résident. Retourne le texte.
+        partial=True : décodage glouton sans horodatage (hypothèse intermédiaire, hors mesures de latence)."""
+        import torch
+        waveform = self.to_waveform(audio, sample_rate)
+        model = self.load()
+        options = {"temperature": 0.0, "without_timestamps": True} if partial else {}
+        t0 = time.perf_counter()
+        with self._decode_lock:
+            result = model.transcribe(
+                waveform,
+                language=(language or self.language).split("-")[0],
+                fp16=torch.cuda.is_available(),
+                condition_on_previous_text=False,
+                **options,
+            )
+        if not partial:
+            self.decode_times.append((time.perf_counter() - t0, len(waveform) / WHISPER_SAMPLE_RATE))
+        return result.get("text", "").strip()
+
+    def listen_streaming(self, on_partial, timeout=8, language=None, on_speech_start=None):
+        """Écoute un énoncé en émettant des hypothèses partielles on_partial(préfixe_stable, suite_instable).
+        Retourne l'AudioData coupé à la fin d'énoncé, à décoder entièrement (transcribe) tout de suite."""
+        partials = PartialTranscriber(
+            self, on_partial, language,
+            interval_ms=self.partial_interval_ms, window_s=self.partial_window_s, budget=self.partial_budget,
+        )
+        try:
+            audio = self.listen_audio(timeout=timeout, on_block=partials.on_block, on_speech_start=on_speech_start)
+        finally:
+            partials.close()
+            self.partial_stats["utterances"] += 1
+            for key in ("partials", "skipped", "decode_time"):
+                self.partial_stats[key] += partials.stats[key]
+        return audio
+
+    def get_stats(self):
+        latencies = sorted(t for t, _ in self.decode_times)
+        audio = sum(d for _, d in self.decode_times)
+        return {
+            "model": self.model_name,
+            "loaded": self.model is not None,
+            "load_time": self.load_time,
+            "utterances": len(latencies),
+            "last_decode": round(self.decode_times[-1][0], 3) if latencies else None,
+            "avg_decode": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "p95_decode": round(latencies[int(0.95 * (len(latencies) - 1))], 3) if latencies else None,
+            "rtf": round(sum(latencies) / audio, 3) if audio else None,
+            "microphone_open": self._source is not None,
+            "endpointing": self.vad.get_stats() if self.vad is not None else None,
+            "partial": dict(self.partial_stats, decode_time=round(self.partial_stats["decode_time"], 2)),
+        }
+
+    # --- Tour de parole complet (écoute + Whisper, repli Google) ---
+    def listen(self, timeout=8, use_whisper=True, language="fr-FR", gui_callback=None, partial_callback=None,
+               speech_start_callback=None):
+        """partial_callback(préfixe_stable, suite_instable) : hypothèses partielles pendant la parole (Whisper + VAD).
+        speech_start_callback() : l'utilisateur commence à parler (barge-in)."""
         print("🎙️ Parlez, j'écoute...")
-        recognizer.pause_threshold = 0.8
-        recognizer.energy_threshold = 300
         try:
-            audio = recognizer.listen(source, timeout=timeout)
+            if use_whisper and partial_callback is not None and self.vad is not None:
+                audio = self.listen_streaming(partial_callback, timeout=timeout, language=language,
+                                              on_speech_start=speech_start_callback)
+            else:
+                audio = self.listen_audio(timeout=timeout, on_speech_start=speech_start_callback)
         except sr.WaitTimeoutError:
             print("⌛ Aucun son détecté.")
             if gui_callback:
                 gui_callback("<i>Aucun son détecté.</i>", "#ff5555")
             return ""
-        
-        # Tentative Whisper local
+        finally:
+            if partial_callback is not None:
+                partial_callback("", "")  # efface la ligne partielle
+
+        # Tentative Whisper local (décodage final dès la fin d'énoncé)
         if use_whisper:
             try:
-                text = recognizer.recognize_whisper(
-                    audio,
-                    language=language.split('-')[0],
-                    model="base"
-                )
-                print(f"🧠 (Whisper) Vous avez dit : {text}")
+                text = self.transcribe(audio, language=language)
+                print(f"🧠 (Whisper) Vous avez dit : {text} ({self.decode_times[-1][0]:.2f}s)")
                 if gui_callback:
                     gui_callback(f"<b>Vous (Whisper):</b> {text}", "#36e636")
                 return text
@@ -32,7 +303,7 @@ def listen(timeout=8, use_whisper=True, language="fr-FR", gui_callback=None):
                     gui_callback(f"<i>Whisper local indisponible ({e}), essai Google...</i>", "#ffd700")
         # Fallback Google API
         try:
-            text = recognizer.recognize_google(audio, language=language)
+            text = self.recognizer.recognize_google(audio, language=language)
             print(f"🧠 (Google) Vous avez dit : {text}")
             if gui_callback:
                 gui_callback(f"<b>Vous (Google):</b> {text}", "#36e636")
@@ -46,4 +317,21 @@ def listen(timeout=8, use_whisper=True, language="fr-FR", gui_callback=None):
             print("❌ Problème de connexion à Google.")
             if gui_callback:
                 gui_callback("<i>Connexion Google impossible.</i>", "#ff5555")
-            return ""
\ No newline at end of file
+            return ""
+
+stt_service = STTService()
+
+def listen(timeout=8, use_whisper=True, language="fr-FR", gui_callback=None, partial_callback=None,
+           speech_start_callback=None):
+    return stt_service.listen(timeout=timeout, use_whisper=use_whisper, language=language,
+                              gui_callback=gui_callback, partial_callback=partial_callback,
+                              speech_start_callback=speech_start_callback)
+
+def record_audio(timeout=8):
+    return stt_service.listen_audio(timeout=timeout)
+
+def transcribe_audio(audio, language="fr"):
+    return stt_service.transcribe(audio, language=language)
+
+def get_stt_stats():
+    return stt_service.get_stats()
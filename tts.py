@@ -4,30 +4,77 @@ import os
 import tempfile
 import time
 import logging
+import io
+import json
+import multiprocessing
 import platform
+import queue
+import re
 import wave
+from collections import deque
 from pathlib import Path
 
+from audio_dsp import ChunkCrossfader, process as dsp_process
+from audio_output import get_output_device, read_wav_file, resample, wav_bytes_to_pcm
+from filler_bank import FillerBank
+from speaker_latents import group_by_length, speaker_latents, write_wav, xtts_model_of
+from speech_scheduler import NORMAL, SpeechScheduler
+from tts_cache import PhraseAudioCache
+
 # --- Logging ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # ----------- CONFIGURATION DU CACHE VOIX -----------
 VOICE_CACHE_DIR = Path("voice_cache")
+# Banque de phrases statiques pré-rendues (suivie par voice_cache/manifest.json)
 SAMPLES = {
     "sample_male_1.wav": "Bonjour, je suis William.",
     "sample_male_2.wav": "Je suis votre assistant personnel.",
     "sample_male_intro.wav": "Chargement des modules. Veuillez patienter.",
-    "error_fallback.wav": "La synthèse vocale rencontre une erreur."
+    "error_fallback.wav": "La synthèse vocale rencontre une erreur.",
+    # Réveil / veille
+    "ack_yes.wav": "Oui ?",
+    "ack_listening.wav": "Oui, je t'écoute !",
+    "ack_sleep.wav": "Très bien, je retourne en veille.",
+    # Attentes
+    "wait_websearch.wav": "Je vais chercher sur le web, un instant...",
+    "wait_thinking.wav": "Laissez-moi réfléchir un instant...",
+    # Erreurs
+    "error_generic.wav": "Désolé, une erreur est survenue.",
+    "error_not_understood.wav": "Je ne suis pas sûr de comprendre. Pouvez-vous reformuler votre question ?",
+    # Réponses de secours (enhanced_assistant._fallback_response)
+    "reply_hello_1.wav": "Bonjour ! Comment puis-je vous aider ?",
+    "reply_hello_2.wav": "Salut ! Que puis-je faire pour vous ?",
+    "reply_hello_3.wav": "Bonjour ! Je suis à votre service.",
+    "reply_status_1.wav": "Ça va très bien, merci ! Et vous ?",
+    "reply_status_2.wav": "Tout va bien de mon côté ! Comment puis-je vous aider ?",
+    "reply_status_3.wav": "Je fonctionne parfaitement, merci de demander !",
+    "reply_help.wav": "Je peux répondre à vos questions, donner l'heure, expliquer des concepts, et bien plus encore ! Que souhaitez-vous savoir ?",
+    "reply_bye_1.wav": "Au revoir ! À bientôt !",
+    "reply_bye_2.wav": "À la prochaine ! Bonne journée !",
+    "reply_bye_3.wav": "Au revoir ! N'hésitez pas à revenir !",
+    "reply_thanks_1.wav": "De rien ! Je suis là pour ça !",
+    "reply_thanks_2.wav": "Avec plaisir ! Autre chose ?",
+    "reply_thanks_3.wav": "C'est normal ! Puis-je vous aider davantage ?",
 }
 
+def render_phrase(text, language="fr"):
+    """Rend une phrase avec la voix clonée XTTS. Retourne (waveform float32, sample_rate)."""
+    pool = xtts_manager.get_worker_pool()
+    if pool is not None:
+        pool.wait_ready(timeout=300)  # rendu en arrière-plan : on attend que les processus aient chargé XTTS
+    if not xtts_manager.is_available():
+        raise RuntimeError("XTTS indisponible (la banque n'est pas rendue avec une autre voix)")
+    wav, sample_rate = xtts_manager.synthesize(text, language, config.speaker_wav_path)
+    if not is_valid_pcm(wav, sample_rate):
+        raise RuntimeError("audio XTTS invalide")
+    return postprocess(wav, sample_rate), sample_rate
+
 def tts_generate(text, output_path):
-    """Génère un fichier WAV via ton moteur TTS (Coqui, etc). À adapter !"""
-    # Exemple : Coqui XTTS
-    # from TTS.api import TTS
-    # tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2")
-    # tts.tts_to_file(text=text, speaker_wav="un_sample.wav", language="fr", file_path=str(output_path))
-    raise NotImplementedError("Adapter tts_generate à ton moteur TTS.")
+    """Génère un fichier WAV avec la voix clonée XTTS."""
+    wav, sample_rate = render_phrase(text)
+    return write_wav(output_path, wav, sample_rate)
 
 def is_valid_wav(path):
     """Contrôle qualité : WAV > 1s, format OK."""
@@ -40,28 +87,22 @@ def is_valid_wav(path):
         return False
 
 def ensure_voice_cache():
-    """Vérifie/génère les échantillons vocaux nécessaires."""
-    VOICE_CACHE_DIR.mkdir(exist_ok=True)
-    for filename, text in SAMPLES.items():
-        path = VOICE_CACHE_DIR / filename
-        if not path.exists() or not is_valid_wav(path):
-            print(f"🎙️ Génération de l’échantillon vocal : {filename}")
-            try:
-                tts_generate(text, output_path=path)
-            except Exception as e:
-                print(f"❌ Échec génération {filename} : {e}")
+    """Charge la banque audio en mémoire et génère en arrière-plan les clips manquants (non bloquant)."""
+    return filler_bank.render_async(config.speaker_wav_path)
 
 def play_fallback_wav(name="error_fallback.wav"):
-    """Lit un .wav du cache en fallback (ex : sur panne Coqui)."""
+    """Lit un clip de la banque (mémoire, sinon fichier) en fallback (ex : sur panne Coqui)."""
     try:
-        import simpleaudio as sa
-        wav_path = VOICE_CACHE_DIR / name
-        if wav_path.exists():
-            wave_obj = sa.WaveObject.from_wave_file(str(wav_path))
-            play_obj = wave_obj.play()
-            play_obj.wait_done()
+        clip = filler_bank.get_by_name(name)
+        if clip is None:
+            wav_path = VOICE_CACHE_DIR / name
+            if not wav_path.exists():
+                return False
+            clip = read_wav_file(wav_path)
+        return audio_manager.play_pcm(*clip)
     except Exception as e:
-        print(f"Erreur lecture fallback : {e}")
+        print(f"Erreur lecture fallback : {e}")
+        return False
 
 # --- Robust WAV check for temp files (used in fallback too) ---
 def is_valid_wav_temp(filepath):
@@ -76,15 +117,48 @@ def is_valid_wav_temp(filepath):
         logger.warning(f"Vérif WAV échouée sur {filepath}: {e}")
         return False
 
+# --- Contrôle et conversion PCM en mémoire (aucun fichier temporaire) ---
+def is_valid_pcm(wav, sample_rate, min_duration=0.1):
+    """Contrôle qualité en mémoire : durée minimale, valeurs finies, signal non muet."""
+    try:
+        import numpy as np
+        wav = np.asarray(wav)
+        if wav.size < int(sample_rate * min_duration):
+            return False
+        return bool(np.isfinite(wav).all() and np.abs(wav).max() > 1e-4)
+    except Exception as e:
+        logger.warning(f"Vérif PCM échouée: {e}")
+        return False
+
+def postprocess(wav, sample_rate):
+    """Coupe les silences et normalise la sonie, sur place (retourne une vue du buffer)."""
+    if not config.dsp_enabled:
+        return wav
+    return dsp_process(
+        wav, sample_rate,
+        threshold_db=config.dsp_silence_db,
+        pad_ms=config.dsp_pad_ms,
+        target_dbfs=config.dsp_target_dbfs,
+    )
+
+def new_crossfader(sample_rate):
+    return ChunkCrossfader(sample_rate, config.dsp_crossfade_ms if config.dsp_enabled else 0)
+
+def pcm_to_wav_bytes(wav, sample_rate):
+    return write_wav(io.BytesIO(), wav, sample_rate).getvalue()
+
 # --- Fallback bip audio (sécurité ultime) ---
+def beep_pcm(duration=0.5, freq=440, samplerate=None):
+    """Bip généré directement au taux natif de la sortie (aucune conversion à la lecture)."""
+    import numpy as np
+    samplerate = samplerate or config.audio_sample_rate
+    t = np.linspace(0, duration, int(duration * samplerate), False)
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32), samplerate
+
 def fallback_audio(output_path, duration=0.5, freq=440):
     try:
-        import numpy as np
-        import scipy.io.wavfile
-        samplerate = 22050
-        t = np.linspace(0, duration, int(duration * samplerate), False)
-        beep = (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
-        scipy.io.wavfile.write(output_path, samplerate, beep)
+        beep, samplerate = beep_pcm(duration, freq)
+        write_wav(output_path, beep, samplerate)
         logger.warning(f"Fallback bip généré: {output_path}")
     except Exception as e:
         logger.error(f"Impossible de générer le fallback audio: {e}")
@@ -98,6 +172,54 @@ class TTSConfig:
         self.temp_dir = Path(tempfile.gettempdir()) / "william_tts"
         self.temp_dir.mkdir(exist_ok=True)
         self.speaker_wav_path = str(Path("data/voice_samples/male_sample.wav"))
+        # Synthèse pipelinée : phrase N+1 synthétisée pendant la lecture de la phrase N
+        self.pipeline_enabled = True
+        self.pipeline_lookahead = 2  # nb max de phrases prêtes en avance (file bornée)
+        self.sentence_max_chars = 240  # limite XTTS ~250 caractères par phrase en français
+        # Post-traitement NumPy (coupe des silences, sonie, fondus enchaînés entre phrases)
+        self.dsp_enabled = True
+        self.dsp_silence_db = -45.0  # seuil de silence relatif à la trame la plus forte
+        self.dsp_pad_ms = 40  # marge gardée autour de la parole
+        self.dsp_target_dbfs = -20.0
+        self.dsp_crossfade_ms = 15
+        # Streaming XTTS dans la phrase (inference_stream) : premier son après ~1 morceau au lieu d'une phrase
+        self.stream_enabled = False
+        self.stream_chunk_ms = 250  # taille visée des morceaux poussés vers la sortie (200-300 ms)
+        # Synthèse par lot (phrases de longueurs voisines dans un seul appel GPT), optionnelle :
+        # vérifier l'égalité lot / phrase seule (tts_bench.py batch) avant de l'activer
+        self.batch_size = 0  # 0/1 = désactivé
+        self.batch_max_length_ratio = 1.3  # écart de longueur max dans un lot (limite le remplissage)
+        # Poids packés (model_pack.py) : chargement à froid par projection mémoire, repli sur TTS() sinon
+        self.use_packed_models = True
+        # Cache audio des phrases (mémoire LRU + disque borné)
+        self.cache_enabled = True
+        self.cache_dir = Path("data/tts_cache")
+        self.cache_memory_mb = 32
+        self.cache_disk_mb = 256
+        self.cache_max_chars = 200  # seules les phrases courtes/récurrentes sont mises en cache
+        # Sortie audio persistante (format natif XTTS, alimentation par callback)
+        self.audio_sample_rate = 24000
+        self.audio_block_size = 512
+        self.audio_latency = "low"
+        # Inférence XTTS hors processus (0 = dans le processus courant)
+        self.worker_processes = 0
+        # Accélération CPU (machines sans GPU)
+        self.cpu_int8 = False           # quantification dynamique int8 des couches linéaires GPT/décodeur
+        self.cpu_threads = None         # threads intra-op (None = cœurs physiques estimés, 0 = défaut torch)
+        self.cpu_bf16 = False           # autocast bfloat16 si le CPU le supporte (AVX512-BF16/AMX)
+        self._load_overrides()
+    _FIXED_KEYS = {"cuda_available", "device", "temp_dir"}
+    def _load_overrides(self, path="config.json"):
+        """Surcharge les réglages ci-dessus par ceux de la section "tts" de config.json."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                section = json.load(f).get("tts", {})
+        except (OSError, ValueError):
+            return
+        for key, value in section.items():
+            if key in self._FIXED_KEYS or key.startswith("_") or not hasattr(self, key):
+                continue
+            setattr(self, key, Path(value) if isinstance(getattr(self, key), Path) else value)
     def _check_cuda(self):
         try:
             return torch.cuda.is_available() and torch.cuda.device_count() > 0
@@ -108,12 +230,39 @@ class TTSConfig:
 config = TTSConfig()
 
 # --- 2. Gestionnaire XTTS robuste ---
+def cpu_supports_bf16():
+    """Vrai si le CPU exécute le bfloat16 nativement (AVX512-BF16 / AMX)."""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        pass
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+        return "avx512_bf16" in flags or "amx_bf16" in flags
+    except OSError:
+        return False
+
+def _conv1d_to_linear(module):
+    """Remplace les Conv1D de transformers (GPT-2) par des nn.Linear équivalents, quantifiables en int8."""
+    for name, child in module.named_children():
+        if type(child).__name__ == "Conv1D" and hasattr(child, "nf"):
+            linear = torch.nn.Linear(child.weight.shape[0], child.nf, bias=child.bias is not None)
+            linear.weight.data = child.weight.data.t().contiguous()
+            if child.bias is not None:
+                linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+
 class XTTSManager:
     def __init__(self):
         self.model = None
         self.is_loading = False
         self.load_failed = False
         self.lock = threading.Lock()
+        self.pool = None
+        self._pool_lock = threading.Lock()
 
     def get_model(self, force_reload=False):
         if self.model is not None and not force_reload:
@@ -133,19 +282,33 @@ class XTTSManager:
         self.is_loading = True
         try:
             logger.info("Chargement du modèle XTTS...")
-            from TTS.api import TTS
-            model_name = "tts_models/multilingual/multi-dataset/xtts_v2"
-            self.model = TTS(model_name, gpu=config.cuda_available)
+            self.model = None
+            if config.use_packed_models:
+                try:
+                    from model_pack import load_xtts
+                    self.model = load_xtts(config.device)
+                except Exception as e:
+                    logger.warning(f"⚠️ Pack XTTS inutilisable ({e}), chargement standard")
+            if self.model is None:
+                from TTS.api import TTS
+                model_name = "tts_models/multilingual/multi-dataset/xtts_v2"
+                self.model = TTS(model_name, gpu=config.cuda_available)
+            if not config.cuda_available:
+                self._apply_cpu_mode(self.model)
             # Test rapide du modèle avec speaker_wav obligatoire
             test_speaker = config.speaker_wav_path if os.path.exists(config.speaker_wav_path) else None
             test_text = "Test"
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=True) as f:
-                self.model.tts_to_file(
-                    text=test_text,
-                    file_path=f.name,
-                    language="fr",
-                    speaker_wav=test_speaker
-                )
+            if test_speaker:
+                # Calcule (ou recharge du disque) les latents du speaker par défaut pendant le test
+                speaker_latents.synthesize(self.model, test_text, "fr", test_speaker, **self._precision_kwargs())
+            elif hasattr(self.model, "tts_to_file"):  # le modèle packé (Xtts brut) exige un speaker
+                with tempfile.NamedTemporaryFile(suffix=".wav", delete=True) as f:
+                    self.model.tts_to_file(
+                        text=test_text,
+                        file_path=f.name,
+                        language="fr",
+                        speaker_wav=test_speaker
+                    )
             logger.info(f"✅ XTTS chargé avec succès sur {config.device}")
             self.load_failed = False
             return self.model
@@ -163,26 +326,145 @@ class XTTSManager:
         finally:
             self.is_loading = False
 
+    def _apply_cpu_mode(self, model):
+        """Mode CPU : threads intra-op, quantification int8 dynamique, bf16 (selon config)."""
+        threads = config.cpu_threads
+        if threads is None:
+            threads = max(1, (os.cpu_count() or 2) // 2)  # cœurs physiques (hyperthreading)
+        if threads:
+            torch.set_num_threads(int(threads))  # 0 = réglage par défaut de torch
+        xtts = xtts_model_of(model)
+        if config.cpu_int8:
+            for name in ("gpt", "hifigan_decoder"):
+                module = getattr(xtts, name, None)
+                if module is None:
+                    continue
+                _conv1d_to_linear(module)
+                torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        if config.cpu_bf16 and not cpu_supports_bf16():
+            logger.warning("⚠️ bf16 demandé mais non supporté par ce CPU, synthèse en fp32")
+            config.cpu_bf16 = False
+        logger.info(
+            f"⚙️ Mode CPU XTTS: {threads} threads, int8={config.cpu_int8}, bf16={config.cpu_bf16}"
+        )
+
+    @staticmethod
+    def _precision_kwargs():
+        if config.cuda_available:
+            return {}
+        return {"bf16": config.cpu_bf16}
+
     def reload(self):
         logger.info("Reload manuel du modèle XTTS")
         return self.get_model(force_reload=True)
 
+    def reload_async(self):
+        """Recharge le modèle en arrière-plan, sans bloquer le thread appelant."""
+        if self.get_worker_pool() is not None:
+            return  # le superviseur du pool gère les processus défaillants
+        threading.Thread(target=self.reload, daemon=True).start()
+
     def preload_async(self):
+        if self.get_worker_pool() is not None:
+            return
         threading.Thread(target=self.get_model, daemon=True).start()
 
+    def get_worker_pool(self):
+        """Pool de processus TTS (config.worker_processes > 0), démarré au premier usage."""
+        if config.worker_processes <= 0 or multiprocessing.parent_process() is not None:
+            return None
+        with self._pool_lock:
+            if self.pool is None:
+                from tts_workers import TTSWorkerPool
+                self.pool = TTSWorkerPool(config.worker_processes).start()
+            return self.pool
+
+    def is_available(self):
+        pool = self.get_worker_pool()
+        if pool is not None:
+            return pool.has_workers()
+        return self.get_model() is not None
+
+    def get_speaker_latents(self, speaker_wav):
+        """Latents GPT + embedding speaker, calculés une fois par contenu de WAV et persistés à côté."""
+        model = self.get_model()
+        if model is None:
+            return None
+        return speaker_latents.get(model, speaker_wav)
+
+    def synthesize(self, text, language, speaker_wav, speed=1.0):
+        """Synthétise une phrase avec les latents en cache. Retourne (waveform, sample_rate).
+        Passe par le pool de processus s'il est activé, sinon synthèse dans ce processus."""
+        pool = self.get_worker_pool()
+        if pool is not None:
+            return pool.synthesize(text, language, speaker_wav, speed)
+        return self.synthesize_local(text, language, speaker_wav, speed)
+
+    def synthesize_local(self, text, language, speaker_wav, speed=1.0):
+        model = self.get_model()
+        if model is None:
+            raise RuntimeError("Modèle XTTS indisponible")
+        return speaker_latents.synthesize(model, text, language, speaker_wav, speed=speed, **self._precision_kwargs())
+
+    def synthesize_stream(self, text, language, speaker_wav, speed=1.0):
+        """Générateur (morceau, sample_rate) en streaming XTTS. Le pool de processus ne diffuse pas de
+        morceaux : dans ce cas la phrase entière est rendue puis renvoyée en un seul morceau."""
+        if self.get_worker_pool() is not None:
+            yield self.synthesize(text, language, speaker_wav, speed)
+            return
+        model = self.get_model()
+        if model is None:
+            raise RuntimeError("Modèle XTTS indisponible")
+        yield from speaker_latents.synthesize_stream(
+            model, text, language, speaker_wav, speed=speed, chunk_ms=config.stream_chunk_ms, **self._precision_kwargs()
+        )
+
+    def synthesize_batch(self, texts, language, speaker_wav, speed=1.0, batch_size=None):
+        """Synthétise plusieurs phrases. Retourne [(waveform, sample_rate), ...] dans l'ordre des textes.
+        Avec le pool, les phrases partent en parallèle dans les processus ; sinon, lots de longueurs voisines."""
+        pool = self.get_worker_pool()
+        if pool is not None:
+            futures = [pool.submit(text, language, speaker_wav, speed) for text in texts]
+            return [future.result(120) for future in futures]
+        batch_size = config.batch_size if batch_size is None else batch_size
+        if batch_size <= 1:
+            return [self.synthesize_local(text, language, speaker_wav, speed) for text in texts]
+        model = self.get_model()
+        if model is None:
+            raise RuntimeError("Modèle XTTS indisponible")
+        results = [None] * len(texts)
+        for group in group_by_length(texts, batch_size, config.batch_max_length_ratio):
+            chunk = [texts[i] for i in group]
+            try:
+                outputs = speaker_latents.synthesize_batch(
+                    model, chunk, language, speaker_wav, speed=speed, **self._precision_kwargs()
+                )
+            except Exception as e:
+                logger.warning(f"Synthèse par lot indisponible ({e}), repli phrase par phrase")
+                outputs = [self.synthesize_local(text, language, speaker_wav, speed) for text in chunk]
+            for i, output in zip(group, outputs):
+                results[i] = output
+        return results
+
 xtts_manager = XTTSManager()
 
 # --- 3. Gestionnaire audio robuste ---
 class AudioManager:
     def __init__(self):
         self.pygame_initialized = False
-        self.lock = threading.Lock()
+        self.lock = threading.RLock()
+        self.device = get_output_device(
+            sample_rate=config.audio_sample_rate,
+            block_size=config.audio_block_size,
+            latency=config.audio_latency,
+        )
 
     def _init_pygame(self):
         if not self.pygame_initialized:
             try:
                 import pygame
-                pygame.mixer.pre_init(frequency=22050, size=-16, channels=2, buffer=1024)
+                # Même format que la sortie principale (taux natif XTTS, mono) : pas de conversion par clip
+                pygame.mixer.pre_init(frequency=config.audio_sample_rate, size=-16, channels=1, buffer=1024)
                 pygame.mixer.init()
                 self.pygame_initialized = True
                 logger.info("✅ Pygame audio initialisé")
@@ -191,6 +473,12 @@ class AudioManager:
                 raise
 
     def play_audio_file(self, file_path):
+        try:
+            wav, sample_rate = read_wav_file(file_path)
+        except Exception:
+            wav = None  # format non WAV (mp3...) : lecture via pygame
+        if wav is not None and self.play_pcm(wav, sample_rate, fallback=False):
+            return
         with self.lock:
             try:
                 import pygame
@@ -216,105 +504,511 @@ class AudioManager:
                 except Exception:
                     pass
 
+    def play_audio_bytes(self, data):
+        """Lit un WAV déjà en mémoire (cache), sans repasser par le modèle."""
+        with self.lock:
+            try:
+                import pygame
+                self._init_pygame()
+                pygame.mixer.music.load(io.BytesIO(data))
+                pygame.mixer.music.play()
+                while pygame.mixer.music.get_busy():
+                    pygame.time.wait(50)
+                return
+            except Exception as e:
+                logger.error(f"❌ Erreur lecture audio en mémoire: {e}")
+            finally:
+                try:
+                    import pygame
+                    pygame.mixer.music.stop()
+                    pygame.mixer.music.unload()
+                except Exception:
+                    pass
+        # Fallback : passe par un fichier temporaire et le lecteur système
+        temp_file = config.temp_dir / f"tts_cache_{int(time.time() * 1000)}.wav"
+        temp_file.write_bytes(data)
+        self.play_audio_file(str(temp_file))
+        temp_file.unlink(missing_ok=True)
+
+    def play_pcm(self, wav, sample_rate, wait=True, fallback=True):
+        """Lit une waveform en mémoire sur le périphérique de sortie persistant.
+        wait=False : met le clip en file et retourne aussitôt l'Event de fin de lecture."""
+        try:
+            if not wait:
+                return self.device.write(wav, sample_rate, wait=False)
+            with self.lock:
+                self.device.write(wav, sample_rate, wait=True)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Erreur sortie audio: {e}")
+            self.device.close()
+        if not fallback:
+            return False
+        # Fallback pygame, toujours en mémoire, au taux du mixer
+        if int(sample_rate) != config.audio_sample_rate:
+            wav, sample_rate = resample(wav, sample_rate, config.audio_sample_rate), config.audio_sample_rate
+        self.play_audio_bytes(pcm_to_wav_bytes(wav, sample_rate))
+        return True
+
+    def stop(self):
+        """Coupe immédiatement la lecture en cours et vide la file audio."""
+        self.device.flush()
+        if self.pygame_initialized:
+            try:
+                import pygame
+                pygame.mixer.music.stop()
+            except Exception:
+                pass
+
+    def get_metrics(self):
+        """Underruns et latences du périphérique de sortie."""
+        return self.device.get_metrics()
+
 audio_manager = AudioManager()
 
+phrase_cache = PhraseAudioCache(
+    config.cache_dir,
+    memory_budget_bytes=config.cache_memory_mb * 1024 * 1024,
+    disk_budget_bytes=config.cache_disk_mb * 1024 * 1024,
+    max_text_chars=config.cache_max_chars,
+)
+
+# File de parole unique : un seul thread exécute les énoncés, par ordre de priorité
+filler_bank = FillerBank(VOICE_CACHE_DIR, SAMPLES, render_phrase)
+
+speech_scheduler = SpeechScheduler(
+    lambda text, token, **kwargs: _speak_robust(text, token=token, **kwargs),
+    stop_playback=audio_manager.stop,
+)
+
 # --- 4. Synthèse vocale robuste ---
-def speak(text, language="fr", speaker_wav=None, speed=1.0, async_mode=True):
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…;])\s+")
+_CLAUSE_END_RE = re.compile(r"(?<=[,:])\s+")
+
+def split_sentences(text, max_chars=None):
+    """Découpe le texte en phrases (et en propositions si une phrase est trop longue pour XTTS)."""
+    max_chars = max_chars or config.sentence_max_chars
+    sentences = []
+    for sentence in _SENTENCE_END_RE.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            sentences.append(sentence)
+            continue
+        # Phrase trop longue : regroupe les propositions jusqu'à la limite
+        current = ""
+        for clause in _CLAUSE_END_RE.split(sentence):
+            if current and len(current) + len(clause) + 1 > max_chars:
+                sentences.append(current)
+                current = clause
+            else:
+                current = f"{current} {clause}".strip()
+        if current:
+            sentences.append(current)
+    return sentences
+
+# Mesures par énoncé : délai avant le premier son (TTFA) et durée totale de rendu
+tts_timings = deque(maxlen=50)
+
+def _record_timings(engine, text, sentences, t_start, t_first_audio, t_render_done):
+    timings = {
+        "engine": engine,
+        "text": text[:60],
+        "sentences": sentences,
+        "time_to_first_audio": round(t_first_audio - t_start, 3) if t_first_audio else None,
+        "total_render": round(t_render_done - t_start, 3) if t_render_done else None,
+        "total": round(time.perf_counter() - t_start, 3),
+    }
+    tts_timings.append(timings)
+    logger.info(
+        f"⏱️ TTS {engine}: premier son {timings['time_to_first_audio']}s, "
+        f"rendu {timings['total_render']}s ({sentences} phrase(s))"
+    )
+    return timings
+
+def get_last_timings():
+    """Retourne les mesures du dernier énoncé (ou None)."""
+    return tts_timings[-1] if tts_timings else None
+
+def speak(text, language="fr", speaker_wav=None, speed=1.0, async_mode=True, export_path=None,
+          priority=NORMAL, merge_key=None):
+    """Met le texte dans la file de parole (un seul thread, quel que soit le nombre de messages).
+    priority : URGENT/NORMAL/BACKGROUND (ou "urgent"/"normal"/"background").
+    merge_key : remplace un message encore en attente portant la même clé."""
     if not text or not text.strip():
         return
-    target = _speak_robust
-    args = (text.strip(), language, speaker_wav, speed)
+    job = speech_scheduler.submit(
+        text.strip(), priority=priority, merge_key=merge_key,
+        language=language, speaker_wav=speaker_wav, speed=speed, export_path=export_path,
+    )
     if async_mode:
-        threading.Thread(target=target, args=args, daemon=True).start()
-    else:
-        return target(*args)
+        return job
+    return job.wait()
 
-def speak_sync(text, language="fr", speaker_wav=None, speed=1.0):
-    """Version synchrone, retourne True si succès, False sinon."""
-    return _speak_robust(text, language, speaker_wav, speed)
+def speak_sync(text, language="fr", speaker_wav=None, speed=1.0, export_path=None, priority=NORMAL):
+    """Version synchrone, retourne True si succès, False sinon.
+    export_path : écrit aussi l'audio synthétisé dans ce fichier WAV (export explicite)."""
+    return speak(text, language, speaker_wav, speed, async_mode=False, export_path=export_path, priority=priority)
 
-def _speak_robust(text, language, speaker_wav, speed):
-    # XTTS en priorité
-    temp_file = config.temp_dir / f"tts_{int(time.time() * 1000)}.wav"
-    ok = _try_xtts_synthesis(text, language, speaker_wav, speed, temp_file)
+def barge_in():
+    """À appeler dès que l'utilisateur commence à parler : coupe la voix et abandonne la file."""
+    speech_scheduler.barge_in()
+
+def cancel_speech():
+    speech_scheduler.cancel_all()
+
+def _cache_key(text, language, speaker_wav, speed, engine):
+    if not (config.cache_enabled and phrase_cache.accepts(text)):
+        return None
+    speaker_reference = (speaker_wav or config.speaker_wav_path) if engine == "xtts" else None
+    return phrase_cache.make_key(text, language, speaker_reference, speed, engine)
+
+def _play_cached(cache_key, export_path=None):
+    if cache_key is None:
+        return False
+    data = phrase_cache.get(cache_key)
+    if data is None:
+        return False
+    t_start = time.perf_counter()
+    wav, sample_rate = wav_bytes_to_pcm(data)
+    if export_path:
+        Path(export_path).write_bytes(data)
+    audio_manager.play_pcm(wav, sample_rate)
+    logger.info(f"⚡ Phrase servie depuis le cache audio ({time.perf_counter() - t_start:.2f}s de lecture)")
+    return True
+
+def get_filler_stats():
+    return filler_bank.get_stats()
+
+def get_cache_stats():
+    """Compteurs du cache audio (succès mémoire/disque, échecs, évictions)."""
+    return phrase_cache.get_stats()
+
+def _finish_utterance(wav, sample_rate, cache_key, export_path):
+    """Met en cache et/ou exporte l'audio complet d'un énoncé (jamais nécessaire pour la lecture)."""
+    if cache_key:
+        phrase_cache.put(cache_key, pcm_to_wav_bytes(wav, sample_rate))
+    if export_path:
+        write_wav(export_path, wav, sample_rate)
+        logger.info(f"💾 Audio exporté: {export_path}")
+
+def _play_filler(text, language, speaker_wav, speed, export_path=None):
+    """Phrase statique de la banque (voix par défaut uniquement) : lecture immédiate depuis la mémoire."""
+    if language != "fr" or speed != 1.0 or speaker_wav not in (None, config.speaker_wav_path):
+        return False
+    clip = filler_bank.get(text)
+    if clip is None:
+        return False
+    wav, sample_rate = clip
+    if export_path:
+        write_wav(export_path, wav, sample_rate)
+    audio_manager.play_pcm(wav, sample_rate)
+    logger.info(f"⚡ Phrase servie depuis la banque audio: {text[:40]}")
+    return True
+
+def _speak_robust(text, language, speaker_wav, speed, export_path=None, token=None):
+    if _play_filler(text, language, speaker_wav, speed, export_path):
+        return True
+    # Cache audio : une phrase déjà synthétisée par le moteur courant est lue directement
+    engine = "pyttsx3" if xtts_manager.load_failed else "xtts"
+    cache_key = _cache_key(text, language, speaker_wav, speed, engine)
+    if _play_cached(cache_key, export_path):
+        return True
+    # XTTS en priorité (rendu et lecture entièrement en mémoire)
+    xtts_key = cache_key if engine == "xtts" else None
+    ok = _try_xtts_synthesis(text, language, speaker_wav, speed, cache_key=xtts_key,
+                             export_path=export_path, token=token)
     if ok:
         return True
+    if _cancelled(token):
+        return False
     # Fallback pyttsx3 si XTTS échoue
     logger.info("Fallback vers pyttsx3...")
-    ok2 = _speak_pyttsx3_fallback(text, speed, temp_file)
+    temp_file = config.temp_dir / f"tts_{int(time.time() * 1000)}.wav"
+    ok2 = _speak_pyttsx3_fallback(text, speed, temp_file,
+                                  cache_key=_cache_key(text, language, speaker_wav, speed, "pyttsx3"),
+                                  export_path=export_path, token=token)
     if ok2:
         return True
+    if _cancelled(token):
+        return False
     # Fallback bip universel
     logger.warning("Fallback ultime: bip audio")
-    fallback_audio(str(temp_file))
-    audio_manager.play_audio_file(str(temp_file))
+    beep, sample_rate = beep_pcm()
+    audio_manager.play_pcm(beep, sample_rate)
     return False
 
-def _try_xtts_synthesis(text, language, speaker_wav, speed, temp_file):
+def _cancelled(token):
+    return token is not None and token.cancelled
+
+def _try_xtts_synthesis(text, language, speaker_wav, speed, cache_key=None, export_path=None, token=None):
     try:
-        model = xtts_manager.get_model()
-        if model is None:
+        if not xtts_manager.is_available():
             return False
         speaker_reference = speaker_wav or config.speaker_wav_path
         if not (speaker_reference and os.path.exists(speaker_reference)):
-            logger.error(f"Aucun speaker_wav valide pour XTTS : {speaker_reference}")
+            logger.error(f"Aucun speaker_wav valide pour XTTS : {speaker_reference}")
             return False
-        model.tts_to_file(
-            text=text,
-            file_path=str(temp_file),
-            speaker_wav=speaker_reference,
-            language=language,
-            split_sentences=True,
-        )
-        if not temp_file.exists() or temp_file.stat().st_size == 0 or not is_valid_wav_temp(str(temp_file)):
-            logger.error("Fichier audio XTTS vide, corrompu ou non créé")
+        if config.pipeline_enabled:
+            return _speak_xtts_pipelined(text, language, speaker_reference, speed, cache_key, export_path, token)
+        t_start = time.perf_counter()
+        import numpy as np
+        sample_rate = 24000
+        waves = []
+        fader = None
+        sentences = split_sentences(text)
+        for sentence in sentences:
+            if _cancelled(token):
+                return False
+            wav, sample_rate = xtts_manager.synthesize(sentence, language, speaker_reference, speed)
+            fader = fader or new_crossfader(sample_rate)
+            waves.extend(fader.push(postprocess(wav, sample_rate)))
+        tail = fader.flush() if fader is not None else None
+        if tail is not None:
+            waves.append(tail)
+        wav = np.concatenate(waves) if waves else np.zeros(0, np.float32)
+        if not is_valid_pcm(wav, sample_rate):
+            logger.error("Audio XTTS vide ou corrompu")
             return False
-        audio_manager.play_audio_file(str(temp_file))
-        temp_file.unlink(missing_ok=True)
+        t_render_done = time.perf_counter()
+        audio_manager.play_pcm(wav, sample_rate)
+        _finish_utterance(wav, sample_rate, cache_key, export_path)
+        _record_timings("xtts", text, len(sentences), t_start, t_render_done, t_render_done)
         logger.info("✅ Synthèse XTTS réussie")
         return True
     except Exception as e:
         logger.error(f"❌ Synthèse XTTS: {e}")
+        if _cancelled(token):
+            return False
         try:
-            # Force reload auto du modèle XTTS sur erreur, puis retente (une seule fois)
-            xtts_manager.reload()
+            # Reload du modèle XTTS en arrière-plan : l'appelant passe tout de suite au fallback
+            xtts_manager.reload_async()
         except Exception as reload_e:
             logger.error(f"❌ Reload XTTS échoué: {reload_e}")
         return False
 
-def _speak_pyttsx3_fallback(text, speed, temp_file):
-    try:
+def _speak_xtts_pipelined(text, language, speaker_reference, speed, cache_key=None, export_path=None, token=None):
+    """Synthétise la phrase N+1 pendant la lecture de la phrase N (file d'avance bornée).
+    En mode streaming, les morceaux de chaque phrase sont joués dès leur décodage."""
+    sentences = split_sentences(text)
+    if not sentences:
+        return False
+    streaming = config.stream_enabled and xtts_manager.get_worker_pool() is None
+    # En streaming la file contient des morceaux de ~250 ms : on garde la même avance en durée
+    lookahead = max(1, config.pipeline_lookahead) * (8 if streaming else 1)
+    ready = queue.Queue(maxsize=lookahead)
+    stop = threading.Event()
+    errors = []
+    render_done = []
+    t_start = time.perf_counter()
+
+    def put(item):
+        # Bloque tant que la file d'avance est pleine, sauf si le lecteur a abandonné
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def stream_producer():
+        try:
+            for sentence in sentences:
+                for wav, sample_rate in xtts_manager.synthesize_stream(sentence, language, speaker_reference, speed):
+                    if stop.is_set() or _cancelled(token):
+                        return
+                    # Morceaux déjà raccordés par XTTS (recouvrement interne) : pas de coupe ni de fondu
+                    if not put((wav, sample_rate, False)):
+                        return
+            render_done.append(time.perf_counter())
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put(None)
+
+    def producer():
+        try:
+            # Première phrase seule (délai avant le premier son), les suivantes par lots pendant sa lecture
+            step = max(1, config.batch_size)
+            batches = [sentences[:1]] + [sentences[i:i + step] for i in range(1, len(sentences), step)]
+            index = 0
+            for batch in batches:
+                if stop.is_set() or _cancelled(token):
+                    return
+                if len(batch) == 1:
+                    outputs = [xtts_manager.synthesize(batch[0], language, speaker_reference, speed)]
+                else:
+                    outputs = xtts_manager.synthesize_batch(batch, language, speaker_reference, speed)
+                for wav, sample_rate in outputs:
+                    index += 1
+                    if not is_valid_pcm(wav, sample_rate):
+                        raise RuntimeError(f"Audio XTTS invalide pour la phrase {index}")
+                    # Coupe/normalisation ici, hors du chemin de lecture
+                    if not put((postprocess(wav, sample_rate), sample_rate, True)):
+                        return
+            render_done.append(time.perf_counter())
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put(None)
+
+    threading.Thread(target=stream_producer if streaming else producer, daemon=True).start()
+    t_first_audio = None
+    waves = []
+    sample_rate = None
+    playing = None
+    fader = None
+    with audio_manager.lock:
+        audio_manager.device.begin_utterance()
+        try:
+            while True:
+                item = ready.get()
+                if item is None or _cancelled(token):
+                    break
+                wav, sample_rate, smooth = item
+                if t_first_audio is None:
+                    t_first_audio = time.perf_counter()
+                # Fondu enchaîné : la fin de la phrase précédente est mélangée au début de celle-ci
+                fader = fader or new_crossfader(sample_rate)
+                # La phrase suivante est mise en file avant la fin de la précédente : aucun trou
+                queued = None
+                for segment in (fader.push(wav) if smooth else [wav]):
+                    if len(segment):
+                        queued = audio_manager.play_pcm(segment, sample_rate, wait=False)
+                        waves.append(segment)
+                if playing is not None:
+                    playing.wait()
+                if _cancelled(token):
+                    break
+                playing = queued if queued is not True else None
+            tail = fader.flush() if fader is not None else None
+            if tail is not None and len(tail) and not _cancelled(token):
+                queued = audio_manager.play_pcm(tail, sample_rate, wait=False)
+                playing = queued if queued is not True else playing
+                waves.append(tail)
+        finally:
+            # Tout est en file : la fin du dernier clip n'est pas un trou
+            audio_manager.device.end_utterance()
+            stop.set()
+        if playing is not None and not _cancelled(token):
+            playing.wait()
+    if _cancelled(token):
+        logger.info(f"🔇 Synthèse XTTS pipelinée annulée après {len(waves)} phrase(s)")
+        return False
+    if errors:
+        logger.error(f"❌ Synthèse XTTS pipelinée interrompue après {len(waves)} phrase(s): {errors[0]}")
+        if not waves:
+            raise errors[0]
+    elif cache_key or export_path:
+        import numpy as np
+        _finish_utterance(np.concatenate(waves), sample_rate, cache_key, export_path)
+    engine = "xtts-stream" if streaming else "xtts"
+    _record_timings(engine, text, len(sentences), t_start, t_first_audio, render_done[0] if render_done else None)
+    logger.info(f"✅ Synthèse XTTS {'en streaming' if streaming else 'pipelinée'} réussie")
+    return True
+
+class Pyttsx3Worker:
+    """Thread unique qui possède le moteur pyttsx3 pour toute la vie du processus.
+    CoInitialize, init() et choix de la voix française ne sont faits qu'une fois ; les jobs arrivent par une file."""
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.engine = None
+        self.voice_id = None
+        self._rate = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self.ready = threading.Event()
+        self.init_error = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self.ready.clear()
+                self._thread = threading.Thread(target=self._run, name="pyttsx3-worker", daemon=True)
+                self._thread.start()
+        return self
+
+    def _init_engine(self):
         if platform.system() == "Windows":
             import pythoncom
-            pythoncom.CoInitialize()
+            pythoncom.CoInitialize()  # une seule fois, dans le thread propriétaire du moteur
         import pyttsx3
+        t0 = time.perf_counter()
         engine = pyttsx3.init()
-        voices = engine.getProperty('voices')
-        french_voice = None
-        for voice in voices:
+        for voice in engine.getProperty('voices'):
             voice_name = voice.name.lower()
             voice_id = voice.id.lower()
             if any(keyword in voice_name for keyword in ['hortense', 'marie', 'claire']):
-                french_voice = voice.id
+                self.voice_id = voice.id
                 break
             elif any(keyword in voice_id for keyword in ['fr', 'french', 'france']):
-                french_voice = voice.id
+                self.voice_id = voice.id
                 break
-        if french_voice:
-            engine.setProperty('voice', french_voice)
-            logger.info(f"✅ Voix française sélectionnée: {french_voice}")
+        if self.voice_id:
+            engine.setProperty('voice', self.voice_id)
+            logger.info(f"✅ Voix française sélectionnée: {self.voice_id}")
         else:
             logger.warning("⚠️ Aucune voix française trouvée, utilisation de la voix par défaut")
-        engine.setProperty('rate', int(180 * speed))
         engine.setProperty('volume', 0.9)
-        # Tente d'enregistrer dans temp_file et lire
-        engine.save_to_file(text, str(temp_file))
-        engine.runAndWait()
+        self.engine = engine
+        logger.info(f"✅ Moteur pyttsx3 prêt en {time.perf_counter() - t0:.2f}s (thread dédié)")
+
+    def _run(self):
+        try:
+            self._init_engine()
+        except Exception as e:
+            self.init_error = e
+            logger.error(f"❌ Initialisation pyttsx3 impossible: {e}")
+        finally:
+            self.ready.set()
+        while True:
+            text, speed, output_path, future = self.jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            if self.engine is None:
+                future.set_exception(RuntimeError(f"pyttsx3 indisponible: {self.init_error}"))
+                continue
+            try:
+                rate = int(180 * speed)
+                if rate != self._rate:
+                    self.engine.setProperty('rate', rate)
+                    self._rate = rate
+                # pyttsx3 ne sait rendre que vers un fichier : l'appelant le relit aussitôt en mémoire
+                self.engine.save_to_file(text, str(output_path))
+                self.engine.runAndWait()
+                future.set_result(output_path)
+            except Exception as e:
+                future.set_exception(e)
+
+    def submit(self, text, speed, output_path):
+        """Met un rendu en file. Retourne un Future résolu avec le chemin du WAV produit."""
+        from concurrent.futures import Future
+        self.start()
+        future = Future()
+        self.jobs.put((text, speed, output_path, future))
+        return future
+
+    def render(self, text, speed, output_path, timeout=60):
+        return self.submit(text, speed, output_path).result(timeout)
+
+pyttsx3_worker = Pyttsx3Worker()
+
+def _speak_pyttsx3_fallback(text, speed, temp_file, cache_key=None, export_path=None, token=None):
+    try:
+        pyttsx3_worker.render(text, speed, temp_file)
         if not temp_file.exists() or temp_file.stat().st_size == 0 or not is_valid_wav_temp(str(temp_file)):
             logger.error("Fichier audio pyttsx3 vide ou corrompu")
             return False
-        audio_manager.play_audio_file(str(temp_file))
+        wav, sample_rate = wav_bytes_to_pcm(temp_file.read_bytes())
         temp_file.unlink(missing_ok=True)
+        wav = postprocess(wav, sample_rate)
+        if _cancelled(token):
+            return False
+        audio_manager.play_pcm(wav, sample_rate)
+        _finish_utterance(wav, sample_rate, cache_key, export_path)
         logger.info("✅ Synthèse pyttsx3 réussie")
         return True
     except Exception as e:
@@ -333,6 +1027,7 @@ def set_speaker_reference(wav_file_path):
 def preload_tts():
     logger.info("🚀 Préchargement du système TTS...")
     xtts_manager.preload_async()
+    pyttsx3_worker.start()  # moteur de secours prêt avant le premier besoin
     ensure_voice_cache()
 
 def get_available_voices():
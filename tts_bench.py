@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Benchmarks TTS pour WillIAM
+- engines : corpus français fixe (acquiescements, réponses moyennes, longs paragraphes) passé dans
+  chaque moteur (xtts, xtts-stream, coqui, pyttsx3, edge simulé). Mesures : chargement à froid / à chaud,
+  délai avant le premier son (TTFA), facteur temps réel (RTF), RSS max, durée audio.
+  Résultats en JSON, comparables d'un run à l'autre (--compare) pour détecter les régressions.
+- batch : débit (phrases/s) de la synthèse XTTS par lots contre la synthèse phrase par phrase.
+- cpu : compare les modes d'accélération CPU de XTTS (fp32, threads, int8, bf16).
+Chaque moteur / variante tourne dans un processus neuf pour isoler le pic de mémoire (RSS).
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+CORPUS = {
+    "ack": [
+        "Oui ?",
+        "Oui, je t'écoute !",
+        "Très bien, je retourne en veille.",
+    ],
+    "medium": [
+        "Il est actuellement quinze heures trente. La météo annonce un ciel dégagé pour le reste de la journée.",
+        "Je vais chercher sur le web, un instant. Voici ce que j'ai trouvé sur ce sujet.",
+    ],
+    "long": [
+        "Pour installer ce module, ouvrez un terminal et placez-vous dans le dossier du projet. "
+        "Lancez ensuite la commande d'installation des dépendances, puis vérifiez que le microphone "
+        "est bien détecté. Si la synthèse vocale reste silencieuse, relancez le diagnostic audio : "
+        "il vérifie la carte son, les pilotes et les modèles téléchargés. En dernier recours, "
+        "supprimez le cache des modèles pour forcer un nouveau téléchargement.",
+    ],
+}
+
+# Mêmes modèles que TTSManager (modules/tts_config.py)
+XTTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+COQUI_MODELS = ["tts_models/fr/mai/tacotron2-DDC", "tts_models/fr/css10/vits"]
+
+CPU_CORPUS = [
+    "Oui, je t'écoute.",
+    "Il est actuellement quinze heures et la météo annonce un ciel dégagé pour le reste de la journée.",
+    "Pour installer ce module, ouvrez un terminal, placez-vous dans le dossier du projet puis lancez la commande d'installation.",
+]
+
+# Variantes cumulatives, de la référence fp32 au mode le plus optimisé
+CPU_VARIANTS = {
+    "fp32": {"cpu_threads": 0, "cpu_int8": False, "cpu_bf16": False},
+    "threads": {"cpu_threads": None, "cpu_int8": False, "cpu_bf16": False},
+    "int8": {"cpu_threads": None, "cpu_int8": True, "cpu_bf16": False},
+    "bf16": {"cpu_threads": None, "cpu_int8": False, "cpu_bf16": True},
+}
+
+# --- Moteurs mesurés ---
+class XTTSEngine:
+    name = "xtts"
+
+    def load(self):
+        import tts
+        self.tts = tts
+        if tts.xtts_manager.get_model(force_reload=True) is None:
+            raise RuntimeError("modèle XTTS indisponible")
+
+    def unload(self):
+        self.tts.xtts_manager.model = None
+
+    def sentences(self, text):
+        return self.tts.split_sentences(text)
+
+    def synthesize(self, text):
+        return self.tts.xtts_manager.synthesize_local(text, "fr", self.tts.config.speaker_wav_path)
+
+class XTTSStreamEngine(XTTSEngine):
+    """XTTS en streaming dans la phrase (inference_stream) : TTFA = premier morceau décodé."""
+    name = "xtts-stream"
+
+    def chunks(self, text):
+        yield from self.tts.xtts_manager.synthesize_stream(text, "fr", self.tts.config.speaker_wav_path)
+
+class CoquiEngine:
+    name = "coqui"
+
+    def load(self):
+        from TTS.api import TTS
+        errors = []
+        for model in COQUI_MODELS:
+            try:
+                self.api = TTS(model)
+                return
+            except Exception as e:
+                errors.append(f"{model}: {e}")
+        raise RuntimeError("; ".join(errors))
+
+    def unload(self):
+        self.api = None
+
+    def sentences(self, text):
+        return [text]
+
+    def synthesize(self, text):
+        import numpy as np
+        wav = np.asarray(self.api.tts(text=text), dtype=np.float32)
+        return wav, self.api.synthesizer.output_sample_rate
+
+class Pyttsx3Engine:
+    name = "pyttsx3"
+
+    def load(self):
+        import pyttsx3
+        self.engine = pyttsx3.init()
+
+    def unload(self):
+        self.engine = None
+
+    def sentences(self, text):
+        return [text]
+
+    def synthesize(self, text):
+        from audio_output import read_wav_file
+        path = os.path.join(tempfile.gettempdir(), f"bench_pyttsx3_{os.getpid()}.wav")
+        self.engine.save_to_file(text, path)
+        self.engine.runAndWait()
+        try:
+            return read_wav_file(path)
+        finally:
+            os.remove(path)
+
+class EdgeStandInEngine:
+    """Remplaçant local d'edge-tts : latence réseau simulée puis audio livré plus vite que le temps réel."""
+    name = "edge"
+    first_chunk_latency = 0.35
+    realtime_speedup = 8.0
+    chars_per_second = 14.0
+    sample_rate = 24000
+
+    def load(self):
+        time.sleep(0.01)
+
+    def unload(self):
+        pass
+
+    def sentences(self, text):
+        return [text]
+
+    def synthesize(self, text):
+        import numpy as np
+        duration = max(0.3, len(text) / self.chars_per_second)
+        time.sleep(self.first_chunk_latency + duration / self.realtime_speedup)
+        t = np.arange(int(duration * self.sample_rate)) / self.sample_rate
+        return (0.2 * np.sin(2 * np.pi * 180 * t)).astype(np.float32), self.sample_rate
+
+ENGINES = {e.name: e for e in (XTTSEngine, XTTSStreamEngine, CoquiEngine, Pyttsx3Engine, EdgeStandInEngine)}
+
+def _run_engine(name):
+    """Exécuté dans un sous-processus : chargement froid/chaud puis corpus complet."""
+    engine = ENGINES[name]()
+    t0 = time.perf_counter()
+    try:
+        engine.load()
+    except Exception as e:
+        return {"engine": name, "error": f"chargement impossible: {e}"}
+    cold_load = time.perf_counter() - t0
+    engine.unload()
+    gc.collect()
+    t0 = time.perf_counter()
+    engine.load()
+    warm_load = time.perf_counter() - t0
+    items = []
+    for category, texts in CORPUS.items():
+        for text in texts:
+            # Synthèse phrase par phrase, comme le mode pipeliné : TTFA = coût de la première phrase
+            t0 = time.perf_counter()
+            ttfa = None
+            audio_time = 0.0
+            for sentence in engine.sentences(text):
+                chunks = engine.chunks(sentence) if hasattr(engine, "chunks") else [engine.synthesize(sentence)]
+                for wav, sample_rate in chunks:
+                    if ttfa is None:
+                        ttfa = time.perf_counter() - t0
+                    audio_time += len(wav) / sample_rate
+            synth_time = time.perf_counter() - t0
+            items.append({
+                "category": category,
+                "chars": len(text),
+                "ttfa": round(ttfa, 3),
+                "synth_time": round(synth_time, 3),
+                "audio_duration": round(audio_time, 3),
+                "rtf": round(synth_time / audio_time, 3) if audio_time else None,
+            })
+    return {
+        "engine": name,
+        "cold_load": round(cold_load, 3),
+        "warm_load": round(warm_load, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "items": items,
+        "summary": _summarize(items),
+    }
+
+def _summarize(items):
+    summary = {}
+    for category in CORPUS:
+        rows = [i for i in items if i["category"] == category and i["rtf"] is not None]
+        if rows:
+            summary[category] = {
+                "ttfa": round(sum(r["ttfa"] for r in rows) / len(rows), 3),
+                "rtf": round(sum(r["rtf"] for r in rows) / len(rows), 3),
+                "audio_duration": round(sum(r["audio_duration"] for r in rows), 3),
+            }
+    return summary
+
+def _run_in_subprocess(command, name):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), command, name],
+        capture_output=True, text=True,
+    )
+    lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+    if lines:
+        return json.loads(lines[-1])
+    return {"error": proc.stderr.strip()[-300:] or f"code retour {proc.returncode}"}
+
+def machine_info():
+    info = {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import torch
+        info["torch"] = torch.__version__
+        info["cuda"] = torch.cuda.is_available()
+    except Exception:
+        info["cuda"] = False
+    return info
+
+def bench_engines(engines=None, output=None):
+    results = []
+    for name in engines or ENGINES:
+        print(f"⏱️ Moteur: {name}...")
+        result = _run_in_subprocess("_engine", name)
+        result.setdefault("engine", name)
+        results.append(result)
+    print(f"\n{'moteur':<10}{'froid':>8}{'chaud':>8}{'RSS Mo':>9}  " + "".join(f"{c + ' TTFA/RTF':>20}" for c in CORPUS))
+    for r in results:
+        if "summary" not in r:
+            print(f"{r['engine']:<10}  {r.get('error')}")
+            continue
+        cols = "".join(
+            f"{(str(r['summary'][c]['ttfa']) + 's / ' + str(r['summary'][c]['rtf'])) if c in r['summary'] else '-':>20}"
+            for c in CORPUS
+        )
+        print(f"{r['engine']:<10}{r['cold_load']:>7}s{r['warm_load']:>7}s{str(r['peak_rss_mb']):>9}  {cols}")
+    report = {"benchmark": "engines", "timestamp": time.time(), "machine": machine_info(), "results": results}
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Résultats: {output}")
+    return report
+
+def compare_reports(baseline_path, report, tolerance=0.15):
+    """Compare TTFA, RTF et chargements avec un run précédent. Retourne la liste des régressions."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["engine"]: r for r in json.load(f).get("results", []) if "summary" in r}
+    regressions = []
+    for r in report["results"]:
+        old = baseline.get(r.get("engine"))
+        if old is None or "summary" not in r:
+            continue
+        checks = [("cold_load", old.get("cold_load"), r.get("cold_load")),
+                  ("warm_load", old.get("warm_load"), r.get("warm_load"))]
+        for category, new in r["summary"].items():
+            prev = old["summary"].get(category, {})
+            checks.append((f"{category}.ttfa", prev.get("ttfa"), new["ttfa"]))
+            checks.append((f"{category}.rtf", prev.get("rtf"), new["rtf"]))
+        for metric, before, after in checks:
+            if before and after and after > before * (1 + tolerance):
+                regressions.append(f"{r['engine']} {metric}: {before} -> {after} (+{(after / before - 1) * 100:.0f}%)")
+    if regressions:
+        print("❌ Régressions détectées :")
+        for line in regressions:
+            print(f"   - {line}")
+    else:
+        print(f"✅ Aucune régression (> {tolerance * 100:.0f}%) par rapport à {baseline_path}")
+    return regressions
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus courant, en Mo."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux : Ko ; macOS : octets
+        return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+    except ImportError:
+        try:
+            import psutil
+            info = psutil.Process().memory_info()
+            return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+        except Exception:
+            return None
+
+def _run_cpu_variant(name):
+    """Exécuté dans un sous-processus : charge XTTS avec la variante demandée et mesure le RTF."""
+    import tts
+    for key, value in CPU_VARIANTS[name].items():
+        setattr(tts.config, key, value)
+    tts.config.cuda_available = False
+    tts.config.device = "cpu"
+    t0 = time.perf_counter()
+    if tts.xtts_manager.get_model() is None:
+        return {"variant": name, "error": "modèle XTTS indisponible"}
+    load_time = time.perf_counter() - t0
+    if name == "bf16" and not tts.config.cpu_bf16:
+        return {"variant": name, "skipped": "bf16 non supporté par ce CPU"}
+    speaker = tts.config.speaker_wav_path
+    synth_time = 0.0
+    audio_time = 0.0
+    for text in CPU_CORPUS:
+        t0 = time.perf_counter()
+        wav, sample_rate = tts.xtts_manager.synthesize_local(text, "fr", speaker)
+        synth_time += time.perf_counter() - t0
+        audio_time += len(wav) / sample_rate
+    return {
+        "variant": name,
+        "load_time": round(load_time, 2),
+        "synth_time": round(synth_time, 2),
+        "audio_time": round(audio_time, 2),
+        "rtf": round(synth_time / audio_time, 3) if audio_time else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def bench_cpu(variants=None, output=None):
+    results = []
+    for name in variants or CPU_VARIANTS:
+        print(f"⏱️ Variante CPU: {name}...")
+        result = _run_in_subprocess("_cpu_variant", name)
+        result.setdefault("variant", name)
+        results.append(result)
+    baseline = next((r for r in results if r.get("variant") == "fp32" and r.get("rtf")), None)
+    print(f"\n{'variante':<16}{'RTF':>8}{'vs fp32':>10}{'RSS max (Mo)':>15}{'chargement':>12}")
+    for r in results:
+        if not r.get("rtf"):
+            print(f"{r['variant']:<16}  {r.get('skipped') or r.get('error')}")
+            continue
+        speedup = f"x{baseline['rtf'] / r['rtf']:.2f}" if baseline else "-"
+        print(f"{r['variant']:<16}{r['rtf']:>8}{speedup:>10}{str(r['peak_rss_mb']):>15}{r['load_time']:>11}s")
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "cpu", "timestamp": time.time(), "results": results}, f, indent=2, ensure_ascii=False)
+        print(f"💾 Résultats: {output}")
+    return results
+
+def bench_batch(batch_sizes=(2, 4), output=None):
+    """Débit XTTS : mêmes phrases en séquentiel puis par lots (un seul processus, modèle chargé une fois)."""
+    import tts
+    if tts.xtts_manager.get_model() is None:
+        print("❌ Modèle XTTS indisponible")
+        return None
+    speaker = tts.config.speaker_wav_path
+    chunks = [s for texts in CORPUS.values() for text in texts for s in tts.split_sentences(text)]
+    tts.xtts_manager.synthesize_local(chunks[0], "fr", speaker)  # chauffe (latents, noyaux)
+    from speaker_latents import group_by_length, speaker_latents
+    model = tts.xtts_manager.get_model()
+    group = max(group_by_length(chunks, max(batch_sizes), tts.config.batch_max_length_ratio), key=len)
+    check = speaker_latents.check_batch(model, [chunks[i] for i in group], "fr", speaker)
+    for row in check["rows"]:
+        status = "✅" if row["equal"] else "❌"
+        print(f"{status} lot {row['batched']} codes / seule {row['single']} codes : {row['text'][:50]}")
+    if not check["match"]:
+        print("⚠️ Le lot ne reproduit pas la synthèse phrase par phrase : laisser batch_size à 0")
+    results = []
+    for batch_size in (1,) + tuple(batch_sizes):
+        t0 = time.perf_counter()
+        outputs = tts.xtts_manager.synthesize_batch(chunks, "fr", speaker, batch_size=batch_size)
+        elapsed = time.perf_counter() - t0
+        audio_time = sum(len(wav) / sample_rate for wav, sample_rate in outputs)
+        results.append({
+            "batch_size": batch_size,
+            "chunks": len(chunks),
+            "time": round(elapsed, 2),
+            "chunks_per_s": round(len(chunks) / elapsed, 3),
+            "rtf": round(elapsed / audio_time, 3) if audio_time else None,
+        })
+    sequential = results[0]["chunks_per_s"]
+    print(f"\n{'lot':<8}{'phrases/s':>12}{'vs séquentiel':>16}{'RTF':>8}")
+    for r in results:
+        label = "séq." if r["batch_size"] == 1 else str(r["batch_size"])
+        print(f"{label:<8}{r['chunks_per_s']:>12}{'x%.2f' % (r['chunks_per_s'] / sequential):>16}{str(r['rtf']):>8}")
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "batch", "timestamp": time.time(), "machine": machine_info(),
+                       "equivalence": check, "results": results},
+                      f, indent=2, ensure_ascii=False)
+        print(f"💾 Résultats: {output}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks TTS de WillIAM")
+    sub = parser.add_subparsers(dest="command", required=True)
+    engines = sub.add_parser("engines", help="Corpus français sur chaque moteur (TTFA, RTF, chargement, RSS)")
+    engines.add_argument("--engines", nargs="+", choices=list(ENGINES), default=None)
+    engines.add_argument("--output", default="tts_bench_results.json", help="Fichier JSON de résultats")
+    engines.add_argument("--compare", default=None, help="JSON d'un run précédent à comparer")
+    engines.add_argument("--tolerance", type=float, default=0.15, help="Dégradation tolérée (0.15 = 15%%)")
+    engine = sub.add_parser("_engine")  # usage interne (sous-processus)
+    engine.add_argument("name", choices=list(ENGINES))
+    batch = sub.add_parser("batch", help="Débit XTTS par lots contre séquentiel (phrases/s)")
+    batch.add_argument("--sizes", nargs="+", type=int, default=[2, 4], help="Tailles de lot à mesurer")
+    batch.add_argument("--output", default=None, help="Fichier JSON de résultats")
+    cpu = sub.add_parser("cpu", help="Compare les modes d'accélération CPU de XTTS")
+    cpu.add_argument("--variants", nargs="+", choices=list(CPU_VARIANTS), default=None)
+    cpu.add_argument("--output", default=None, help="Fichier JSON de résultats")
+    variant = sub.add_parser("_cpu_variant")  # usage interne (sous-processus)
+    variant.add_argument("name", choices=list(CPU_VARIANTS))
+    args = parser.parse_args()
+    if args.command == "engines":
+        report = bench_engines(args.engines, args.output)
+        if args.compare and compare_reports(args.compare, report, args.tolerance):
+            sys.exit(1)
+    elif args.command == "_engine":
+        print(json.dumps(_run_engine(args.name)))
+    elif args.command == "batch":
+        bench_batch(args.sizes, args.output)
+    elif args.command == "cpu":
+        bench_cpu(args.variants, args.output)
+    elif args.command == "_cpu_variant":
+        print(json.dumps(_run_cpu_variant(args.name)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Cache audio des phrases pour WillIAM
+- Clé de contenu : texte normalisé + langue + hash du speaker_wav + vitesse + moteur.
+- Niveau mémoire (LRU borné en octets) puis niveau disque (budget de taille, éviction LRU).
+- Un succès de cache se lit immédiatement, sans aucun appel au modèle.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+import unicodedata
+import wave
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+def normalize_cache_text(text):
+    """Normalise le texte pour la clé de cache (unicode, casse, espaces)."""
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(text.lower().split())
+
+def join_wav_bytes(chunks):
+    """Concatène plusieurs WAV (mêmes paramètres) en un seul WAV en mémoire."""
+    out = io.BytesIO()
+    params = None
+    with wave.open(out, "wb") as dst:
+        for chunk in chunks:
+            with wave.open(io.BytesIO(chunk), "rb") as src:
+                if params is None:
+                    params = src.getparams()
+                    dst.setparams(params)
+                dst.writeframes(src.readframes(src.getnframes()))
+    return out.getvalue()
+
+class PhraseAudioCache:
+    def __init__(self, cache_dir, memory_budget_bytes=32 * 1024 * 1024,
+                 disk_budget_bytes=256 * 1024 * 1024, max_text_chars=200):
+        self.cache_dir = Path(cache_dir)
+        self.memory_budget = memory_budget_bytes
+        self.disk_budget = disk_budget_bytes
+        self.max_text_chars = max_text_chars
+        self.lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None  # calculé paresseusement au premier accès disque
+        self._speaker_hashes = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    # --- Clés ---
+    def _speaker_hash(self, speaker_wav):
+        if not speaker_wav or not os.path.exists(speaker_wav):
+            return "none"
+        st = os.stat(speaker_wav)
+        stamp = (os.path.abspath(speaker_wav), st.st_mtime_ns, st.st_size)
+        cached = self._speaker_hashes.get(stamp)
+        if cached is None:
+            h = hashlib.sha256()
+            with open(speaker_wav, "rb") as f:
+                for block in iter(lambda: f.read(1 << 16), b""):
+                    h.update(block)
+            cached = self._speaker_hashes[stamp] = h.hexdigest()
+        return cached
+
+    def make_key(self, text, language, speaker_wav, speed, engine):
+        raw = "|".join([
+            normalize_cache_text(text),
+            language or "",
+            self._speaker_hash(speaker_wav),
+            f"{float(speed or 1.0):.3f}",
+            engine or "",
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def accepts(self, text):
+        return bool(text) and len(text) <= self.max_text_chars
+
+    # --- Lecture ---
+    def get(self, key):
+        """Retourne les octets WAV en cache, ou None."""
+        with self.lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return data
+        path = self.cache_dir / f"{key}.wav"
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # rafraîchit la date pour l'éviction LRU disque
+        except OSError:
+            data = None
+        with self.lock:
+            if data:
+                self.stats["disk_hits"] += 1
+                self._remember(key, data)
+                return data
+            self.stats["misses"] += 1
+            return None
+
+    # --- Écriture ---
+    def put(self, key, data):
+        if not data:
+            return
+        with self.lock:
+            self._remember(key, data)
+            self.stats["stores"] += 1
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self.cache_dir / f"{key}.wav"
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            with self.lock:
+                if self._disk_size is not None:
+                    self._disk_size += len(data)
+            self._enforce_disk_budget()
+        except OSError as e:
+            logger.warning(f"Écriture cache audio impossible: {e}")
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_budget:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_budget:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _enforce_disk_budget(self):
+        with self.lock:
+            if self._disk_size is not None and self._disk_size <= self.disk_budget:
+                return
+            entries = []
+            for path in self.cache_dir.glob("*.wav"):
+                try:
+                    st = path.stat()
+                    entries.append((st.st_mtime, st.st_size, path))
+                except OSError:
+                    continue
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.disk_budget:
+                    break
+                try:
+                    path.unlink()
+                    total -= size
+                    self.stats["evictions"] += 1
+                except OSError:
+                    pass
+            self._disk_size = total
+
+    def clear(self):
+        with self.lock:
+            self._memory.clear()
+            self._memory_size = 0
+            for path in self.cache_dir.glob("*.wav"):
+                path.unlink(missing_ok=True)
+            self._disk_size = 0
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+            stats["memory_bytes"] = self._memory_size
+            stats["memory_entries"] = len(self._memory)
+            return stats
@@ -102,6 +102,17 @@ def setup_coqui_tts():
         print("❌ Coqui TTS non installé")
         print("💡 Lancez: pip install TTS")
 
+def pack_models():
+    """Réécrit les poids XTTS/Whisper en packs à chargement rapide (model_pack.py)"""
+    print("\n📦 Création des packs de modèles...")
+    try:
+        from model_pack import pack_all
+        results = pack_all()
+        if any(r.startswith("échec") for r in results.values()):
+            print("💡 Les modèles non packés se chargeront normalement (plus lentement)")
+    except Exception as e:
+        print(f"❌ Packs non créés: {e}")
+
 def optimize_system():
     """Optimisations système pour TTS"""
     print("\n⚡ Optimisations système...")
@@ -213,6 +224,7 @@ def main():
     
     # Configuration spécifique
     setup_coqui_tts()
+    pack_models()
     optimize_system()
     create_voice_samples()
     
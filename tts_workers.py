@@ -0,0 +1,269 @@
+"""
+Pool de processus TTS pour WillIAM
+- N processus de travail gardent chacun le modèle XTTS chargé et prennent des jobs texte dans une file.
+- Le PCM revient par mémoire partagée (multiprocessing.shared_memory), pas par octets picklés.
+- Un superviseur redémarre les processus morts en arrière-plan ; le job en cours est relancé une fois.
+- Une erreur de job est remontée telle quelle ; après plusieurs échecs consécutifs (modèle en cause), le
+  processus s'arrête et le superviseur le relance (modèle rechargé à neuf), dans une limite de redémarrages.
+- L'inférence ne partage plus le GIL avec la GUI, le STT et la boucle de streaming Ollama.
+"""
+
+import itertools
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+WORKER_BROKEN = 3          # code de sortie : modèle du processus jugé inutilisable
+MAX_CONSECUTIVE_ERRORS = 2 # échecs d'affilée avant de considérer le modèle (et non le texte) en cause
+MAX_RESTARTS = 3           # redémarrages sans aucun job réussi avant d'abandonner un processus
+
+def _create_shm(size):
+    """Segment partagé créé ici mais libéré (unlink) par le processus principal : on ne le fait pas suivre par
+    le resource tracker du processus de travail (sinon double enregistrement -> faux "leaked" à l'arrêt)."""
+    from multiprocessing import shared_memory
+    try:
+        return shared_memory.SharedMemory(create=True, size=size, track=False)  # Python >= 3.13
+    except TypeError:
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+def _worker_main(worker_id, jobs, results):
+    """Boucle d'un processus de travail : charge le modèle une fois puis traite les jobs."""
+    import sys
+    import numpy as np
+    from tts import xtts_manager
+    if xtts_manager.get_model() is None:
+        results.put(("failed", worker_id, None, "Modèle XTTS indisponible"))
+        return
+    results.put(("ready", worker_id, None, None))
+    errors = 0
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, text, language, speaker_wav, speed = job
+        try:
+            wav, sample_rate = xtts_manager.synthesize_local(text, language, speaker_wav, speed)
+            wav = np.ascontiguousarray(wav, dtype=np.float32)
+            shm = _create_shm(max(wav.nbytes, 1))
+            np.ndarray(wav.shape, dtype=np.float32, buffer=shm.buf)[:] = wav
+            results.put(("done", worker_id, job_id, (shm.name, wav.shape[0], sample_rate)))
+            shm.close()  # le processus principal copie puis libère (unlink) le segment
+            errors = 0
+        except Exception as e:
+            results.put(("error", worker_id, job_id, str(e)))
+            errors += 1
+            if errors >= MAX_CONSECUTIVE_ERRORS:
+                # Le modèle est en cause, pas le texte : le superviseur relance un processus neuf
+                sys.exit(WORKER_BROKEN)
+
+class TTSWorkerPool:
+    def __init__(self, num_workers=2, max_retries=1):
+        self.num_workers = max(1, int(num_workers))
+        self.max_retries = max_retries
+        self._ctx = mp.get_context("spawn")  # torch/CUDA ne supportent pas fork proprement
+        self._results = self._ctx.Queue()
+        self._procs = {}
+        self._queues = {}     # worker_id -> file de jobs dédiée (on sait toujours qui fait quoi)
+        self._ready = set()
+        self._failed = set()  # processus sans modèle utilisable : pas de redémarrage en boucle
+        self._restarts = {}   # worker_id -> redémarrages depuis le dernier job réussi
+        self._busy = {}       # worker_id -> job_id
+        self._backlog = deque()
+        self._pending = {}    # job_id -> (future, job, tentatives)
+        self._ids = itertools.count()
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._started = False
+        self.stats = {"jobs": 0, "done": 0, "errors": 0, "restarts": 0, "retries": 0}
+
+    # --- Cycle de vie ---
+    def start(self):
+        with self.lock:
+            if self._started:
+                return self
+            self._started = True
+            for worker_id in range(self.num_workers):
+                self._spawn(worker_id)
+        threading.Thread(target=self._collect_results, name="tts-pool-results", daemon=True).start()
+        threading.Thread(target=self._supervise, name="tts-pool-supervisor", daemon=True).start()
+        logger.info(f"🚀 Pool TTS démarré ({self.num_workers} processus)")
+        return self
+
+    def _spawn(self, worker_id):
+        jobs = self._ctx.Queue()
+        proc = self._ctx.Process(
+            target=_worker_main, args=(worker_id, jobs, self._results),
+            name=f"tts-worker-{worker_id}", daemon=True,
+        )
+        proc.start()
+        self._queues[worker_id] = jobs
+        self._procs[worker_id] = proc
+
+    def shutdown(self):
+        self._stop.set()
+        for jobs in self._queues.values():
+            jobs.put(None)
+        for proc in self._procs.values():
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        with self.lock:
+            for future, _, _ in self._pending.values():
+                future.set_exception(RuntimeError("Pool TTS arrêté"))
+            self._pending.clear()
+            self._backlog.clear()
+
+    def has_workers(self):
+        with self.lock:
+            return bool(self._ready)
+
+    def wait_ready(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.has_workers():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    # --- Soumission ---
+    def submit(self, text, language="fr", speaker_wav=None, speed=1.0):
+        """Envoie un job texte. Retourne un Future résolu en (waveform float32, sample_rate)."""
+        self.start()
+        job_id = next(self._ids)
+        job = (job_id, text, language, speaker_wav, speed)
+        future = Future()
+        with self.lock:
+            if len(self._failed) >= self.num_workers:
+                future.set_exception(RuntimeError("Aucun processus TTS utilisable"))
+                return future
+            self._pending[job_id] = (future, job, 0)
+            self._backlog.append(job)
+            self.stats["jobs"] += 1
+            self._dispatch()
+        return future
+
+    def synthesize(self, text, language="fr", speaker_wav=None, speed=1.0, timeout=120):
+        return self.submit(text, language, speaker_wav, speed).result(timeout)
+
+    def _dispatch(self):
+        """Confie les jobs en attente aux processus prêts et libres (appelé sous self.lock)."""
+        for worker_id in sorted(self._ready):
+            if not self._backlog:
+                return
+            if worker_id in self._busy:
+                continue
+            job = self._backlog.popleft()
+            self._busy[worker_id] = job[0]
+            self._queues[worker_id].put(job)
+
+    # --- Résultats (mémoire partagée) ---
+    def _collect_results(self):
+        from multiprocessing import shared_memory
+        import numpy as np
+        while not self._stop.is_set():
+            try:
+                kind, worker_id, job_id, payload = self._results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                if kind == "ready":
+                    self._ready.add(worker_id)
+                    logger.info(f"✅ Processus TTS {worker_id} prêt")
+                elif kind == "failed":
+                    self._failed.add(worker_id)
+                    logger.error(f"❌ Processus TTS {worker_id}: {payload}")
+                    self._fail_if_no_worker()
+                    continue
+                else:
+                    self._busy.pop(worker_id, None)
+                    if kind == "done":
+                        self._restarts.pop(worker_id, None)
+                entry = self._pending.pop(job_id, None) if kind in ("done", "error") else None
+                self._dispatch()
+            if kind == "done" and entry is None:
+                # Job abandonné entre-temps : libère quand même le segment partagé
+                try:
+                    orphan = shared_memory.SharedMemory(name=payload[0])
+                    orphan.close()
+                    orphan.unlink()
+                except Exception:
+                    pass
+            if entry is None:
+                continue
+            future = entry[0]
+            if kind == "error":
+                self.stats["errors"] += 1
+                future.set_exception(RuntimeError(payload))
+                continue
+            name, n_samples, sample_rate = payload
+            shm = shared_memory.SharedMemory(name=name)
+            try:
+                wav = np.ndarray((n_samples,), dtype=np.float32, buffer=shm.buf).copy()
+            finally:
+                shm.close()
+                shm.unlink()
+            self.stats["done"] += 1
+            future.set_result((wav, sample_rate))
+
+    def _fail_if_no_worker(self):
+        if len(self._failed) < self.num_workers:
+            return
+        for future, _, _ in self._pending.values():
+            future.set_exception(RuntimeError("Aucun processus TTS utilisable"))
+        self._pending.clear()
+        self._backlog.clear()
+
+    # --- Supervision ---
+    def _supervise(self):
+        while not self._stop.wait(0.5):
+            for worker_id, proc in list(self._procs.items()):
+                if proc.is_alive() or worker_id in self._failed:
+                    continue
+                with self.lock:
+                    self._ready.discard(worker_id)
+                    job_id = self._busy.pop(worker_id, None)
+                    entry = self._pending.get(job_id) if job_id is not None else None
+                    if entry is not None:
+                        future, job, attempts = entry
+                        if attempts < self.max_retries:
+                            self._pending[job_id] = (future, job, attempts + 1)
+                            self._backlog.appendleft(job)
+                            self.stats["retries"] += 1
+                        else:
+                            del self._pending[job_id]
+                            future.set_exception(RuntimeError(f"Processus TTS {worker_id} mort pendant le job"))
+                    restarts = self._restarts.get(worker_id, 0) + 1
+                    if restarts > MAX_RESTARTS:
+                        self._failed.add(worker_id)
+                        self._fail_if_no_worker()
+                        self._dispatch()
+                    else:
+                        self._restarts[worker_id] = restarts
+                        self.stats["restarts"] += 1
+                        self._spawn(worker_id)
+                        self._dispatch()
+                if worker_id in self._failed:
+                    logger.error(f"❌ Processus TTS {worker_id} abandonné après {MAX_RESTARTS} redémarrages sans succès")
+                else:
+                    logger.warning(f"♻️ Processus TTS {worker_id} redémarré (code {proc.exitcode})")
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["workers"] = self.num_workers
+            stats["ready"] = len(self._ready)
+            stats["failed"] = len(self._failed)
+            stats["busy"] = len(self._busy)
+            stats["pending"] = len(self._pending)
+            return stats
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Détection d'activité vocale (VAD) et fin d'énoncé en flux pour WillIAM
+- Caractéristiques par trame de 20 ms, calculées en bloc (NumPy) : énergie, taux de passage par zéro,
+  platitude spectrale. La parole = énergie au-dessus du plancher de bruit ET spectre structuré (voisé)
+  ou passages par zéro fréquents avec un spectre incliné (fricatives) ; un bruit stationnaire fort
+  (ventilateur, pièce bruyante) reste plat et ne déclenche pas.
+- Plancher de bruit adaptatif (descend vite, monte lentement, mis à jour sur les trames non vocales).
+- Fin d'énoncé dès que la voix s'arrête depuis hangover_ms (réglable, 300 ms par défaut au lieu de
+  pause_threshold = 0.8 s + la latence de recognizer.listen) : le segment, coupé au plus près de la parole
+  (pré-roll gardé pour les attaques), part tout de suite vers le STT.
+- Chaque tour expose ses instants : début de parole, fin de parole, décision, délai de fin d'énoncé.
+- python vad.py --self-check
+"""
+
+import argparse
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+FRAME_MS = 20
+
+def frame_features(frames, eps=1e-10):
+    """(énergie dB, taux de passage par zéro, platitude spectrale) pour un bloc de trames (n, longueur)."""
+    import numpy as np
+    energy = 10.0 * np.log10(np.einsum("ij,ij->i", frames, frames) / frames.shape[1] + eps)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frames.shape[1] - 1)
+    power = np.abs(np.fft.rfft(frames * np.hanning(frames.shape[1]).astype(np.float32), axis=1)) ** 2 + eps
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    return energy, zcr, flatness
+
+class VADEndpointer:
+    def __init__(self, sample_rate=16000, frame_ms=FRAME_MS, snr_db=6.0, flatness_max=0.35, zcr_fricative=0.3,
+                 fricative_flatness_max=0.45, onset_ms=60, hangover_ms=300, pre_roll_ms=200, tail_pad_ms=60, max_utterance_s=20.0):
+        self.sample_rate = sample_rate
+        self.frame = int(sample_rate * frame_ms / 1000)
+        self.frame_ms = frame_ms
+        self.snr_db = snr_db
+        self.flatness_max = flatness_max
+        self.zcr_fricative = zcr_fricative
+        self.fricative_flatness_max = fricative_flatness_max
+        self.onset_frames = max(1, onset_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.pre_roll_frames = pre_roll_ms // frame_ms
+        self.tail_pad_frames = tail_pad_ms // frame_ms
+        self.max_frames = int(max_utterance_s * 1000 / frame_ms)
+        self.noise_db = None
+        self.history = deque(maxlen=50)  # instants des derniers tours
+        self.reset()
+
+    @property
+    def hangover_ms(self):
+        return self.hangover_frames * self.frame_ms
+
+    @hangover_ms.setter
+    def hangover_ms(self, value):
+        self.hangover_frames = max(1, int(value) // self.frame_ms)
+
+    def set_sample_rate(self, sample_rate):
+        """Adapte la taille des trames au débit du micro (sr.Microphone ouvre souvent à 44,1/48 kHz)."""
+        if sample_rate != self.sample_rate:
+            self.sample_rate = sample_rate
+            self.frame = int(sample_rate * self.frame_ms / 1000)
+            self.reset()
+
+    def reset(self):
+        """Nouveau tour (le plancher de bruit est conservé d'un tour à l'autre)."""
+        import numpy as np
+        self._rest = np.zeros(0, np.float32)
+        self._pre_roll = deque(maxlen=self.pre_roll_frames + self.onset_frames)
+        self._speech = []           # trames du segment en cours
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._last_voiced = 0       # index (dans self._speech) après la dernière trame vocale
+        self._frames_seen = 0
+        self.in_speech = False
+        self.timings = {}
+
+    def _classify(self, frames):
+        import numpy as np
+        energy, zcr, flatness = frame_features(frames)
+        if self.noise_db is None:
+            self.noise_db = float(np.percentile(energy, 20)) if len(energy) > 1 else float(energy[0])
+        voiced = []
+        for e, z, f in zip(energy, zcr, flatness):
+            # Fricative : nombreux passages par zéro mais spectre incliné (le bruit blanc reste plat, ~0.56)
+            fricative = z > self.zcr_fricative and f < self.fricative_flatness_max
+            is_voice = e > self.noise_db + self.snr_db and (f < self.flatness_max or fricative)
+            if not is_voice:
+                rate = 0.3 if e < self.noise_db else 0.01
+                self.noise_db += float(rate * (e - self.noise_db))
+            voiced.append(is_voice)
+        return voiced
+
+    def process(self, block):
+        """Traite un bloc audio (float32 mono). Retourne le segment de parole coupé dès la fin d'énoncé, sinon None."""
+        import numpy as np
+        data = np.concatenate((self._rest, np.asarray(block, dtype=np.float32).reshape(-1)))
+        n = len(data) // self.frame
+        self._rest = data[n * self.frame:]
+        if n == 0:
+            return None
+        frames = data[:n * self.frame].reshape(n, self.frame)
+        for frame, voiced in zip(frames, self._classify(frames)):
+            self._frames_seen += 1
+            segment = self._step(frame, voiced)
+            if segment is not None:
+                return segment
+        return None
+
+    def _now(self):
+        return self._frames_seen * self.frame_ms / 1000
+
+    def _step(self, frame, voiced):
+        if not self.in_speech:
+            self._pre_roll.append(frame)
+            self._voiced_run = self._voiced_run + 1 if voiced else 0
+            if self._voiced_run >= self.onset_frames:
+                self.in_speech = True
+                self._speech = list(self._pre_roll)
+                self._last_voiced = len(self._speech)
+                self._silent_run = 0
+                self.timings = {"speech_start": round(self._now() - self.onset_frames * self.frame_ms / 1000, 3)}
+            return None
+        self._speech.append(frame)
+        if voiced:
+            self._silent_run = 0
+            self._last_voiced = len(self._speech)
+        else:
+            self._silent_run += 1
+        if self._silent_run >= self.hangover_frames or len(self._speech) >= self.max_frames:
+            return self._endpoint()
+        return None
+
+    def _endpoint(self):
+        import numpy as np
+        end = min(len(self._speech), self._last_voiced + self.tail_pad_frames)
+        segment = np.concatenate(self._speech[:end])
+        speech_end = self._now() - (len(self._speech) - self._last_voiced) * self.frame_ms / 1000
+        timings = self.timings
+        timings.update({
+            "speech_end": round(speech_end, 3),
+            "endpoint": round(self._now(), 3),
+            "endpoint_delay": round(self._now() - speech_end, 3),
+            "duration": round(len(segment) / self.sample_rate, 3),
+            "noise_db": round(self.noise_db, 1),
+        })
+        self.history.append(dict(timings))
+        self.in_speech = False
+        self._speech = []
+        self._pre_roll.clear()
+        self._voiced_run = 0
+        return segment
+
+    def current_segment(self):
+        """Audio de l'énoncé en cours (pré-roll compris), ou None hors parole."""
+        import numpy as np
+        return np.concatenate(self._speech) if self.in_speech and self._speech else None
+
+    def flush(self):
+        """Fin du flux : segment en cours (coupé) s'il y en a un."""
+        return self._endpoint() if self.in_speech and self._speech else None
+
+    def listen(self, read_block, timeout=None, max_wait=30.0, on_block=None):
+        """Lit des blocs (read_block() -> float32) jusqu'à la fin d'un énoncé.
+        on_block(vad) est appelé après chaque bloc tant que l'énoncé n'est pas terminé (transcription partielle).
+        Lève TimeoutError si la parole n'a pas commencé au bout de timeout secondes (durée d'audio lue)."""
+        self.reset()
+        read = 0.0
+        while True:
+            block = read_block()
+            read += len(block) / self.sample_rate
+            segment = self.process(block)
+            if segment is not None:
+                return segment
+            if on_block is not None:
+                on_block(self)
+            if not self.in_speech and timeout is not None and read > timeout:
+                raise TimeoutError("aucune parole détectée")
+            if read > max_wait + (timeout or 0):
+                segment = self.flush()
+                if segment is not None:
+                    return segment
+                raise TimeoutError("aucune parole détectée")
+
+    def get_stats(self):
+        delays = [t["endpoint_delay"] for t in self.history]
+        return {
+            "turns": len(self.history),
+            "hangover_ms": self.hangover_ms,
+            "noise_db": round(self.noise_db, 1) if self.noise_db is not None else None,
+            "avg_endpoint_delay": round(sum(delays) / len(delays), 3) if delays else None,
+            "last": self.history[-1] if self.history else None,
+        }
+
+def listen_source(source, vad, timeout=None, max_wait=30.0, on_block=None):
+    """Écoute un sr.Microphone déjà ouvert avec le VAD. Retourne un sr.AudioData coupé (compatible
+    recognize_google / recognize_whisper). Lève sr.WaitTimeoutError comme recognizer.listen."""
+    import numpy as np
+    import speech_recognition as sr
+    vad.set_sample_rate(source.SAMPLE_RATE)
+    read = lambda: np.frombuffer(source.stream.read(source.CHUNK), "<i2").astype(np.float32) / 32768.0
+    try:
+        segment = vad.listen(read, timeout=timeout, max_wait=max_wait, on_block=on_block)
+    except TimeoutError as e:
+        raise sr.WaitTimeoutError(str(e))
+    pcm = (np.clip(segment, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+    return sr.AudioData(pcm, source.SAMPLE_RATE, 2)
+
+# --- Auto-test (signaux synthétiques) ---
+def _speech_like(duration, rng, sr=16000, level=0.1):
+    """Alternance de syllabes voisées (harmoniques) et de fricatives (bruit aigu), sans micro."""
+    import numpy as np
+    parts = []
+    while sum(len(p) for p in parts) < duration * sr:
+        n = int(rng.uniform(0.12, 0.22) * sr)
+        t = np.arange(n) / sr
+        f0 = rng.uniform(100, 180)
+        syllable = sum(np.sin(2 * np.pi * k * f0 * t) / k for k in range(1, 8)) * np.hanning(n) ** 0.5
+        parts.append(level * syllable / 2)
+        if rng.random() < 0.3:
+            m = int(0.06 * sr)
+            hiss = np.diff(rng.standard_normal(m + 1)) * 0.5  # bruit aigu (dérivée du bruit blanc)
+            parts.append(level * hiss * np.hanning(m))
+    return np.concatenate(parts)[:int(duration * sr)].astype(np.float32)
+
+def _self_check():
+    import numpy as np
+    rng = np.random.default_rng(1)
+    sr = 16000
+    noise = lambda s, lvl: (lvl * rng.standard_normal(int(s * sr))).astype(np.float32)
+    word_gap = lambda: np.zeros(int(0.15 * sr), np.float32)
+    utterance = np.concatenate([_speech_like(1.0, rng), word_gap(), _speech_like(0.8, rng)])
+    for label, background in (("pièce calme", 0.002), ("pièce bruyante", 0.012)):
+        vad = VADEndpointer(sr, hangover_ms=300)
+        lead = noise(1.5, background)
+        tail = noise(2.0, background)
+        stream = np.concatenate([lead, utterance + noise(len(utterance) / sr, background), tail])
+        speech_end = (len(lead) + len(utterance)) / sr
+        block = 1024
+        segment = None
+        for i in range(0, len(stream), block):
+            segment = vad.process(stream[i:i + block])
+            if segment is not None:
+                decided = (i + block) / sr
+                break
+        assert segment is not None, label
+        t = vad.history[-1]
+        # Coupé au plus près : pré-roll + énoncé + marge de fin, sans la seconde de silence
+        assert abs(t["speech_start"] - len(lead) / sr) < 0.1, t
+        assert abs(t["speech_end"] - speech_end) < 0.08, t
+        assert decided - speech_end < 0.40, (decided, speech_end)
+        assert len(segment) / sr < len(utterance) / sr + 0.35, t
+        print(f"✅ {label} : fin de parole {t['speech_end']}s, décision +{(decided - speech_end) * 1000:.0f} ms "
+              f"(attente de fin {t['endpoint_delay'] * 1000:.0f} ms), segment {t['duration']}s, "
+              f"pause de 150 ms gardée dans l'énoncé, plancher {t['noise_db']} dB")
+    # Bruit stationnaire qui monte de 20 dB : spectre plat, pas de faux départ
+    vad = VADEndpointer(sr)
+    for i, chunk in enumerate((noise(2.0, 0.003), noise(3.0, 0.03))):
+        for j in range(0, len(chunk), 1024):
+            assert vad.process(chunk[j:j + 1024]) is None and not vad.in_speech, "faux départ sur du bruit"
+    print(f"✅ Bruit de fond +20 dB : aucun déclenchement (plancher suivi : {vad.noise_db:.1f} dB)")
+    # Coût : trames traitées par seconde de calcul
+    vad = VADEndpointer(sr)
+    long = noise(60.0, 0.01)
+    t0 = time.process_time()
+    for j in range(0, len(long), 1024):
+        vad.process(long[j:j + 1024])
+    cpu = time.process_time() - t0
+    print(f"✅ Coût : {cpu / 60 * 100:.2f} % d'un cœur par seconde d'audio")
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="VAD et fin d'énoncé en flux")
+    parser.add_argument("--self-check", action="store_true")
+    args = parser.parse_args()
+    if args.self_check:
+        _self_check()
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -130,6 +130,13 @@ class WillIAMInstaller:
         
         if coqui_success:
             print("✅ Coqui TTS installé - Synthèse vocale de haute qualité disponible")
+            # Packs à chargement rapide (XTTS + Whisper) : téléchargement puis réécriture des poids, une fois
+            if not self.run_command(
+                f"{sys.executable} model_pack.py pack",
+                "Création des packs de modèles",
+                required=False
+            ):
+                self.warnings.append("Packs de modèles non créés - démarrage à froid plus lent")
         else:
             self.warnings.append("Coqui TTS non installé - Synthèse vocale limitée")
         